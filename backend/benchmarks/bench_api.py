@@ -0,0 +1,297 @@
+"""
+API接口基准
+
+通过 httpx.ASGITransport 在进程内驱动FastAPI应用（与 tests/conftest.py 相同的方式），
+不经过网络，测量各接口在不同数据量下的吞吐和延迟。每个数据量在临时目录中新建
+一个文件数据库，使用与生产相同的读写引擎和SQLite配置档，写入种子数据后依次运行场景：
+
+- list_head / list_mid / list_tail: 按offset深度分页（表头、中间、末尾）
+- list_completed / list_active: 按completed筛选
+- get / update / create / delete: 单条记录
+- delete_completed / delete_all: 批量删除。每次操作前（不计时）插入 --bulk-rows 条记录，
+  预热阶段会先删掉种子数据中的对应记录，因此计时的是删除 --bulk-rows 条记录的耗时
+
+写操作场景会改变数据，排在读场景之后。默认关闭读缓存以测量数据库路径，
+--cache 使用应用配置的缓存；写队列是否启用由 WRITE_QUEUE_ENABLED 决定。
+
+结果以JSON输出，每个场景给出 ops/s 和 p50/p95/p99（毫秒）。compare 把结果与
+保存的基线比较，任一场景的吞吐下降或p95上升超过阈值时以状态码1退出。
+
+运行:
+  python -m benchmarks.bench_api run [--sizes 1000,100000,1000000] [--ops 200] [--output results.json]
+  python -m benchmarks.bench_api run --sizes 1000 --baseline baseline.json [--threshold 0.2]
+  python -m benchmarks.bench_api compare baseline.json results.json [--threshold 0.2]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from src.todolistv2 import seeder
+from src.todolistv2.cache import NullCache, todo_cache
+from src.todolistv2.config import SQLITE_PROFILE, WRITE_QUEUE_ENABLED
+from src.todolistv2.database import (
+    Base, create_engines, get_db, get_read_db, get_read_session_factory
+)
+from src.todolistv2.main import app
+from src.todolistv2.models import Todo
+from src.todolistv2.write_queue import write_queue
+
+API = "/api/v1/todos"
+PAGE_SIZE = 20
+
+
+@dataclass
+class Scenario:
+    """一个基准场景，request每次调用返回 (方法, URL, httpx参数)"""
+    name: str
+    request: Callable[[], tuple[str, str, dict]]
+    expected_status: int
+    setup: Optional[Callable[[], Awaitable[None]]] = None
+
+
+def summarize(latencies: list[float], errors: int) -> dict:
+    """吞吐按计时部分的总耗时计算，不含setup"""
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        index = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "ops": len(ordered),
+        "errors": errors,
+        "ops_per_sec": round(len(ordered) / sum(ordered), 1),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+    }
+
+
+async def seed_todos(engine: AsyncEngine, rows: int, seed: int, completed_ratio: float = 0.3) -> None:
+    """建表并用 python -m todolistv2 seed 相同的方式写入种子数据"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+    await asyncio.to_thread(
+        seeder.seed_todos, engine.url.database, rows, completed_ratio=completed_ratio, seed=seed
+    )
+
+
+def build_scenarios(engine: AsyncEngine, rows: int, rng: random.Random, bulk_rows: int) -> list[Scenario]:
+    # 删除场景从打乱的ID中依次取，保证每次删除的记录都存在
+    deletable = list(range(1, rows + 1))
+    rng.shuffle(deletable)
+
+    def random_id() -> int:
+        return rng.randint(1, rows)
+
+    def list_page(offset: int, **params):
+        return lambda: ("GET", f"{API}/", {"params": {"limit": PAGE_SIZE, "offset": offset, **params}})
+
+    def insert_rows(completed: bool):
+        async def setup():
+            async with engine.begin() as conn:
+                await conn.execute(insert(Todo), [
+                    {"title": f"批量{i}", "completed": completed} for i in range(bulk_rows)
+                ])
+        return setup
+
+    return [
+        Scenario("list_head", list_page(0), 200),
+        Scenario("list_mid", list_page(rows // 2), 200),
+        Scenario("list_tail", list_page(max(0, rows - PAGE_SIZE)), 200),
+        Scenario("list_completed", list_page(0, completed="true"), 200),
+        Scenario("list_active", list_page(0, completed="false"), 200),
+        Scenario("get", lambda: ("GET", f"{API}/{random_id()}", {}), 200),
+        Scenario(
+            "update",
+            lambda: ("PUT", f"{API}/{random_id()}", {"json": {"completed": rng.random() < 0.5}}),
+            200
+        ),
+        Scenario(
+            "create",
+            lambda: ("POST", f"{API}/", {"json": {"title": "新任务", "description": "基准"}}),
+            201
+        ),
+        Scenario("delete", lambda: ("DELETE", f"{API}/{deletable.pop()}", {}), 204),
+        Scenario(
+            "delete_completed", lambda: ("DELETE", f"{API}/completed", {}), 204,
+            setup=insert_rows(True)
+        ),
+        Scenario("delete_all", lambda: ("DELETE", f"{API}/all", {}), 204, setup=insert_rows(False)),
+    ]
+
+
+async def run_scenario(client: AsyncClient, scenario: Scenario, ops: int, warmup: int) -> dict:
+    latencies = []
+    errors = 0
+    for index in range(warmup + ops):
+        if scenario.setup is not None:
+            await scenario.setup()
+        method, url, kwargs = scenario.request()
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - started
+        if index < warmup:
+            continue
+        latencies.append(elapsed)
+        if response.status_code != scenario.expected_status:
+            errors += 1
+    return summarize(latencies, errors)
+
+
+async def bench_size(rows: int, args, directory: Path) -> dict:
+    rng = random.Random(args.seed)
+    path = directory / f"bench_{rows}.db"
+    engine, read_engine = create_engines(f"sqlite+aiosqlite:///{path}")
+    started = time.perf_counter()
+    await seed_todos(engine, rows, args.seed)
+    print(f"{rows} 行种子数据写入耗时 {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    write_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    read_factory = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        async with write_factory() as session:
+            yield session
+
+    async def override_get_read_db():
+        async with read_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_read_db
+    app.dependency_overrides[get_read_session_factory] = lambda: read_factory
+    todo_cache.clear()
+    default_factory = write_queue.session_factory
+    if WRITE_QUEUE_ENABLED:
+        write_queue.session_factory = write_factory
+        await write_queue.start()
+
+    results = {}
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in build_scenarios(engine, rows, rng, args.bulk_rows):
+                ops = min(args.ops, rows - args.warmup) if scenario.name == "delete" else args.ops
+                results[scenario.name] = await run_scenario(client, scenario, ops, args.warmup)
+                print(f"{rows} {scenario.name}: {results[scenario.name]}", file=sys.stderr)
+    finally:
+        await write_queue.stop()
+        write_queue.session_factory = default_factory
+        app.dependency_overrides.clear()
+        await engine.dispose()
+        await read_engine.dispose()
+    return results
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """
+    找出相对基线退化的场景
+
+    Returns:
+        退化说明；只比较两边都有的数据量和场景
+    """
+    regressions = []
+    for size, scenarios in baseline["results"].items():
+        for name, base in scenarios.items():
+            result = current["results"].get(size, {}).get(name)
+            if result is None:
+                continue
+            if result["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+                regressions.append(
+                    f"{size}/{name}: ops/s {base['ops_per_sec']} -> {result['ops_per_sec']}"
+                )
+            if result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+                regressions.append(f"{size}/{name}: p95 {base['p95_ms']}ms -> {result['p95_ms']}ms")
+            if result["errors"] > base["errors"]:
+                regressions.append(f"{size}/{name}: errors {base['errors']} -> {result['errors']}")
+    return regressions
+
+
+def report_regressions(baseline_path: str, current: dict, threshold: float) -> int:
+    baseline = json.loads(Path(baseline_path).read_text())
+    regressions = compare(baseline, current, threshold)
+    for line in regressions:
+        print(f"退化 {line}", file=sys.stderr)
+    if not regressions:
+        print(f"与基线相比没有超过 {threshold:.0%} 的退化", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+async def run(args) -> int:
+    # 应用在导入时把日志级别设为INFO，httpx会为每个请求输出一行
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if not args.cache:
+        todo_cache.backend = NullCache()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    with tempfile.TemporaryDirectory(dir=args.data_dir) as directory:
+        results = {str(rows): await bench_size(rows, args, Path(directory)) for rows in sizes}
+    report = {
+        "meta": {
+            "ops": args.ops,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "bulk_rows": args.bulk_rows,
+            "cache": args.cache,
+            "write_queue": WRITE_QUEUE_ENABLED,
+            "sqlite_profile": SQLITE_PROFILE,
+            "sqlite_version": sqlite3.sqlite_version,
+            "python": sys.version.split()[0],
+        },
+        "results": results,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    if args.baseline:
+        return report_regressions(args.baseline, report, args.threshold)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="API接口基准")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="运行基准")
+    run_parser.add_argument("--sizes", default="1000,100000,1000000", help="逗号分隔的数据量")
+    run_parser.add_argument("--ops", type=int, default=200, help="每个场景计时的操作数")
+    run_parser.add_argument("--warmup", type=int, default=10, help="每个场景预热的操作数")
+    run_parser.add_argument("--bulk-rows", type=int, default=100, help="批量删除场景每次删除的行数")
+    run_parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    run_parser.add_argument("--cache", action="store_true", help="启用读缓存")
+    run_parser.add_argument("--data-dir", help="存放临时数据库的目录")
+    run_parser.add_argument("--output", help="结果写入的JSON文件")
+    run_parser.add_argument("--baseline", help="与之比较的基线JSON文件")
+    run_parser.add_argument("--threshold", type=float, default=0.2, help="允许的退化比例")
+
+    compare_parser = commands.add_parser("compare", help="比较两次结果")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2)
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        current = json.loads(Path(args.current).read_text())
+        return report_regressions(args.baseline, current, args.threshold)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
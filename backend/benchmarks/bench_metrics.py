@@ -0,0 +1,112 @@
+"""
+指标采集开销微基准
+
+- request: 同一个极简ASGI应用直接调用与经过MetricsMiddleware调用的耗时差，
+  即每个请求额外付出的开销（计时、并发数、路由模板查找、直方图记录和Server-Timing响应头）
+- statement: 同一条 SELECT 1 在未注册事件、注册空的游标事件、注册指标游标事件的
+  引擎上执行的耗时；dispatch_us是SQLAlchemy分派游标事件本身的开销（任何游标事件
+  监听都会付出），hooks_us是指标记录代码的开销。使用同步的pysqlite引擎，
+  避免aiosqlite线程切换的噪声
+
+各变体交替运行多轮，取各自的最小值，减少调度和GC带来的抖动。
+
+运行: python -m benchmarks.bench_metrics [--requests 100000] [--statements 20000] [--rounds 5]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from sqlalchemy import create_engine, event
+from starlette.routing import Route
+
+from src.todolistv2.database import instrument_engine
+from src.todolistv2.metrics import MetricsMiddleware
+
+ROUTE = Route("/todos/{todo_id}", endpoint=lambda request: None)
+START = {"type": "http.response.start", "status": 200, "headers": []}
+BODY = {"type": "http.response.body", "body": b"{}"}
+SCOPE = {"type": "http", "method": "GET", "path": "/api/v1/todos/1"}
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = ROUTE
+    await send(START)
+    await send(BODY)
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def run_requests(app, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        await app(dict(SCOPE), receive, send)
+    return (time.perf_counter() - started) / count
+
+
+def run_statements(engine, count: int) -> float:
+    with engine.connect() as conn:
+        started = time.perf_counter()
+        for _ in range(count):
+            conn.exec_driver_sql("SELECT 1").fetchall()
+        return (time.perf_counter() - started) / count
+
+
+def best_of(rounds: int, **variants) -> dict:
+    """交替运行各变体，返回每个变体的最小耗时（微秒）"""
+    times = {name: [] for name in variants}
+    for _ in range(rounds):
+        for name, fn in variants.items():
+            times[name].append(fn())
+    return {name: min(samples) * 1e6 for name, samples in times.items()}
+
+
+def noop(*args) -> None:
+    pass
+
+
+def main(requests: int, statements: int, rounds: int) -> None:
+    middleware = MetricsMiddleware(endpoint)
+    loop = asyncio.new_event_loop()
+    request = best_of(
+        rounds,
+        plain=lambda: loop.run_until_complete(run_requests(endpoint, requests)),
+        instrumented=lambda: loop.run_until_complete(run_requests(middleware, requests)),
+    )
+    loop.close()
+
+    engines = {name: create_engine("sqlite://") for name in ("plain", "listeners", "instrumented")}
+    event.listen(engines["listeners"], "before_cursor_execute", noop)
+    event.listen(engines["listeners"], "after_cursor_execute", noop)
+    instrument_engine(engines["instrumented"], "bench")
+    statement = best_of(
+        rounds, **{name: lambda e=e: run_statements(e, statements) for name, e in engines.items()}
+    )
+
+    print(json.dumps({
+        "request": {
+            "plain_us": round(request["plain"], 3),
+            "overhead_us": round(request["instrumented"] - request["plain"], 3),
+        },
+        "statement": {
+            "plain_us": round(statement["plain"], 3),
+            "dispatch_us": round(statement["listeners"] - statement["plain"], 3),
+            "hooks_us": round(statement["instrumented"] - statement["listeners"], 3),
+        },
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="指标采集开销微基准")
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--statements", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    main(args.requests, args.statements, args.rounds)
@@ -0,0 +1,104 @@
+"""
+列表响应序列化微基准
+
+对比两种路径生成同一页列表响应的耗时：
+- orm: select(Todo) 得到ORM对象，逐个 TodoResponse.model_validate，
+  组装 TodoListResponse，再按FastAPI处理response_model的方式校验并序列化
+- fast: 查询Core行，转换为dict后一次性编码为JSON字节
+
+运行: python -m benchmarks.bench_serialization [--rows 1000] [--limit 100] [--repeat 200]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.todolistv2.crud import get_todos
+from src.todolistv2.database import Base, create_engines
+from src.todolistv2.models import Todo
+from src.todolistv2.schemas import TodoListResponse, TodoResponse
+from src.todolistv2.serialization import dumps, todo_row_to_dict
+
+LIST_ADAPTER = TypeAdapter(TodoListResponse)
+
+
+async def orm_path(db: AsyncSession, limit: int) -> bytes:
+    result = await db.execute(
+        select(Todo).order_by(Todo.created_at.desc(), Todo.id.desc()).limit(limit)
+    )
+    todos = result.scalars().all()
+    response = TodoListResponse(
+        items=[TodoResponse.model_validate(todo) for todo in todos],
+        total=len(todos),
+        limit=limit,
+        offset=0
+    )
+    # FastAPI: 按response_model校验返回值，转换为JSON兼容对象后由JSONResponse编码
+    validated = LIST_ADAPTER.validate_python(response, from_attributes=True)
+    content = LIST_ADAPTER.dump_python(validated, mode="json")
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+async def fast_path(db: AsyncSession, limit: int) -> bytes:
+    rows, _, next_cursor = await get_todos(db, limit=limit, total_mode="none")
+    return dumps({
+        "items": [todo_row_to_dict(row) for row in rows],
+        "total": len(rows),
+        "limit": limit,
+        "offset": 0,
+        "next_cursor": next_cursor,
+    })
+
+
+async def measure(fn, session_factory, limit: int, repeat: int) -> float:
+    async with session_factory() as db:
+        await fn(db, limit)  # 预热
+        started = time.perf_counter()
+        for _ in range(repeat):
+            await fn(db, limit)
+            db.expunge_all()
+        return (time.perf_counter() - started) / repeat
+
+
+async def main(rows: int, limit: int, repeat: int) -> None:
+    engine, _ = create_engines("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(Todo), [
+            {"title": f"任务{i}", "description": "描述" * (i % 20), "completed": i % 3 == 0}
+            for i in range(rows)
+        ])
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    
+    # 两条路径的items内容应完全一致
+    async with session_factory() as db:
+        orm_items = json.loads(await orm_path(db, limit))["items"]
+        fast_items = json.loads(await fast_path(db, limit))["items"]
+        assert orm_items == fast_items, "两条路径的输出不一致"
+    
+    orm = await measure(orm_path, session_factory, limit, repeat)
+    fast = await measure(fast_path, session_factory, limit, repeat)
+    print(json.dumps({
+        "rows": rows,
+        "limit": limit,
+        "orm_ms": round(orm * 1000, 3),
+        "fast_ms": round(fast * 1000, 3),
+        "speedup": round(orm / fast, 2),
+    }))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="列表响应序列化微基准")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.limit, args.repeat))
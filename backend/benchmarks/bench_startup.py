@@ -0,0 +1,169 @@
+"""
+冷启动基准
+
+在临时数据库中用 python -m todolistv2 seed 写入种子数据，然后多次用
+python -X importtime -m todolistv2 serve --workers 1 启动服务，每次记录：
+
+- 从启动进程到第一次 /health 返回200的时间
+- 随后第一次和第二次列表、单条请求的耗时（预热关闭时第一次请求要构建路由上下文、
+  编译SQL、建立连接）
+- -X importtime 输出的导入总耗时，以及按顶层包汇总的导入耗时
+
+默认分别在预热开启和关闭（STARTUP_WARMUP）时各运行 --runs 次，取中位数。
+-X importtime 本身会使导入变慢一些，各模式下的开销相同，结果可以相互比较。
+
+运行:
+  python -m benchmarks.bench_startup [--runs 5] [--rows 100000] [--modes warm,cold] [--top 10]
+"""
+
+import argparse
+import json
+import os
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+BACKEND = Path(__file__).resolve().parent.parent
+SRC = BACKEND / "src"
+
+MODES = {"warm": "true", "cold": "false"}
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_importtime(stderr: str) -> tuple[float, Counter]:
+    """
+    解析 -X importtime 的输出
+
+    Returns:
+        (导入总耗时毫秒, {顶层包: 自身耗时毫秒之和})
+    """
+    total = 0.0
+    packages = Counter()
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match is None:
+            continue
+        self_ms = int(match.group(1)) / 1000
+        total += self_ms
+        packages[match.group(4).split(".")[0]] += self_ms
+    return total, packages
+
+
+def wait_healthy(url: str, process: subprocess.Popen, started: float, timeout: float = 30) -> float:
+    """轮询 /health 直到返回200，返回从started开始的秒数"""
+    with httpx.Client(timeout=1) as client:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"服务启动失败，退出码 {process.returncode}")
+            try:
+                if client.get(f"{url}/health").status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                time.sleep(0.005)
+    raise RuntimeError("等待服务启动超时")
+
+
+def timed_get(client: httpx.Client, path: str) -> float:
+    """执行一个GET请求，返回耗时毫秒"""
+    started = time.perf_counter()
+    client.get(path).raise_for_status()
+    return (time.perf_counter() - started) * 1000
+
+
+def run_once(args, env: dict, directory: Path, index: int) -> dict:
+    url = f"http://127.0.0.1:{args.port}"
+    stderr_path = directory / f"stderr_{index}.txt"
+    with open(stderr_path, "w", encoding="utf-8") as stderr:
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-X", "importtime", "-m", "todolistv2", "serve", "--host", "127.0.0.1",
+             "--port", str(args.port), "--workers", "1", "--log-level", "warning"],
+            cwd=SRC, env=env, stdout=subprocess.DEVNULL, stderr=stderr,
+        )
+        try:
+            health = wait_healthy(url, server, started)
+            # 新的客户端连接，只测服务端第一次处理这些请求的耗时
+            with httpx.Client(base_url=url, timeout=10) as client:
+                client.get("/metrics")
+                latencies = {
+                    "first_list_ms": timed_get(client, "/api/v1/todos/?limit=20"),
+                    "second_list_ms": timed_get(client, "/api/v1/todos/?limit=20&offset=20"),
+                    "first_get_ms": timed_get(client, "/api/v1/todos/1"),
+                    "second_get_ms": timed_get(client, "/api/v1/todos/2"),
+                }
+        finally:
+            server.send_signal(signal.SIGTERM)
+            exit_code = server.wait(timeout=60)
+    import_ms, packages = parse_importtime(stderr_path.read_text(encoding="utf-8"))
+    return {
+        "health_ms": health * 1000,
+        **latencies,
+        "import_ms": import_ms,
+        "packages": packages,
+        "exit_code": exit_code,
+    }
+
+
+def summarize(runs: list[dict], top: int) -> dict:
+    """各指标取中位数，导入耗时按包取中位数后列出最大的top个"""
+    summary = {
+        key: round(statistics.median(run[key] for run in runs), 2)
+        for key in ("health_ms", "first_list_ms", "second_list_ms", "first_get_ms",
+                    "second_get_ms", "import_ms")
+    }
+    summary["min_health_ms"] = round(min(run["health_ms"] for run in runs), 2)
+    names = set().union(*(run["packages"] for run in runs))
+    packages = {
+        name: statistics.median(run["packages"].get(name, 0.0) for run in runs) for name in names
+    }
+    summary["top_imports_ms"] = {
+        name: round(value, 1)
+        for name, value in sorted(packages.items(), key=lambda item: -item[1])[:top]
+    }
+    summary["exit_codes"] = sorted({run["exit_code"] for run in runs})
+    return summary
+
+
+def main(args) -> int:
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as tmp:
+        directory = Path(tmp)
+        env = {**os.environ, "DATABASE_URL": f"sqlite+aiosqlite:///{directory / 'bench.db'}"}
+        subprocess.run(
+            [sys.executable, "-m", "todolistv2", "seed", "--rows", str(args.rows), "--seed", str(args.seed)],
+            cwd=SRC, env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        results = {}
+        for mode in args.modes:
+            mode_env = {**env, "STARTUP_WARMUP": MODES[mode]}
+            runs = [run_once(args, mode_env, directory, index) for index in range(args.runs)]
+            results[mode] = summarize(runs, args.top)
+            print(f"{mode}: health {results[mode]['health_ms']} ms", file=sys.stderr)
+
+    print(json.dumps({
+        "config": {"rows": args.rows, "runs": args.runs, "python": sys.version.split()[0]},
+        "results": results,
+    }, ensure_ascii=False, indent=2))
+    return 0 if all(result["exit_codes"] == [0] for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="冷启动基准")
+    parser.add_argument("--runs", type=int, default=5, help="每种模式的启动次数")
+    parser.add_argument("--rows", type=int, default=100000, help="种子数据行数")
+    parser.add_argument(
+        "--modes", type=lambda value: value.split(","), default=list(MODES),
+        help="逗号分隔：warm（开启预热）、cold（关闭预热）"
+    )
+    parser.add_argument("--top", type=int, default=10, help="列出导入耗时最大的包的个数")
+    parser.add_argument("--port", type=int, default=8798, help="服务端口")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    sys.exit(main(parser.parse_args()))
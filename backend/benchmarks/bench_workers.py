@@ -0,0 +1,139 @@
+"""
+多进程扩展基准
+
+在临时数据库中用 python -m todolistv2 seed 写入种子数据，然后对每个工作进程数：
+用 python -m todolistv2 serve 启动服务，等待 /health 成功后，同时运行 --clients 个
+loadgen 进程施加闭环负载，汇总吞吐和延迟，最后发送SIGTERM并确认服务正常退出。
+
+默认的场景只有读（list/get），各工作进程数的数据相同，结果可以直接比较；
+含写操作的 --mix 下多个进程的写事务经SQLite的数据库锁串行，写吞吐不随进程数增加。
+
+负载生成器同样占用CPU：工作进程数加客户端数超过核数时，结果受生成器限制，
+此时吞吐随进程数的增长会提前停止（speedup列会反映出来）。
+
+运行:
+  python -m benchmarks.bench_workers [--workers 1,2,4] [--rows 100000] [--clients 2] [--duration 10]
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND = Path(__file__).resolve().parent.parent
+SRC = BACKEND / "src"
+
+
+def wait_healthy(url: str, process: subprocess.Popen, timeout: float = 30) -> float:
+    """轮询 /health 直到成功，返回等待的秒数"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务启动失败，退出码 {process.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError("等待服务启动超时")
+
+
+def run_clients(url: str, args, directory: Path, workers: int) -> list[dict]:
+    """同时运行 --clients 个loadgen进程，返回各自的报告"""
+    processes = []
+    for index in range(args.clients):
+        output = directory / f"loadgen_{workers}_{index}.json"
+        command = [
+            sys.executable, "-m", "benchmarks.loadgen", "--url", url,
+            "--concurrency", str(args.concurrency), "--duration", str(args.duration),
+            "--mix", args.mix, "--seed", str(args.seed + index),
+            "--prefetch-ids", "1000", "--output", str(output),
+        ]
+        processes.append((subprocess.Popen(
+            command, cwd=BACKEND, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ), output))
+    reports = []
+    for process, output in processes:
+        if process.wait() != 0:
+            raise RuntimeError(f"loadgen退出码 {process.returncode}")
+        reports.append(json.loads(output.read_text(encoding="utf-8")))
+    return reports
+
+
+def bench_workers(workers: int, args, env: dict, directory: Path) -> dict:
+    url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "todolistv2", "serve", "--host", "127.0.0.1",
+         "--port", str(args.port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=SRC, env=env,
+    )
+    try:
+        startup = wait_healthy(url, server)
+        reports = run_clients(url, args, directory, workers)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        exit_code = server.wait(timeout=60)
+    # 各客户端的百分位不能直接合并，延迟取最差的客户端
+    return {
+        "startup_seconds": round(startup, 3),
+        "rps": round(sum(report["summary"]["achieved_rps"] for report in reports), 1),
+        "requests": sum(report["summary"]["requests"] for report in reports),
+        "errors": sum(report["summary"]["errors"] for report in reports),
+        "p50_ms": max(report["latency_ms"]["p50"] for report in reports),
+        "p99_ms": max(report["latency_ms"]["p99"] for report in reports),
+        "exit_code": exit_code,
+    }
+
+
+def main(args) -> int:
+    with tempfile.TemporaryDirectory(prefix="bench_workers_") as tmp:
+        directory = Path(tmp)
+        env = {**os.environ, "DATABASE_URL": f"sqlite+aiosqlite:///{directory / 'bench.db'}"}
+        subprocess.run(
+            [sys.executable, "-m", "todolistv2", "seed", "--rows", str(args.rows), "--seed", str(args.seed)],
+            cwd=SRC, env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        results = {}
+        for workers in args.workers:
+            results[workers] = bench_workers(workers, args, env, directory)
+            print(f"{workers} workers: {results[workers]}", file=sys.stderr)
+
+    baseline = results[args.workers[0]]["rps"] / args.workers[0]
+    for workers, result in results.items():
+        result["speedup"] = round(result["rps"] / baseline, 2) if baseline else 0.0
+    print(json.dumps({
+        "config": {
+            "cpu_count": os.cpu_count(),
+            "rows": args.rows,
+            "clients": args.clients,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mix": args.mix,
+        },
+        "results": results,
+    }, ensure_ascii=False, indent=2))
+    return 0 if all(result["errors"] == 0 and result["exit_code"] == 0 for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多进程扩展基准")
+    parser.add_argument(
+        "--workers", type=lambda value: [int(part) for part in value.split(",")],
+        default=[1, 2, 4], help="逗号分隔的工作进程数"
+    )
+    parser.add_argument("--rows", type=int, default=100000, help="种子数据行数")
+    parser.add_argument("--clients", type=int, default=2, help="同时运行的loadgen进程数")
+    parser.add_argument("--concurrency", type=int, default=64, help="每个loadgen进程的并发数")
+    parser.add_argument("--duration", type=float, default=10, help="每轮负载的时长（秒）")
+    parser.add_argument("--mix", default="list=60,get=40", help="场景权重，见loadgen")
+    parser.add_argument("--port", type=int, default=8799, help="服务端口")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,358 @@
+"""
+并发负载生成器
+
+用asyncio和httpx向运行中的服务（或 --in-process 时进程内的应用）发送按权重混合的请求：
+
+- 不指定 --rps 时为闭环：--concurrency 个worker各自连续发送请求，延迟从实际发送算起
+- 指定 --rps 时为开环：按固定间隔排定每个请求的发送时间，最多 --concurrency 个请求同时
+  进行；延迟从排定时间算起，服务变慢导致的排队时间也计入，避免协调遗漏
+  （coordinated omission）使延迟看起来偏低
+
+延迟用对数分桶的直方图（与HdrHistogram相同的思路，约0.4%的相对精度）统计，
+输出各百分位、按场景的统计和错误分类。--output 写入的JSON键顺序和精度固定，
+可以直接对比两个版本的结果。
+
+场景：list（分页列表）、get、create、update、delete，权重用 --mix 指定。
+get/update/delete 使用启动时预取的以及运行中创建的ID；get/update与并发的delete
+落在同一条记录上时会得到404，计入错误分类。--in-process 时应用使用
+DATABASE_URL 指定的数据库，负载生成器与应用共用一个事件循环，结果包含生成器自身的开销。
+
+运行:
+  python -m benchmarks.loadgen --url http://localhost:8000 --concurrency 64 --duration 30 --rps 2000
+  python -m benchmarks.loadgen --in-process --mix list=60,get=30,create=5,update=4,delete=1
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+
+API = "/api/v1/todos"
+DEFAULT_MIX = "list=50,get=30,create=10,update=5,delete=5"
+SCENARIOS = ("list", "get", "create", "update", "delete")
+PERCENTILES = (50, 75, 90, 95, 99, 99.9, 99.99)
+
+
+class LatencyHistogram:
+    """
+    对数分桶的延迟直方图
+
+    以微秒计，每个2的幂区间再均分为sub_buckets个桶，相对误差不超过1/sub_buckets；
+    记录一次只是一次字典更新，内存与样本数无关
+    """
+
+    def __init__(self, sub_buckets: int = 256):
+        self._bits = sub_buckets.bit_length()  # 保留的有效二进制位数
+        self.counts: Counter[int] = Counter()
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds: float) -> None:
+        value = max(0, int(seconds * 1_000_000))
+        shift = max(0, value.bit_length() - self._bits)
+        # 桶的上界，百分位按上界报告，只会高估不会低估
+        self.counts[((value >> shift) + 1 << shift) - 1 if shift else value] += 1
+        self.total += 1
+        self.max = max(self.max, value)
+
+    def percentiles(self, percentiles=PERCENTILES) -> dict:
+        """Returns: {"p50": 毫秒, ...}，没有样本时为空"""
+        if not self.total:
+            return {}
+        result = {}
+        ordered = sorted(self.counts.items())
+        seen = 0
+        index = 0
+        for percentile in percentiles:
+            target = max(1, math.ceil(self.total * percentile / 100))
+            while seen + ordered[index][1] < target:
+                seen += ordered[index][1]
+                index += 1
+            value = min(ordered[index][0], self.max)
+            result[f"p{percentile:g}"] = round(value / 1000, 3)
+        result["max"] = round(self.max / 1000, 3)
+        return result
+
+
+class IdPool:
+    """已知存在的记录ID，delete会先把ID移出，避免并发请求重复删除"""
+
+    def __init__(self, rng: random.Random):
+        self._rng = rng
+        self._ids: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, todo_id: int) -> None:
+        self._ids.append(todo_id)
+
+    def pick(self) -> Optional[int]:
+        return self._rng.choice(self._ids) if self._ids else None
+
+    def take(self) -> Optional[int]:
+        if not self._ids:
+            return None
+        index = self._rng.randrange(len(self._ids))
+        self._ids[index], self._ids[-1] = self._ids[-1], self._ids[index]
+        return self._ids.pop()
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """解析 list=50,get=30 形式的场景权重"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"未知场景: {name}，可选: {', '.join(SCENARIOS)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"权重无效: {part}")
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("至少一个场景的权重必须大于0")
+    return mix
+
+
+class LoadGenerator:
+    """
+    Args:
+        client: httpx客户端，base_url指向服务
+        mix: 场景权重
+        concurrency: 同时进行的请求上限
+        duration: 发送请求的时长（秒）
+        rps: 目标每秒请求数，None表示闭环
+        seed: 随机种子
+    """
+
+    def __init__(self, client: httpx.AsyncClient, mix: dict[str, float], concurrency: int,
+                 duration: float, rps: Optional[float] = None, seed: int = 42):
+        self.client = client
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.concurrency = concurrency
+        self.duration = duration
+        self.rps = rps
+        self.rng = random.Random(seed)
+        self.ids = IdPool(self.rng)
+        self.histogram = LatencyHistogram()
+        self.by_scenario = {name: LatencyHistogram() for name in self.names}
+        self.errors: Counter[str] = Counter()
+        self.errors_by_scenario: dict[str, Counter[str]] = {name: Counter() for name in self.names}
+        self.not_sent = 0
+
+    async def prefetch_ids(self, limit: int) -> None:
+        """按游标翻页读取已有记录的ID"""
+        cursor = None
+        while len(self.ids) < limit:
+            params = {"limit": 100, "fields": "id", "total": "none"}
+            if cursor:
+                params["cursor"] = cursor
+            response = await self.client.get(f"{API}/", params=params)
+            response.raise_for_status()
+            page = response.json()
+            for item in page["items"]:
+                self.ids.add(item["id"])
+            cursor = page.get("next_cursor")
+            if not cursor:
+                break
+
+    def _request(self, name: str) -> tuple[str, str, str, dict]:
+        """Returns: (实际执行的场景, 方法, URL, httpx参数)；没有可用ID时改为create"""
+        if name == "list":
+            offset = self.rng.randrange(0, 10) * 20
+            return name, "GET", f"{API}/", {"params": {"limit": 20, "offset": offset}}
+        if name in ("get", "update"):
+            todo_id = self.ids.pick()
+        elif name == "delete":
+            todo_id = self.ids.take()
+        else:
+            todo_id = None
+        if todo_id is None:
+            name = "create"
+        if name == "create":
+            return name, "POST", f"{API}/", {"json": {"title": "负载测试", "description": "loadgen"}}
+        if name == "get":
+            return name, "GET", f"{API}/{todo_id}", {}
+        if name == "update":
+            return name, "PUT", f"{API}/{todo_id}", {"json": {"completed": self.rng.random() < 0.5}}
+        return name, "DELETE", f"{API}/{todo_id}", {}
+
+    async def _send(self, scheduled: float) -> None:
+        """发送一个请求，延迟从scheduled算起"""
+        name = self.rng.choices(self.names, self.weights)[0]
+        name, method, url, kwargs = self._request(name)
+        error = None
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            if response.status_code >= 400:
+                error = f"status_{response.status_code}"
+            elif name == "create":
+                self.ids.add(response.json()["id"])
+        except httpx.HTTPError as exc:
+            error = type(exc).__name__
+        latency = time.perf_counter() - scheduled
+        self.histogram.record(latency)
+        if name not in self.by_scenario:
+            self.by_scenario[name] = LatencyHistogram()
+            self.errors_by_scenario[name] = Counter()
+        self.by_scenario[name].record(latency)
+        if error is not None:
+            self.errors[error] += 1
+            self.errors_by_scenario[name][error] += 1
+
+    async def _closed_loop_worker(self, deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            await self._send(time.perf_counter())
+
+    async def _open_loop_worker(self, schedule: asyncio.Queue, give_up_at: float) -> None:
+        while (scheduled := await schedule.get()) is not None:
+            now = time.perf_counter()
+            if now >= give_up_at:
+                self.not_sent += 1
+                continue
+            if scheduled > now:
+                await asyncio.sleep(scheduled - now)
+            await self._send(scheduled)
+
+    async def run(self, drain_timeout: float = 10.0) -> float:
+        """
+        运行负载
+
+        Args:
+            drain_timeout: 开环时发送结束后，仍在排队的请求最多再等待的秒数，
+                超时未发出的计入not_sent
+
+        Returns:
+            实际耗时（秒）
+        """
+        started = time.perf_counter()
+        deadline = started + self.duration
+        if self.rps is None:
+            await asyncio.gather(*[
+                self._closed_loop_worker(deadline) for _ in range(self.concurrency)
+            ])
+            return time.perf_counter() - started
+
+        schedule: asyncio.Queue = asyncio.Queue()
+        workers = [
+            asyncio.create_task(self._open_loop_worker(schedule, deadline + drain_timeout))
+            for _ in range(self.concurrency)
+        ]
+        interval = 1 / self.rps
+        count = 0
+        while (scheduled := started + count * interval) < deadline:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            schedule.put_nowait(scheduled)
+            count += 1
+        for _ in workers:
+            schedule.put_nowait(None)
+        await asyncio.gather(*workers)
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float, config: dict) -> dict:
+        completed = self.histogram.total
+        errors = sum(self.errors.values())
+        return {
+            "config": config,
+            "summary": {
+                "requests": completed,
+                "errors": errors,
+                "error_rate": round(errors / completed, 4) if completed else 0.0,
+                "not_sent": self.not_sent,
+                "elapsed_seconds": round(elapsed, 3),
+                "achieved_rps": round(completed / elapsed, 1) if elapsed else 0.0,
+            },
+            "latency_ms": self.histogram.percentiles(),
+            "scenarios": {
+                name: {
+                    "requests": histogram.total,
+                    "errors": dict(sorted(self.errors_by_scenario[name].items())),
+                    "latency_ms": histogram.percentiles(),
+                }
+                for name, histogram in sorted(self.by_scenario.items())
+            },
+            "errors": dict(sorted(self.errors.items())),
+        }
+
+
+def format_table(report: dict) -> str:
+    """HdrHistogram风格的百分位表"""
+    lines = [f"{'percentile':>12} {'latency(ms)':>12}"]
+    for key, value in report["latency_ms"].items():
+        lines.append(f"{key:>12} {value:>12.3f}")
+    summary = report["summary"]
+    lines.append(
+        f"requests={summary['requests']} errors={summary['errors']} "
+        f"not_sent={summary['not_sent']} rps={summary['achieved_rps']}"
+    )
+    return "\n".join(lines)
+
+
+@asynccontextmanager
+async def open_client(args):
+    """连接到 --url，或在进程内运行应用（包括lifespan中的初始化和写队列）"""
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    if not args.in_process:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+            yield client
+        return
+    from src.todolistv2.main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://loadgen", limits=limits, timeout=timeout
+        ) as client:
+            yield client
+
+
+async def main(args) -> int:
+    async with open_client(args) as client:
+        generator = LoadGenerator(
+            client, args.mix, args.concurrency, args.duration, args.rps, args.seed
+        )
+        await generator.prefetch_ids(args.prefetch_ids)
+        elapsed = await generator.run(args.drain_timeout)
+    report = generator.report(elapsed, {
+        "target": "in-process" if args.in_process else args.url,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "rps": args.rps,
+        "mix": args.mix,
+        "seed": args.seed,
+    })
+    print(format_table(report), file=sys.stderr)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="并发负载生成器")
+    parser.add_argument("--url", default="http://localhost:8000", help="服务地址")
+    parser.add_argument("--in-process", action="store_true", help="在进程内运行应用，不经过网络")
+    parser.add_argument("--concurrency", type=int, default=32, help="同时进行的请求上限")
+    parser.add_argument("--duration", type=float, default=10, help="发送请求的时长（秒）")
+    parser.add_argument("--rps", type=float, help="目标每秒请求数（开环）；不指定时为闭环")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help="场景权重")
+    parser.add_argument("--timeout", type=float, default=10, help="单个请求的超时（秒）")
+    parser.add_argument("--drain-timeout", type=float, default=10, help="开环结束后排队请求的最长等待（秒）")
+    parser.add_argument("--prefetch-ids", type=int, default=10000, help="启动时读取的已有记录ID数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--output", help="JSON报告写入的文件")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,141 @@
+"""
+命令行入口
+
+    python -m todolistv2 import FILE [--format ndjson|csv] [--chunk-size N]
+    python -m todolistv2 seed --rows N [--completed-ratio R] [--desc-len-dist SPEC] [--seed S]
+    python -m todolistv2 serve [--workers N] [--host HOST] [--port PORT]
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import sys
+
+from .config import IMPORT_CHUNK_SIZE, SERVER_WORKERS, SHUTDOWN_TIMEOUT_SECONDS
+from .database import AsyncSessionLocal, engine, init_db, read_engine
+from .importer import IMPORT_FORMATS, import_todos
+
+
+async def _read_file(path: str, chunk_size: int = 64 * 1024):
+    """按块读取文件，path为 - 时读取标准输入"""
+    stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while chunk := stream.read(chunk_size):
+            yield chunk
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+async def run_import(args: argparse.Namespace) -> int:
+    """导入文件并输出统计，有被拒绝的记录时返回1"""
+    import_format = args.format or ("csv" if args.file.lower().endswith(".csv") else "ndjson")
+    await init_db()
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await import_todos(
+                db, _read_file(args.file), format=import_format, chunk_size=args.chunk_size
+            )
+    finally:
+        await engine.dispose()
+        await read_engine.dispose()
+    print(json.dumps(result.as_dict(), ensure_ascii=False, indent=2))
+    return 1 if result.rejected else 0
+
+
+async def run_seed(args: argparse.Namespace) -> int:
+    """向配置的SQLite数据库文件写入合成数据并输出统计"""
+    url = engine.url
+    if url.database in (None, "", ":memory:"):
+        raise ValueError("seed只支持SQLite数据库文件")
+    # 只有seed用到，serve/import启动时不导入（模块导入时生成描述文本）
+    from .seeder import seed_todos
+    await init_db()
+    # 写入期间独占数据库，先释放建表用的连接
+    await engine.dispose()
+    await read_engine.dispose()
+    result = await asyncio.to_thread(
+        seed_todos,
+        url.database,
+        args.rows,
+        completed_ratio=args.completed_ratio,
+        description_length=args.desc_len_dist,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        span_days=args.span_days,
+    )
+    print(json.dumps(result.as_dict(), ensure_ascii=False, indent=2))
+    return 0
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    """多进程启动服务，见server模块"""
+    # 只在启动服务时导入应用，import/seed 不需要
+    from .server import ServerOptions, serve
+    return serve(ServerOptions(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=args.loop,
+        http=args.http,
+        shutdown_timeout=args.shutdown_timeout,
+        log_level=args.log_level,
+        access_log=args.access_log,
+    ))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m todolistv2")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="从NDJSON/CSV文件导入待办事项")
+    import_parser.add_argument("file", help="文件路径，- 表示标准输入")
+    import_parser.add_argument(
+        "--format", choices=IMPORT_FORMATS, help="文件格式，默认按扩展名判断（.csv为CSV，其余为NDJSON）"
+    )
+    import_parser.add_argument(
+        "--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="每批插入并提交的记录数"
+    )
+    import_parser.set_defaults(handler=run_import)
+
+    seed_parser = commands.add_parser("seed", help="写入可复现的合成数据（仅SQLite）")
+    seed_parser.add_argument("--rows", type=int, required=True, help="写入的行数，可写作 5_000_000")
+    seed_parser.add_argument("--completed-ratio", type=float, default=0.3, help="已完成的比例")
+    seed_parser.add_argument(
+        "--desc-len-dist", default="uniform:0-200",
+        help="描述长度分布：fixed:N、uniform:MIN-MAX、normal:MEAN:STDDEV 或 exp:MEAN，长度0为无描述"
+    )
+    seed_parser.add_argument("--seed", type=int, default=42, help="随机种子，相同参数生成相同数据")
+    seed_parser.add_argument("--batch-size", type=int, default=50000, help="每次executemany的行数")
+    seed_parser.add_argument("--span-days", type=float, default=365, help="创建时间分布的天数")
+    seed_parser.set_defaults(handler=run_seed)
+
+    serve_parser = commands.add_parser("serve", help="以多个工作进程启动服务（生产环境）")
+    serve_parser.add_argument("--host", default="0.0.0.0", help="监听地址")
+    serve_parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    serve_parser.add_argument(
+        "--workers", type=int, default=SERVER_WORKERS, help="工作进程数，默认 WEB_CONCURRENCY 或CPU核数"
+    )
+    serve_parser.add_argument("--loop", default="uvloop", help="uvicorn事件循环实现")
+    serve_parser.add_argument("--http", default="httptools", help="uvicorn HTTP协议实现")
+    serve_parser.add_argument(
+        "--shutdown-timeout", type=float, default=SHUTDOWN_TIMEOUT_SECONDS,
+        help="收到SIGTERM后等待进行中请求完成的最长秒数"
+    )
+    serve_parser.add_argument("--log-level", default="info", help="uvicorn日志级别")
+    serve_parser.add_argument("--access-log", action="store_true", help="记录访问日志")
+    serve_parser.set_defaults(handler=run_serve)
+
+    args = parser.parse_args(argv)
+    try:
+        if inspect.iscoroutinefunction(args.handler):
+            return asyncio.run(args.handler(args))
+        return args.handler(args)
+    except ValueError as exc:
+        print(f"错误: {exc}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,26 +2,143 @@
 待办事项API路由
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, WebSocket
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Optional
-from ..database import get_db
+from typing import Literal, Optional, Union
+import zlib
+import anyio
+from starlette.websockets import WebSocketDisconnect
+from ..cache import MISSING, todo_cache
+from ..compression import ENCODINGS, EncodedBody, negotiate_encoding
+from ..config import BULK_MAX_BATCH, EVENTS_HEARTBEAT_SECONDS, EXPORT_BATCH_SIZE
+from ..database import get_db, get_read_db, get_read_session_factory
+from ..serialization import JSONBytesResponse, dumps, encode_csv, encode_ndjson
+from ..write_queue import write_queue
+from ..importer import import_todos
+from ..events import TooManySubscribers, event_bus
 from ..models import Todo
-from ..schemas import TodoCreate, TodoUpdate, TodoResponse, TodoListResponse
+from ..schemas import (
+    TodoCreate, TodoUpdate, TodoResponse, TodoListResponse,
+    TodoPartialResponse, TodoPartialListResponse,
+    TodoBulkUpdate, TodoBulkUpdateResponse, TodoSearchResponse, TodoImportResponse,
+    TodoChangesResponse, parse_fields
+)
 from ..crud import (
-    get_todos, get_todo, create_todo, update_todo,
-    delete_todo, delete_completed_todos, delete_all_todos
+    get_collection_version, get_todo_list_response, get_todo_response, get_todo_changes,
+    search_todos, stream_todos,
+    create_todo, create_todos,
+    update_todo, update_todos, delete_todo, delete_completed_todos, delete_all_todos
 )
 
 router = APIRouter(prefix="/todos", tags=["todos"])
 
 
-@router.get("/", response_model=TodoListResponse)
+async def _write(db: AsyncSession, fn, *args):
+    """
+    执行单条写操作：写队列运行时交给队列组提交，否则直接使用请求会话
+    """
+    if write_queue.running:
+        return await write_queue.submit(fn, *args)
+    return await fn(db, *args)
+
+
+def _encoded_etag(etag: str, coding: str) -> str:
+    """
+    同一内容不同压缩方式的版本使用不同的强ETag：压缩版本在引号内追加 -gzip/-br
+    """
+    return etag if coding == "identity" else f'{etag[:-1]}-{coding}"'
+
+
+def _matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """
+    在If-None-Match请求头中查找当前内容任一压缩版本的ETag（弱比较）
+    
+    Args:
+        if_none_match: 请求头的值
+        etag: 未压缩版本的ETag
+    
+    Returns:
+        匹配到的版本的ETag（* 对应未压缩版本），没有匹配时为None
+    """
+    if not if_none_match:
+        return None
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if "*" in candidates:
+        return etag
+    for coding in ("identity", *ENCODINGS):
+        variant = _encoded_etag(etag, coding)
+        if variant in candidates:
+            return variant
+    return None
+
+
+def _item_etag(todo_id: int, row_version: int, fields: Optional[tuple[str, ...]] = None) -> str:
+    """
+    单条记录的ETag
+    
+    由id和行版本（每次修改时由触发器更新，见models）组成，不需要先序列化记录；
+    稀疏字段的响应内容不同，在后面附加字段名
+    """
+    suffix = f"-{'+'.join(fields)}" if fields is not None else ""
+    return f'"{todo_id}-{row_version}{suffix}"'
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[tuple[str, ...]]:
+    try:
+        return parse_fields(fields)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    )
+
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", encode_ndjson),
+    "csv": ("text/csv; charset=utf-8", encode_csv),
+}
+
+
+async def _export_chunks(session_factory, completed, export_format, compress):
+    """在独立的只读会话中逐批读取、编码并按需压缩导出内容"""
+    encode = EXPORT_FORMATS[export_format][1]
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    
+    def output(chunk: bytes) -> bytes:
+        return compressor.compress(chunk) if compressor is not None else chunk
+    
+    if export_format == "csv":
+        header = output(encode_csv([], header=True))
+        if header:
+            yield header
+    async with session_factory() as session:
+        async for rows in stream_todos(session, completed=completed, batch_size=EXPORT_BATCH_SIZE):
+            chunk = output(encode(rows))
+            if chunk:
+                yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+
+
+@router.get("/", response_model=Union[TodoListResponse, TodoPartialListResponse])
 async def read_todos(
     completed: Optional[str] = Query(None, description="筛选条件: true/false/all"),
     limit: int = Query(50, ge=1, le=100, description="限制返回数量"),
     offset: int = Query(0, ge=0, description="偏移量"),
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页的next_cursor"),
+    total: Literal["estimate", "exact", "none"] = Query(
+        "estimate", description="总数统计方式: estimate/exact/none"
+    ),
+    fields: Optional[str] = Query(None, description="只返回指定字段，例如 id,title,completed"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     获取待办事项列表
@@ -29,25 +146,240 @@ async def read_todos(
     - **completed**: 筛选条件 ('true', 'false', 'all')
     - **limit**: 限制返回数量 (1-100)
     - **offset**: 偏移量
+    - **cursor**: 分页游标，提供时忽略offset，翻页代价与深度无关
+    - **total**: estimate 读取计数器；exact 执行COUNT(*)；none 不返回总数
+    - **fields**: 稀疏字段，只查询并返回指定的列（总是包含id）
+    
+    响应带有由集合版本生成的ETag（压缩版本带 -gzip/-br 后缀），请求头If-None-Match
+    匹配任一版本时返回304，不执行分页查询。编码后的响应按 (集合版本, 查询参数) 缓存，
+    同一页的gzip/br版本在第一次被协商到时压缩并加入缓存
+    """
+    field_names = _parse_fields(fields)
+    version = await get_collection_version(db)
+    etag = f'"todos-{version}"'
+    matched = _matching_etag(if_none_match, etag)
+    if matched is not None:
+        return _not_modified(matched)
+    
+    params = (completed, limit, offset, cursor, total, field_names)
+    page = todo_cache.get_list(version, params)
+    cached = page is not MISSING
+    if not cached:
+        try:
+            content = await get_todo_list_response(
+                db, completed=completed, limit=limit, offset=offset, cursor=cursor,
+                total_mode=total, fields=field_names
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        # 数据来自数据库且结构固定，直接编码，不再按response_model校验
+        page = EncodedBody(dumps(content))
+    variants = len(page.variants)
+    coding, body = page.encode(negotiate_encoding(accept_encoding))
+    if not cached or len(page.variants) != variants:
+        todo_cache.put_list(version, params, page, 128 + page.size)
+    
+    headers = {
+        "ETag": _encoded_etag(etag, coding), "Cache-Control": "no-cache", "Vary": "Accept-Encoding"
+    }
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    return JSONBytesResponse(body, headers=headers)
+
+
+def _parse_last_event_id(value: Optional[str]) -> Optional[str]:
+    """
+    规范化Last-Event-ID，空值按未提供处理；其他进程的id和无效的id由
+    EventBus.subscribe按已过期处理
+    """
+    value = (value or "").strip()
+    return value or None
+
+
+async def _sse_stream(last_event_id: Optional[str]):
+    """订阅事件并编码为SSE消息，空闲时发送注释行作为心跳"""
+    try:
+        subscription = event_bus.subscribe(last_event_id)
+    except TooManySubscribers:
+        return
+    with subscription:
+        yield b"retry: 3000\n\n"
+        while True:
+            event = await subscription.get(timeout=EVENTS_HEARTBEAT_SECONDS)
+            yield event.sse() if event is not None else b": ping\n\n"
+
+
+@router.get("/events")
+async def todo_events(last_event_id: Optional[str] = Header(None)):
+    """
+    以Server-Sent Events推送待办事项的变更
+    
+    事件类型：
+    - **created**: `todos` 为新建的完整记录
+    - **updated**: `ids` 或 `filter` 指定的记录写入了 `changes` 中的字段
+    - **deleted**: 删除了 `ids` 或 `filter` 指定的记录
+    - **resync**: 事件有丢失（消费过慢或重连时已超出保留范围），或有不能逐条描述的
+      写入（导入、其他工作进程的写入），需要重新拉取列表
+    
+    每个事件的id为 "{boot_id}-{seq}"（SSE的id，也在data中），断线重连时浏览器
+    会通过Last-Event-ID请求补发；重连到其他工作进程或进程重启后先收到resync。空闲时每隔EVENTS_HEARTBEAT_SECONDS秒发送一次心跳注释
+    """
+    if event_bus.full:
+        raise HTTPException(status_code=503, detail="订阅者数量已达上限")
+    return StreamingResponse(
+        _sse_stream(_parse_last_event_id(last_event_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/events/ws")
+async def todo_events_ws(websocket: WebSocket, last_event_id: Optional[str] = None):
+    """
+    以WebSocket推送待办事项的变更，每条文本消息是一个事件的JSON，
+    内容与SSE接口的data相同；空闲时发送 {"type":"ping"} 心跳。
+    重连时通过查询参数last_event_id传入收到的最后一个事件的id
+    """
+    try:
+        subscription = event_bus.subscribe(_parse_last_event_id(last_event_id))
+    except TooManySubscribers:
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    
+    with subscription:
+        async with anyio.create_task_group() as task_group:
+            async def watch_disconnect():
+                # 客户端发来的消息一律忽略，只用于发现断开
+                while (await websocket.receive())["type"] != "websocket.disconnect":
+                    pass
+                task_group.cancel_scope.cancel()
+            
+            task_group.start_soon(watch_disconnect)
+            try:
+                while True:
+                    event = await subscription.get(timeout=EVENTS_HEARTBEAT_SECONDS)
+                    await websocket.send_text(
+                        event.data.decode() if event is not None else '{"type":"ping"}'
+                    )
+            except WebSocketDisconnect:
+                task_group.cancel_scope.cancel()
+
+
+@router.get("/export")
+async def export_todos(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="导出格式: ndjson/csv"),
+    completed: Optional[str] = Query(None, description="筛选条件: true/false/all"),
+    accept_encoding: Optional[str] = Header(None),
+    session_factory: async_sessionmaker = Depends(get_read_session_factory)
+):
+    """
+    流式导出全部待办事项
+    
+    - **format**: ndjson 每行一个与TodoResponse结构相同的JSON对象；csv 带表头
+    - **completed**: 筛选条件 ('true', 'false', 'all')
+    
+    按id顺序通过服务端游标分批读取并编码，内存占用与数据量无关，导出内容是
+    同一个读事务中的一致快照。请求头Accept-Encoding包含gzip时响应以gzip压缩
     """
-    todos, total = await get_todos(db, completed=completed, limit=limit, offset=offset)
-    return TodoListResponse(
-        items=[TodoResponse.model_validate(todo) for todo in todos],
-        total=total,
-        limit=limit,
-        offset=offset
+    media_type = EXPORT_FORMATS[format][0]
+    compress = negotiate_encoding(accept_encoding, ("gzip",)) == "gzip"
+    headers = {
+        "Content-Disposition": f'attachment; filename="todos.{format}"',
+        "Vary": "Accept-Encoding",
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        _export_chunks(session_factory, completed, format, compress),
+        media_type=media_type, headers=headers
     )
 
 
-@router.get("/{todo_id}", response_model=TodoResponse)
-async def read_todo(todo_id: int, db: AsyncSession = Depends(get_db)):
+@router.get("/changes", response_model=TodoChangesResponse)
+async def read_todo_changes(
+    since: int = Query(0, ge=0, description="上次同步返回的next_since，0表示全量"),
+    limit: int = Query(500, ge=1, le=1000, description="每页最多返回的变更数"),
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页的next_cursor"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    增量同步：返回since之后插入、修改和删除的待办事项
+    
+    - **since**: 上次同步最后一页返回的next_since；0表示本地没有数据
+    - **limit**: 每页最多返回的变更数
+    - **cursor**: has_more为true时用next_cursor继续请求，直到has_more为false，
+      保存最后一页的next_since
+    
+    本地数据早于已清理的删除记录时返回resync_required，需要从since=0重新同步
+    """
+    try:
+        content = await get_todo_changes(db, since=since, limit=limit, cursor=cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return JSONBytesResponse(content)
+
+
+@router.get("/search", response_model=TodoSearchResponse)
+async def search_todo_items(
+    q: str = Query(..., min_length=1, max_length=200, description="检索文本，空白分隔的词需全部命中"),
+    completed: Optional[str] = Query(None, description="筛选条件: true/false/all"),
+    limit: int = Query(20, ge=1, le=100, description="限制返回数量"),
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页的next_cursor"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    全文检索待办事项的标题和描述
+    
+    - **q**: 检索文本；至少3个字符的词使用FTS5索引并按bm25相关度排序，
+      全部短于3个字符时按创建时间倒序逐行匹配
+    - **completed**: 筛选条件 ('true', 'false', 'all')
+    - **limit**: 限制返回数量 (1-100)
+    - **cursor**: 分页游标
+    
+    title_highlight和description_snippet是HTML片段：文本已做HTML转义，
+    命中词用<mark>标出
+    """
+    try:
+        content = await search_todos(db, q, completed=completed, limit=limit, cursor=cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return JSONBytesResponse(content)
+
+
+@router.get("/{todo_id}", response_model=Union[TodoResponse, TodoPartialResponse])
+async def read_todo(
+    todo_id: int,
+    fields: Optional[str] = Query(None, description="只返回指定字段，例如 id,title,completed"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     根据ID获取单个待办事项
+    
+    - **fields**: 稀疏字段，只查询并返回指定的列（总是包含id）
+    
+    请求头If-None-Match与记录的ETag匹配时返回304，不序列化记录。压缩在这里协商
+    而不是交给GZipMiddleware，压缩版本才能带上自己的ETag
     """
-    todo = await get_todo(db, todo_id)
-    if todo is None:
+    field_names = _parse_fields(fields)
+    result = await get_todo_response(db, todo_id, fields=field_names)
+    if result is None:
         raise HTTPException(status_code=404, detail="待办事项不存在")
-    return TodoResponse.model_validate(todo)
+    
+    row_version, todo = result
+    etag = _item_etag(todo_id, row_version, field_names)
+    matched = _matching_etag(if_none_match, etag)
+    if matched is not None:
+        return _not_modified(matched)
+    coding, body = EncodedBody(dumps(todo)).encode(negotiate_encoding(accept_encoding))
+    headers = {
+        "ETag": _encoded_etag(etag, coding), "Cache-Control": "no-cache", "Vary": "Accept-Encoding"
+    }
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    return JSONBytesResponse(body, headers=headers)
 
 
 @router.post("/", response_model=TodoResponse, status_code=201)
@@ -55,7 +387,87 @@ async def create_todo_item(todo: TodoCreate, db: AsyncSession = Depends(get_db))
     """
     创建新的待办事项
     """
-    return TodoResponse.model_validate(await create_todo(db, todo))
+    return TodoResponse.model_validate(await _write(db, create_todo, todo))
+
+
+@router.post("/bulk", response_model=list[TodoResponse], status_code=201)
+async def create_todos_bulk(todos: list[TodoCreate], db: AsyncSession = Depends(get_db)):
+    """
+    批量创建待办事项
+    
+    所有条目在一个事务内写入；任意一条校验失败时返回422，
+    错误位置(loc)中包含该条目的下标，且不会写入任何数据
+    """
+    if len(todos) > BULK_MAX_BATCH:
+        raise HTTPException(
+            status_code=413,
+            detail=f"单次最多创建 {BULK_MAX_BATCH} 条待办事项"
+        )
+    return [TodoResponse.model_validate(todo) for todo in await create_todos(db, todos)]
+
+
+async def _upload_chunks(upload, chunk_size: int = 64 * 1024):
+    """按块读取上传的文件"""
+    while chunk := await upload.read(chunk_size):
+        yield chunk
+
+
+@router.post("/import", response_model=TodoImportResponse)
+async def import_todo_items(
+    request: Request,
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="导入格式: ndjson/csv"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    从NDJSON或CSV流式导入待办事项
+    
+    - **format**: ndjson 每行一个JSON对象；csv 需带表头且包含title列
+    
+    请求体可以直接是文件内容，也可以是multipart/form-data上传的文件。
+    记录按title、description、completed校验，其余字段（如导出的id和时间）忽略；
+    校验失败的记录跳过并在errors中列出行号，其余记录按批插入并分别提交
+    """
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            async with request.form() as form:
+                uploads = [value for value in form.values() if not isinstance(value, str)]
+                if not uploads:
+                    raise HTTPException(status_code=400, detail="未找到上传的文件")
+                result = await import_todos(db, _upload_chunks(uploads[0]), format=format)
+        else:
+            result = await import_todos(db, request.stream(), format=format)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return result.as_dict()
+
+
+@router.patch("/bulk", response_model=TodoBulkUpdateResponse)
+async def update_todos_bulk(bulk: TodoBulkUpdate, db: AsyncSession = Depends(get_db)):
+    """
+    批量更新待办事项
+    
+    - **ids**: 按ID集合更新
+    - **filter**: 按条件更新，例如 {"completed": "false"}
+    - **update**: 部分更新内容，例如 {"completed": true}
+    - **return_items**: 为true时返回更新后的记录，否则只返回数量
+    """
+    if bulk.ids is not None and len(bulk.ids) > BULK_MAX_BATCH:
+        raise HTTPException(
+            status_code=413,
+            detail=f"单次最多更新 {BULK_MAX_BATCH} 个ID"
+        )
+    updated, todos = await update_todos(
+        db,
+        bulk.update,
+        ids=bulk.ids,
+        completed=bulk.filter.completed if bulk.filter else None,
+        returning=bulk.return_items
+    )
+    return TodoBulkUpdateResponse(
+        updated=updated,
+        items=[TodoResponse.model_validate(todo) for todo in todos] if bulk.return_items else None
+    )
 
 
 @router.put("/{todo_id}", response_model=TodoResponse)
@@ -67,7 +479,7 @@ async def update_todo_item(
     """
     更新待办事项
     """
-    todo = await update_todo(db, todo_id, todo_update)
+    todo = await _write(db, update_todo, todo_id, todo_update)
     if todo is None:
         raise HTTPException(status_code=404, detail="待办事项不存在")
     return TodoResponse.model_validate(todo)
@@ -94,6 +506,6 @@ async def delete_todo_item(todo_id: int, db: AsyncSession = Depends(get_db)):
     """
     删除待办事项
     """
-    success = await delete_todo(db, todo_id)
+    success = await _write(db, delete_todo, todo_id)
     if not success:
         raise HTTPException(status_code=404, detail="待办事项不存在") 
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+进程内读缓存
+
+单条记录按 ("todo", 纪元, id) 缓存，列表页按 ("todos", 集合版本, 查询参数) 缓存
+编码后的响应（JSON字节及已协商过的压缩版本，见compression.EncodedBody），
+命中时不再序列化和压缩。
+集合版本保存在数据库中（todo_stats.version，由触发器递增），任何进程的写入都会
+使旧版本的列表页不再被命中，随后由LRU淘汰。
+写操作提交后：更新/删除单条记录时删除该记录的键；无法确定影响范围的批量写操作
+递增纪元，使所有单条记录缓存失效。其他进程的写入由watcher.ChangeWatcher
+根据集合版本发现，同样递增纪元。
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, Optional, Protocol
+
+from .config import CACHE_ENABLED, CACHE_MAX_BYTES, CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS
+
+# 缓存未命中的标记，区别于缓存的None值
+MISSING = object()
+
+
+class CacheBackend(Protocol):
+    """缓存后端接口"""
+    
+    def get(self, key: Hashable) -> Any: ...
+    
+    def set(self, key: Hashable, value: Any, size: int) -> None: ...
+    
+    def delete(self, key: Hashable) -> None: ...
+    
+    def clear(self) -> None: ...
+    
+    def stats(self) -> dict: ...
+
+
+class LRUCache:
+    """按条目数和字节数限制大小的LRU缓存，条目超过TTL后失效"""
+    
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        expires_at, size, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def set(self, key: Hashable, value: Any, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (time.monotonic() + self.ttl, size, value)
+        self._bytes += size
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+    
+    def delete(self, key: Hashable) -> None:
+        if key in self._data:
+            self._remove(key)
+    
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+    
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+        }
+    
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+
+class NullCache:
+    """不缓存任何内容的后端，用于关闭缓存"""
+    
+    def get(self, key: Hashable) -> Any:
+        return MISSING
+    
+    def set(self, key: Hashable, value: Any, size: int) -> None:
+        pass
+    
+    def delete(self, key: Hashable) -> None:
+        pass
+    
+    def clear(self) -> None:
+        pass
+    
+    def stats(self) -> dict:
+        return {"enabled": False}
+
+
+class TodoCache:
+    """待办事项读缓存，负责键的组织和写后失效"""
+    
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.item_epoch = 0
+        # 每次失效都递增，读取开始后若发生过失效则不写回，避免旧数据覆盖失效
+        self.invalidations = 0
+    
+    def snapshot(self) -> int:
+        """读取数据库之前调用，返回值传给put_*"""
+        return self.invalidations
+    
+    def get_item(self, todo_id: int) -> Any:
+        return self.backend.get(("todo", self.item_epoch, todo_id))
+    
+    def put_item(self, snapshot: int, todo_id: int, value: Any, size: int) -> None:
+        if snapshot == self.invalidations:
+            self.backend.set(("todo", self.item_epoch, todo_id), value, size)
+    
+    def get_list(self, version: int, params: tuple) -> Any:
+        return self.backend.get(("todos", version, params))
+    
+    def put_list(self, version: int, params: tuple, value: Any, size: int) -> None:
+        # 列表页在读取集合版本之后查询，数据不会比版本旧，无需检查snapshot；
+        # 增加了压缩版本的条目再次写入以更新占用的字节数
+        self.backend.set(("todos", version, params), value, size)
+    
+    def invalidate(self, ids: Optional[Iterable[int]] = None, all_items: bool = False) -> None:
+        """
+        写操作提交后调用
+        
+        Args:
+            ids: 被修改或删除的记录ID
+            all_items: 影响范围未知时使所有单条记录缓存失效
+        """
+        self.invalidations += 1
+        if all_items:
+            self.item_epoch += 1
+        for todo_id in ids or ():
+            self.backend.delete(("todo", self.item_epoch, todo_id))
+    
+    def clear(self) -> None:
+        self.backend.clear()
+        self.invalidations += 1
+    
+    def stats(self) -> dict:
+        return {"item_epoch": self.item_epoch, **self.backend.stats()}
+
+
+todo_cache = TodoCache(
+    LRUCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_TTL_SECONDS)
+    if CACHE_ENABLED else NullCache()
+)
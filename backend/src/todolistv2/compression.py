@@ -0,0 +1,113 @@
+"""
+响应压缩
+
+按请求头Accept-Encoding在br、gzip和不压缩之间协商。安装了brotli（speedups可选依赖）
+时优先br，否则只提供gzip。列表页的JSON字节和各压缩版本一起保存在读缓存中
+（EncodedBody），命中时直接发送；单条记录在接口中协商压缩，压缩版本带有各自的ETag；
+其余响应由GZipMiddleware按COMPRESS_MIN_SIZE压缩。
+"""
+
+import gzip
+from functools import lru_cache
+from typing import Optional
+
+from .config import BROTLI_QUALITY, COMPRESS_MIN_SIZE, GZIP_LEVEL
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 取决于是否安装speedups依赖
+    brotli = None
+
+# 服务端支持的压缩方式，客户端给出相同权重时按此顺序优先
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def _quality(params: str) -> float:
+    for param in params.split(";"):
+        name, _, value = param.strip().partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+@lru_cache(maxsize=256)
+def negotiate_encoding(accept_encoding: Optional[str], available: tuple = ENCODINGS) -> str:
+    """
+    选择响应的压缩方式
+
+    取权重最高（q>0）的可用压缩方式，权重相同时按available的顺序；未列出的方式
+    使用 * 的权重。请求头的取值种类很少，结果按原始字符串缓存
+
+    Args:
+        accept_encoding: 请求头Accept-Encoding的值
+        available: 可用的压缩方式，按优先顺序
+
+    Returns:
+        available中的一项，或identity（不压缩）
+    """
+    if not accept_encoding:
+        return "identity"
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        weights["gzip" if coding == "x-gzip" else coding] = _quality(params)
+    best, best_weight = "identity", 0.0
+    for coding in available:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    """
+    按指定方式压缩
+
+    Raises:
+        ValueError: 不支持的压缩方式
+    """
+    if coding == "gzip":
+        # mtime固定为0，相同内容的压缩结果相同
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if coding == "br" and brotli is not None:
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    raise ValueError(f"不支持的压缩方式: {coding}")
+
+
+class EncodedBody:
+    """
+    同一响应内容的原始字节和按需生成的压缩版本
+
+    Args:
+        body: 未压缩的响应内容
+        min_size: 短于此长度的内容不压缩，总是返回原始字节
+    """
+
+    __slots__ = ("variants", "min_size")
+
+    def __init__(self, body: bytes, min_size: int = COMPRESS_MIN_SIZE):
+        self.variants = {"identity": body}
+        self.min_size = min_size
+
+    @property
+    def size(self) -> int:
+        return sum(len(variant) for variant in self.variants.values())
+
+    def encode(self, coding: str) -> tuple[str, bytes]:
+        """
+        取得协商结果对应的版本，第一次使用时压缩并保存
+
+        Returns:
+            (实际使用的压缩方式, 响应内容)
+        """
+        body = self.variants["identity"]
+        if coding == "identity" or len(body) < self.min_size:
+            return "identity", body
+        variant = self.variants.get(coding)
+        if variant is None:
+            variant = self.variants[coding] = compress(body, coding)
+        return coding, variant
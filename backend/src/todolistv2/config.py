@@ -0,0 +1,71 @@
+"""
+应用配置（从环境变量读取）
+"""
+
+import os
+
+# 批量创建接口单次请求允许的最大条数
+BULK_MAX_BATCH = int(os.getenv("BULK_MAX_BATCH", "1000"))
+
+# 流式导出时每次从数据库游标读取并编码的行数
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# 流式导入：每批插入并提交的行数、响应中最多列出的错误数、单条记录的最大字符数
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+IMPORT_MAX_RECORD_LENGTH = int(os.getenv("IMPORT_MAX_RECORD_LENGTH", "65536"))
+
+# 变更事件推送（SSE/WebSocket）：每个订阅者的队列长度、订阅者上限、
+# 供断线重连补发的最近事件数、空闲时的心跳间隔（秒）
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "10000"))
+EVENTS_REPLAY_SIZE = int(os.getenv("EVENTS_REPLAY_SIZE", "1024"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+
+# 增量同步：删除记录保留的天数（更早离线的客户端需要全量重新同步）、
+# 清理过期删除记录的间隔（秒）
+TOMBSTONE_RETENTION_DAYS = float(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+TOMBSTONE_COMPACT_INTERVAL_SECONDS = float(os.getenv("TOMBSTONE_COMPACT_INTERVAL_SECONDS", "3600"))
+
+# 慢查询日志：执行时间不低于该阈值（毫秒）的SQL语句连同参数形状和查询计划写入日志，
+# 设为负数关闭
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+
+# 生产启动器（python -m todolistv2 serve）：工作进程数（默认CPU核数）、
+# 收到SIGTERM后等待进行中的请求完成的最长时间（秒），超时后强制关闭连接
+SERVER_WORKERS = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("SHUTDOWN_TIMEOUT_SECONDS", "30"))
+
+# 启动时预热：建立连接池中的连接，并在进程内执行一遍常用的读请求，
+# 使路由解析、SQL编译等一次性开销不落在第一批真实请求上
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes")
+
+# SQLite性能配置档: durable / balanced / fast，见 database.SQLITE_PROFILES
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "balanced")
+
+# 只读连接池大小（文件数据库），写连接固定为1个
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", str(min(8, os.cpu_count() or 1))))
+
+# 等待空闲连接的超时时间（秒）
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# 组提交写队列：在时间窗口内或达到最大条数时，把并发的写操作合并到一个事务提交
+WRITE_QUEUE_ENABLED = os.getenv("WRITE_QUEUE_ENABLED", "true").lower() in ("1", "true", "yes")
+WRITE_QUEUE_WINDOW_MS = float(os.getenv("WRITE_QUEUE_WINDOW_MS", "1"))
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "64"))
+
+# 读缓存：LRU + TTL，按条目数和估算字节数限制内存
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+
+# 跨进程写入监视：检查集合版本的间隔（秒），发现其他进程的写入后使本进程的单条记录
+# 缓存失效并向订阅者发布resync事件；设为0关闭
+CHANGE_POLL_INTERVAL_SECONDS = float(os.getenv("CHANGE_POLL_INTERVAL_SECONDS", "1"))
+
+# 响应压缩：小于此字节数的响应不压缩；gzip压缩级别（1-9）和brotli压缩质量（0-11，
+# 需要安装speedups可选依赖）。列表页的压缩结果随读缓存保存，其余响应每次压缩
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
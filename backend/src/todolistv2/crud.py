@@ -2,34 +2,239 @@
 CRUD操作函数
 """
 
+import base64
+import html
+import json
+import re
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, delete
+from sqlalchemy import (
+    select, func, delete, insert, update, tuple_, type_coerce, literal, literal_column,
+    and_, or_, String, Row
+)
 from sqlalchemy.orm import selectinload
-from typing import Optional, List
-from .models import Todo
-from .schemas import TodoCreate, TodoUpdate
+from typing import AsyncIterator, Optional, List, Sequence
+from .cache import MISSING, todo_cache
+from .database import on_commit
+from .events import event_bus
+from .models import Todo, TodoStats, TodoTombstone, todos_fts
+from .schemas import TodoCreate, TodoUpdate, TodoResponse
+from .serialization import todo_row_to_dict
+from .watcher import change_watcher
+
+
+async def _commit(db: AsyncSession) -> None:
+    """
+    提交事务；在组提交写队列中执行时只flush，由队列统一提交
+    """
+    if db.info.get("defer_commit"):
+        await db.flush()
+    else:
+        await db.commit()
+
+
+def _invalidate_cache(
+    db: AsyncSession,
+    ids: Optional[List[int]] = None,
+    all_items: bool = False
+) -> None:
+    """
+    在事务提交后使读缓存失效
+    """
+    on_commit(db, lambda: todo_cache.invalidate(ids=ids, all_items=all_items))
+
+
+def _record_changes(db: AsyncSession, rows: int) -> None:
+    """
+    在事务提交后登记本进程写入的行数，供跨进程写入监视区分本进程的写入
+    """
+    if rows:
+        on_commit(db, lambda: change_watcher.record_local(rows))
+
+
+def _publish(db: AsyncSession, event: dict) -> None:
+    """
+    在事务提交后发布变更事件，回滚时丢弃
+    """
+    on_commit(db, lambda: event_bus.publish(event))
+
+
+def _event_todo(todo) -> dict:
+    """把ORM对象或Core行转换为事件中使用的JSON结构（同TodoResponse）"""
+    return TodoResponse.model_validate(todo).model_dump(mode="json")
+
+
+def _response_size(todo: dict) -> int:
+    """估算缓存条目占用的字节数"""
+    return 256 + (len(todo.get("title") or "") + len(todo.get("description") or "")) * 4
+
+
+def _todo_columns(fields: Optional[Sequence[str]] = None) -> list:
+    """
+    构建查询的列，created_at/updated_at取数据库中的原始字符串
+    
+    Args:
+        fields: 需要的字段，为空时查询全部字段；id和created_at总会查询，
+            用于生成分页游标
+    """
+    columns = {
+        "title": Todo.title,
+        "description": Todo.description,
+        "id": Todo.id,
+        "completed": Todo.completed,
+        "created_at": type_coerce(Todo.created_at, String).label("created_at"),
+        "updated_at": type_coerce(Todo.updated_at, String).label("updated_at"),
+    }
+    if fields is None:
+        return list(columns.values())
+    required = set(fields) | {"id", "created_at"}
+    return [column for name, column in columns.items() if name in required]
+
+
+def encode_cursor(*values) -> str:
+    """
+    将分页位置编码为不透明的游标字符串
+
+    Args:
+        values: 排序键，例如 (created_at原始值, id)
+
+    Returns:
+        base64url编码的游标
+    """
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: tuple = (str, int)) -> tuple:
+    """
+    解析游标字符串
+
+    Args:
+        cursor: encode_cursor生成的游标
+        types: 各排序键的类型，默认 (created_at, id)
+
+    Returns:
+        排序键组成的元组
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception as exc:
+        raise ValueError("无效的分页游标") from exc
+    if (
+        not isinstance(values, list)
+        or len(values) != len(types)
+        or not all(isinstance(value, kind) for value, kind in zip(values, types))
+    ):
+        raise ValueError("无效的分页游标")
+    return tuple(values)
+
+
+async def get_todo_stats(db: AsyncSession) -> TodoStats:
+    """
+    获取触发器维护的待办事项计数
+    
+    Args:
+        db: 数据库会话
+    
+    Returns:
+        TodoStats对象（total / completed / active）
+    """
+    stats = await db.get(TodoStats, 1, populate_existing=True)
+    return stats if stats is not None else TodoStats(id=1, total=0, completed=0)
+
+
+async def get_collection_version(db: AsyncSession) -> int:
+    """
+    获取集合版本，todos的任何写入都会使其递增
+    
+    Args:
+        db: 数据库会话
+    
+    Returns:
+        当前集合版本
+    """
+    version = await db.scalar(select(TodoStats.version).where(TodoStats.id == 1))
+    return version or 0
+
+
+async def count_todos(
+    db: AsyncSession,
+    completed: Optional[str] = None,
+    mode: str = "estimate"
+) -> Optional[int]:
+    """
+    统计待办事项数量
+    
+    Args:
+        db: 数据库会话
+        completed: 筛选条件 ('true', 'false', 'all')
+        mode: 'estimate' 读取计数器（O(1)）；'exact' 执行COUNT(*)；'none' 不统计
+    
+    Returns:
+        数量，mode为'none'时返回None
+    """
+    if mode == "none":
+        return None
+    
+    if mode == "estimate":
+        stats = await get_todo_stats(db)
+        if completed == "true":
+            return stats.completed
+        if completed == "false":
+            return stats.active
+        return stats.total
+    
+    query = select(func.count()).select_from(Todo)
+    if completed == "true":
+        query = query.where(Todo.completed == True)
+    elif completed == "false":
+        query = query.where(Todo.completed == False)
+    return await db.scalar(query)
 
 
 async def get_todos(
     db: AsyncSession,
     completed: Optional[str] = None,
     limit: int = 50,
-    offset: int = 0
-) -> tuple[List[Todo], int]:
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    total_mode: str = "estimate",
+    fields: Optional[Sequence[str]] = None
+) -> tuple[List[Row], Optional[int], Optional[str]]:
     """
     获取待办事项列表
     
+    支持两种分页方式：
+    - offset模式：按偏移量跳过记录，深度翻页的代价随offset线性增长
+    - cursor模式：按 (created_at, id) 定位上一页末尾继续读取，
+      借助 idx_todos_completed_created 索引，任意深度的翻页代价相同
+    
+    返回Core行而不是ORM对象，created_at/updated_at为数据库中的原始字符串，
+    可直接用serialization.todo_row_to_dict转换
+    
     Args:
         db: 数据库会话
         completed: 筛选条件 ('true', 'false', 'all')
         limit: 限制数量
-        offset: 偏移量
+        offset: 偏移量（提供cursor时忽略）
+        cursor: 上一页返回的next_cursor
+        total_mode: 总数统计方式，见count_todos
+        fields: 只查询这些列（见schemas.parse_fields），为空时查询全部列
     
     Returns:
-        (todos, total_count)
+        (rows, total_count, next_cursor)
+    
+    Raises:
+        ValueError: 游标格式无效
     """
     # 构建查询条件
-    query = select(Todo)
+    # created_at按数据库原始字符串比较，避免DateTime绑定参数的格式与
+    # CURRENT_TIMESTAMP默认值的格式不一致导致同一秒内的记录被重复或遗漏
+    created_at_raw = type_coerce(Todo.created_at, String)
+    query = select(*_todo_columns(fields))
     
     if completed == "true":
         query = query.where(Todo.completed == True)
@@ -38,15 +243,27 @@ async def get_todos(
     # completed == "all" 或 None 时不过滤
     
     # 获取总数
-    count_query = select(func.count()).select_from(query.subquery())
-    total = await db.scalar(count_query)
+    total = await count_todos(db, completed=completed, mode=total_mode)
     
-    # 获取分页数据
-    query = query.order_by(Todo.created_at.desc()).offset(offset).limit(limit)
-    result = await db.execute(query)
-    todos = result.scalars().all()
+    # 获取分页数据，多取一条用于判断是否还有下一页
+    query = query.order_by(Todo.created_at.desc(), Todo.id.desc())
+    if cursor is not None:
+        last_created_at, last_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(created_at_raw, Todo.id)
+            < tuple_(literal(last_created_at, String), literal(last_id))
+        )
+    else:
+        query = query.offset(offset)
+    result = await db.execute(query.limit(limit + 1))
+    rows = result.all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
     
-    return list(todos), total
+    return rows, total, next_cursor
 
 
 async def get_todo(db: AsyncSession, todo_id: int) -> Optional[Todo]:
@@ -65,6 +282,370 @@ async def get_todo(db: AsyncSession, todo_id: int) -> Optional[Todo]:
     return result.scalar_one_or_none()
 
 
+async def get_todo_response(
+    db: AsyncSession,
+    todo_id: int,
+    fields: Optional[Sequence[str]] = None
+) -> Optional[tuple[int, dict]]:
+    """
+    获取单个待办事项的响应数据（优先读缓存）
+    
+    缓存中只保存完整记录及其行版本；指定fields且未命中缓存时只查询这些列，结果不缓存
+    
+    Args:
+        db: 数据库会话
+        todo_id: 待办事项ID
+        fields: 只返回这些字段（见schemas.parse_fields）
+    
+    Returns:
+        (行版本, 与TodoResponse结构相同的dict)，记录不存在时为None（不缓存）
+    """
+    cached = todo_cache.get_item(todo_id)
+    if cached is not MISSING:
+        if fields is None:
+            return cached
+        row_version, response = cached
+        return row_version, {name: response[name] for name in fields}
+    
+    snapshot = todo_cache.snapshot()
+    query = select(*_todo_columns(fields), Todo.row_version).where(Todo.id == todo_id)
+    row = (await db.execute(query)).first()
+    if row is None:
+        return None
+    result = row.row_version, todo_row_to_dict(row, fields)
+    if fields is None:
+        todo_cache.put_item(snapshot, todo_id, result, _response_size(result[1]))
+    return result
+
+
+async def get_todo_list_response(
+    db: AsyncSession,
+    completed: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    total_mode: str = "estimate",
+    fields: Optional[Sequence[str]] = None
+) -> dict:
+    """
+    获取待办事项列表的响应数据，参数同get_todos
+    
+    列表页由接口层编码后按集合版本缓存（见api.todos.read_todos），这里总是查询数据库
+    
+    Returns:
+        与TodoListResponse结构相同的dict，可直接编码为JSON
+    
+    Raises:
+        ValueError: 游标格式无效
+    """
+    rows, total, next_cursor = await get_todos(
+        db, completed=completed, limit=limit, offset=offset, cursor=cursor,
+        total_mode=total_mode, fields=fields
+    )
+    return {
+        "items": [todo_row_to_dict(row, fields) for row in rows],
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "next_cursor": next_cursor,
+    }
+
+
+async def get_todo_changes(
+    db: AsyncSession,
+    since: int = 0,
+    limit: int = 500,
+    cursor: Optional[str] = None
+) -> dict:
+    """
+    获取某个集合版本之后的增量变更
+    
+    每行的row_version和每条删除记录的version都是发生变化时的集合版本，互不相同。
+    两者按版本合并排序后分页返回：upserted为插入或修改过的完整记录，deleted为
+    删除的ID。since=0表示客户端没有数据，返回全部记录且不返回删除记录。
+    
+    删除记录按保留期压缩后，todo_stats.tombstone_floor记录已清理的最大版本；
+    客户端的数据早于它（或since大于当前版本，例如数据库被替换）时无法保证
+    收到全部删除，返回resync_required，客户端应清空本地数据后从since=0重新同步。
+    
+    Args:
+        db: 数据库会话
+        since: 客户端上次同步得到的next_since
+        limit: 每页最多返回的变更数
+        cursor: 上一页返回的next_cursor，提供时忽略since
+    
+    Returns:
+        与TodoChangesResponse结构相同的dict
+    
+    Raises:
+        ValueError: 游标格式无效
+    """
+    stats = await get_todo_stats(db)
+    version = stats.version or 0
+    floor = stats.tombstone_floor or 0
+    if cursor is not None:
+        # base: 本轮同步开始时客户端数据对应的版本，用于判断删除记录是否已被清理
+        after, base = decode_cursor(cursor, (int, int))
+    else:
+        after = base = since
+    
+    if base > version or 0 < base < floor:
+        return {
+            "upserted": [],
+            "deleted": [],
+            "has_more": False,
+            "next_cursor": None,
+            "next_since": None,
+            "resync_required": True,
+        }
+    
+    rows = (await db.execute(
+        select(*_todo_columns(), Todo.row_version)
+        .where(Todo.row_version > after)
+        .order_by(Todo.row_version)
+        .limit(limit + 1)
+    )).all()
+    tombstones = []
+    if base > 0:
+        tombstones = (await db.execute(
+            select(TodoTombstone.id, TodoTombstone.version)
+            .where(TodoTombstone.version > after)
+            .order_by(TodoTombstone.version)
+            .limit(limit + 1)
+        )).all()
+    
+    # 删除记录以ID表示，与记录行按版本合并
+    changes = sorted(
+        [(row.row_version, row) for row in rows]
+        + [(tombstone.version, tombstone.id) for tombstone in tombstones],
+        key=lambda change: change[0]
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    upserted = []
+    deleted = []
+    for _, change in changes:
+        if isinstance(change, int):
+            deleted.append(change)
+        else:
+            upserted.append(todo_row_to_dict(change))
+    
+    if has_more:
+        # 首页的base取当前版本：客户端此后拿到的数据都不早于这个版本
+        next_base = base if base > 0 else version
+        next_cursor, next_since = encode_cursor(changes[-1][0], next_base), None
+    else:
+        next_cursor, next_since = None, version
+    return {
+        "upserted": upserted,
+        "deleted": deleted,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+        "next_since": next_since,
+        "resync_required": False,
+    }
+
+
+async def compact_tombstones(db: AsyncSession, retention_seconds: float) -> int:
+    """
+    清理超过保留期的删除记录，并把清理掉的最大版本记入tombstone_floor
+    
+    Args:
+        db: 数据库会话（写连接）
+        retention_seconds: 保留期（秒）
+    
+    Returns:
+        清理的记录数
+    """
+    cutoff = func.datetime("now", f"{-retention_seconds:+.0f} seconds")
+    floor = await db.scalar(
+        select(func.max(TodoTombstone.version)).where(TodoTombstone.deleted_at < cutoff)
+    )
+    if floor is None:
+        return 0
+    result = await db.execute(delete(TodoTombstone).where(TodoTombstone.version <= floor))
+    await db.execute(
+        update(TodoStats)
+        .where(TodoStats.id == 1)
+        .values(tombstone_floor=func.max(TodoStats.tombstone_floor, floor))
+    )
+    await _commit(db)
+    return result.rowcount
+
+
+async def stream_todos(
+    db: AsyncSession,
+    completed: Optional[str] = None,
+    batch_size: int = 1000
+) -> AsyncIterator[Sequence[Row]]:
+    """
+    按id顺序分批读取全部待办事项
+    
+    使用服务端游标（stream + yield_per），每次只在内存中保留一批行，
+    内存占用与表大小无关；整个读取过程处于同一个读事务中，看到的是一致的快照
+    
+    Args:
+        db: 数据库会话
+        completed: 筛选条件 ('true', 'false', 'all')
+        batch_size: 每批行数
+    
+    Yields:
+        一批Core行，created_at/updated_at为数据库中的原始字符串
+    """
+    query = select(*_todo_columns()).order_by(Todo.id)
+    if completed == "true":
+        query = query.where(Todo.completed == True)
+    elif completed == "false":
+        query = query.where(Todo.completed == False)
+    
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    try:
+        async for rows in result.partitions():
+            yield rows
+    finally:
+        await result.close()
+
+
+# trigram分词器只能检索至少3个字符的词
+FTS_MIN_TERM_LENGTH = 3
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+SNIPPET_TOKENS = 32
+
+# highlight()/snippet()先用控制字符标出命中词，HTML转义后再替换为<mark>，
+# 标题和描述中的<、&等字符不会作为HTML输出
+_MARK_OPEN = "\x02"
+_MARK_CLOSE = "\x03"
+
+
+def _escape_marked(text: Optional[str]) -> Optional[str]:
+    """HTML转义用_MARK_OPEN/_MARK_CLOSE标出命中词的文本，再把标记换成<mark>"""
+    if text is None:
+        return None
+    return (
+        html.escape(text)
+        .replace(_MARK_OPEN, HIGHLIGHT_OPEN)
+        .replace(_MARK_CLOSE, HIGHLIGHT_CLOSE)
+    )
+
+
+def _contains_term(term: str):
+    """title或description包含检索词（LIKE，ASCII字母不区分大小写）"""
+    return or_(
+        Todo.title.contains(term, autoescape=True),
+        Todo.description.contains(term, autoescape=True),
+    )
+
+
+def _highlight(text: Optional[str], terms: Sequence[str]) -> Optional[str]:
+    """用与FTS5路径相同的方式标出检索词并做HTML转义"""
+    if not text or not terms:
+        return _escape_marked(text)
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    return _escape_marked(pattern.sub(lambda m: f"{_MARK_OPEN}{m.group(0)}{_MARK_CLOSE}", text))
+
+
+async def search_todos(
+    db: AsyncSession,
+    q: str,
+    completed: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> dict:
+    """
+    全文检索待办事项的title和description
+    
+    检索词以空白分隔，必须全部出现（AND），每个词按短语匹配，不解析FTS5查询语法。
+    含有至少3个字符的检索词时走FTS5索引，按bm25相关度排序，游标为 (rank, id)；
+    其余较短的词在命中的行上用LIKE继续过滤。所有词都短于3个字符时无法使用
+    trigram索引，退化为按创建时间倒序的LIKE扫描，rank为空。
+    
+    Args:
+        db: 数据库会话
+        q: 检索文本
+        completed: 筛选条件 ('true', 'false', 'all')
+        limit: 限制数量
+        cursor: 上一页返回的next_cursor
+    
+    Returns:
+        与TodoSearchResponse结构相同的dict
+    
+    Raises:
+        ValueError: 检索词为空或游标格式无效
+    """
+    terms = q.split()
+    if not terms:
+        raise ValueError("检索词不能为空")
+    fts_terms = [term for term in terms if len(term) >= FTS_MIN_TERM_LENGTH]
+    like_terms = [term for term in terms if len(term) < FTS_MIN_TERM_LENGTH]
+    
+    conditions = [_contains_term(term) for term in like_terms]
+    if completed == "true":
+        conditions.append(Todo.completed == True)
+    elif completed == "false":
+        conditions.append(Todo.completed == False)
+    
+    if fts_terms:
+        fts = literal_column("todos_fts")
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in fts_terms)
+        rank = func.bm25(fts)
+        query = (
+            select(
+                *_todo_columns(),
+                rank.label("rank"),
+                func.highlight(fts, 0, _MARK_OPEN, _MARK_CLOSE).label("title_highlight"),
+                func.snippet(
+                    fts, 1, _MARK_OPEN, _MARK_CLOSE, "…", SNIPPET_TOKENS
+                ).label("description_snippet"),
+            )
+            .select_from(todos_fts.join(Todo.__table__, Todo.id == todos_fts.c.rowid))
+            .where(fts.op("MATCH")(match), *conditions)
+            .order_by(rank, Todo.id)
+        )
+        if cursor is not None:
+            last_rank, last_id = decode_cursor(cursor, (float, int))
+            query = query.where(tuple_(rank, Todo.id) > tuple_(literal(last_rank), literal(last_id)))
+    else:
+        created_at_raw = type_coerce(Todo.created_at, String)
+        query = (
+            select(*_todo_columns())
+            .where(and_(*conditions))
+            .order_by(Todo.created_at.desc(), Todo.id.desc())
+        )
+        if cursor is not None:
+            last_created_at, last_id = decode_cursor(cursor)
+            query = query.where(
+                tuple_(created_at_raw, Todo.id)
+                < tuple_(literal(last_created_at, String), literal(last_id))
+            )
+    
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = (
+            encode_cursor(last.rank, last.id) if fts_terms
+            else encode_cursor(last.created_at, last.id)
+        )
+    
+    items = []
+    for row in rows:
+        item = todo_row_to_dict(row)
+        if fts_terms:
+            item["rank"] = row.rank
+            item["title_highlight"] = _escape_marked(row.title_highlight)
+            item["description_snippet"] = (
+                _escape_marked(row.description_snippet) if row.description is not None else None
+            )
+        else:
+            item["rank"] = None
+            item["title_highlight"] = _highlight(row.title, like_terms)
+            item["description_snippet"] = _highlight(row.description, like_terms)
+        items.append(item)
+    return {"items": items, "limit": limit, "next_cursor": next_cursor}
+
+
 async def create_todo(db: AsyncSession, todo: TodoCreate) -> Todo:
     """
     创建新的待办事项
@@ -76,16 +657,84 @@ async def create_todo(db: AsyncSession, todo: TodoCreate) -> Todo:
     Returns:
         创建的Todo对象
     """
-    db_todo = Todo(
-        title=todo.title,
-        description=todo.description
+    # INSERT ... RETURNING 同时取回服务端生成的id和时间，提交后无需再refresh
+    query = (
+        insert(Todo)
+        .values(title=todo.title, description=todo.description)
+        .returning(Todo)
     )
-    db.add(db_todo)
-    await db.commit()
-    await db.refresh(db_todo)
+    db_todo = await db.scalar(query)
+    _invalidate_cache(db)
+    _record_changes(db, 1)
+    _publish(db, {"type": "created", "todos": [_event_todo(db_todo)]})
+    await _commit(db)
     return db_todo
 
 
+# 多行INSERT每条语句的绑定参数上限：SQLite 3.32起默认为32766
+# （全文索引的trigram分词本身要求3.34以上）
+MAX_BOUND_PARAMETERS = 32766
+
+
+async def create_todos(db: AsyncSession, todos: List[TodoCreate]) -> List[Row]:
+    """
+    批量创建待办事项
+    
+    在一个事务内用多行 INSERT ... VALUES (...), (...) RETURNING 写入，只提交一次；
+    每条语句的行数受MAX_BOUND_PARAMETERS限制，超出时分成几条语句。
+    返回Core行而不是ORM对象，省去逐行构建实例和维护identity map的开销
+    
+    Args:
+        db: 数据库会话
+        todos: 待办事项数据列表（同一类模式，例如全部为TodoCreate）
+    
+    Returns:
+        创建的行列表，顺序与输入一致
+    """
+    if not todos:
+        return []
+    
+    table = Todo.__table__
+    values = [todo.model_dump() for todo in todos]
+    chunk_size = max(1, MAX_BOUND_PARAMETERS // len(values[0]))
+    rows = []
+    for start in range(0, len(values), chunk_size):
+        result = await db.execute(
+            insert(table).values(values[start:start + chunk_size]).returning(*table.c)
+        )
+        # RETURNING的行序没有保证；同一条语句按VALUES的顺序分配递增的id
+        rows.extend(sorted(result.all(), key=lambda row: row.id))
+    _invalidate_cache(db)
+    _record_changes(db, len(rows))
+    _publish(db, {"type": "created", "todos": [_event_todo(row) for row in rows]})
+    await _commit(db)
+    return rows
+
+
+async def insert_todos(db: AsyncSession, todos: Sequence[TodoCreate]) -> int:
+    """
+    批量插入待办事项，不返回创建的行
+    
+    不带RETURNING，整批数据通过一次executemany写入；需要取回创建的行时
+    使用create_todos。不发布变更事件，由调用方在全部写入完成后通知订阅者
+    （例如导入结束时发布一条resync）
+    
+    Args:
+        db: 数据库会话
+        todos: 待办事项数据列表（同一类模式）
+    
+    Returns:
+        插入的行数
+    """
+    if not todos:
+        return 0
+    await db.execute(insert(Todo.__table__), [todo.model_dump() for todo in todos])
+    _invalidate_cache(db)
+    _record_changes(db, len(todos))
+    await _commit(db)
+    return len(todos)
+
+
 async def update_todo(
     db: AsyncSession,
     todo_id: int,
@@ -102,18 +751,87 @@ async def update_todo(
     Returns:
         更新后的Todo对象或None
     """
-    db_todo = await get_todo(db, todo_id)
-    if not db_todo:
+    update_data = todo_update.model_dump(exclude_unset=True)
+    if not update_data:
+        return await get_todo(db, todo_id)
+    
+    # 一条 UPDATE ... RETURNING 同时完成更新、存在性判断和回读
+    query = (
+        update(Todo)
+        .where(Todo.id == todo_id)
+        .values(**update_data)
+        .returning(Todo)
+    )
+    db_todo = await db.scalar(query)
+    if db_todo is None:
         return None
     
-    # 更新字段
+    _invalidate_cache(db, ids=[todo_id])
+    _record_changes(db, 1)
+    row = _event_todo(db_todo)
+    changes = {name: row[name] for name in (*update_data, "updated_at")}
+    _publish(db, {"type": "updated", "ids": [todo_id], "changes": changes})
+    await _commit(db)
+    return db_todo
+
+
+async def update_todos(
+    db: AsyncSession,
+    todo_update: TodoUpdate,
+    ids: Optional[List[int]] = None,
+    completed: Optional[str] = None,
+    returning: bool = False
+) -> tuple[int, List[Todo]]:
+    """
+    批量更新待办事项
+    
+    用一条 UPDATE ... WHERE 语句按ID集合或筛选条件更新
+    
+    Args:
+        db: 数据库会话
+        todo_update: 更新数据
+        ids: 待办事项ID列表
+        completed: 筛选条件 ('true', 'false', 'all')
+        returning: 是否返回更新后的记录
+    
+    Returns:
+        (更新数量, 更新后的Todo对象列表)，returning为False时列表为空
+    """
     update_data = todo_update.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_todo, field, value)
+    query = update(Todo).values(**update_data)
+    if ids is not None:
+        query = query.where(Todo.id.in_(ids))
+    if completed == "true":
+        query = query.where(Todo.completed == True)
+    elif completed == "false":
+        query = query.where(Todo.completed == False)
+    _invalidate_cache(db, ids=ids, all_items=ids is None)
     
-    await db.commit()
-    await db.refresh(db_todo)
-    return db_todo
+    # 事件只携带写入的字段；按条件更新且未返回记录时用筛选条件代替ID列表
+    event = {"type": "updated", "changes": todo_update.model_dump(mode="json", exclude_unset=True)}
+    if completed is not None or ids is None:
+        event["filter"] = {"completed": completed or "all"}
+    
+    if returning:
+        result = await db.scalars(query.returning(Todo))
+        todos = list(result.all())
+        _record_changes(db, len(todos))
+        if todos:
+            event.pop("filter", None)
+            event["ids"] = [todo.id for todo in todos]
+            event["changes"]["updated_at"] = _event_todo(todos[0])["updated_at"]
+            _publish(db, event)
+        await _commit(db)
+        return len(todos), todos
+    
+    result = await db.execute(query)
+    _record_changes(db, result.rowcount)
+    if result.rowcount:
+        if ids is not None:
+            event["ids"] = ids
+        _publish(db, event)
+    await _commit(db)
+    return result.rowcount, []
 
 
 async def delete_todo(db: AsyncSession, todo_id: int) -> bool:
@@ -127,12 +845,15 @@ async def delete_todo(db: AsyncSession, todo_id: int) -> bool:
     Returns:
         是否删除成功
     """
-    db_todo = await get_todo(db, todo_id)
-    if not db_todo:
+    query = delete(Todo).where(Todo.id == todo_id).returning(Todo.id)
+    deleted_id = await db.scalar(query)
+    if deleted_id is None:
         return False
     
-    await db.delete(db_todo)
-    await db.commit()
+    _invalidate_cache(db, ids=[todo_id])
+    _record_changes(db, 1)
+    _publish(db, {"type": "deleted", "ids": [todo_id]})
+    await _commit(db)
     return True
 
 
@@ -148,7 +869,11 @@ async def delete_completed_todos(db: AsyncSession) -> int:
     """
     query = delete(Todo).where(Todo.completed == True)
     result = await db.execute(query)
-    await db.commit()
+    _invalidate_cache(db, all_items=True)
+    _record_changes(db, result.rowcount)
+    if result.rowcount:
+        _publish(db, {"type": "deleted", "filter": {"completed": "true"}})
+    await _commit(db)
     return result.rowcount
 
 
@@ -164,5 +889,9 @@ async def delete_all_todos(db: AsyncSession) -> int:
     """
     query = delete(Todo)
     result = await db.execute(query)
-    await db.commit()
+    _invalidate_cache(db, all_items=True)
+    _record_changes(db, result.rowcount)
+    if result.rowcount:
+        _publish(db, {"type": "deleted", "filter": {"completed": "all"}})
+    await _commit(db)
     return result.rowcount 
\ No newline at end of file
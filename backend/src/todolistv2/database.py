@@ -2,26 +2,351 @@
 数据库配置和连接管理
 """
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.pool import StaticPool
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from time import perf_counter
+from typing import Optional
+import asyncio
+import json
+import logging
 import os
 
+from .config import DB_POOL_TIMEOUT, DB_READ_POOL_SIZE, SLOW_QUERY_MS, SQLITE_PROFILE
+from .metrics import (
+    DB_CHECKOUT_WAIT, DB_STATEMENT_DURATION, DB_STATEMENT_ROWS, current_query_stats
+)
+
+logger = logging.getLogger(__name__)
+
 # 数据库URL
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./todo.db")
 
-# 创建异步引擎
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,  # 设置为True可以看到SQL语句
-    poolclass=StaticPool,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+# SQLite性能配置档，在每个连接建立时通过PRAGMA应用
+# - durable: WAL + synchronous=FULL，每次提交都fsync，掉电不丢数据
+# - balanced: WAL + synchronous=NORMAL，只在检查点fsync，进程崩溃不丢数据
+# - fast: WAL + synchronous=OFF，交给操作系统刷盘，适合压测和可重建的数据
+SQLITE_PROFILES = {
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16000,  # 负数单位为KiB
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5000,
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -256000,
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+    },
+}
+
+
+def configure_sqlite_engine(engine: AsyncEngine, profile: str) -> None:
+    """
+    为SQLite引擎注册连接事件，在每个新连接上应用指定的配置档
+    
+    Args:
+        engine: 异步引擎
+        profile: SQLITE_PROFILES中的配置档名称
+    """
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(
+            f"未知的SQLite配置档: {profile}，可选: {', '.join(SQLITE_PROFILES)}"
+        )
+    pragmas = SQLITE_PROFILES[profile]
+    
+    @event.listens_for(engine.sync_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def enable_sqlite_transactions(engine: AsyncEngine, begin: str = "BEGIN") -> None:
+    """
+    由SQLAlchemy而不是驱动控制SQLite事务
+    
+    pysqlite/aiosqlite默认只在DML前隐式BEGIN，SAVEPOINT在事务外执行时
+    RELEASE会直接提交。关闭驱动的隐式事务并在事务开始时显式BEGIN，
+    SAVEPOINT（session.begin_nested）才能按预期工作。
+    
+    Args:
+        engine: 异步引擎
+        begin: 事务开始语句，写连接使用 BEGIN IMMEDIATE 提前获取写锁
+    """
+    @event.listens_for(engine.sync_engine, "connect")
+    def disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+    
+    @event.listens_for(engine.sync_engine, "begin")
+    def emit_begin(conn):
+        conn.exec_driver_sql(begin)
+
+
+class _TimedCheckout:
+    """记录从连接池取得连接的等待时间，标签为连接池的logging_name"""
+    
+    def connect(self):
+        started = perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_CHECKOUT_WAIT.labels(self.logging_name or "default").observe(
+                perf_counter() - started
+            )
+
+
+# 沿用SQLAlchemy的日志名称，连接池的INFO日志仍受sqlalchemy日志器的级别控制，
+# 不会随应用的INFO日志一起输出
+class TimedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.AsyncAdaptedQueuePool"
+
+
+class TimedStaticPool(_TimedCheckout, StaticPool):
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.StaticPool"
+
+
+_OPERATIONS = frozenset(("select", "insert", "update", "delete"))
+
+
+def params_shape(parameters, executemany: bool = False):
+    """
+    描述语句参数的形状（个数和类型），不包含参数值
+    
+    Returns:
+        位置参数为 {"count": 个数, "types": [类型名]}，命名参数为 {名称: 类型名}，
+        executemany 为 {"rows": 行数, "each": 第一行的形状}
+    """
+    if executemany:
+        return {
+            "rows": len(parameters),
+            "each": params_shape(parameters[0]) if parameters else None,
+        }
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return {
+            "count": len(parameters),
+            "types": sorted({type(value).__name__ for value in parameters}),
+        }
+    return type(parameters).__name__
+
+
+def explain_query_plan(conn, statement: str, parameters) -> list[str]:
+    """
+    在同一连接上执行 EXPLAIN QUERY PLAN（只支持SQLite）
+    
+    直接使用DBAPI游标，不触发游标事件
+    
+    Returns:
+        查询计划的各个节点，按层级缩进
+    """
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    depth = {0: -1}
+    plan = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        plan.append("  " * depth[node_id] + detail)
+    return plan
+
+
+def log_slow_query(conn, engine_name: str, statement: str, parameters, executemany: bool,
+                   duration: float) -> None:
+    """
+    写入一条结构化的慢查询日志
+    
+    日志消息是JSON，同一内容也放在记录的slow_query属性中供日志处理器使用
+    """
+    stats = current_query_stats.get()
+    entry = {
+        "engine": engine_name,
+        "duration_ms": round(duration * 1000, 3),
+        "request": stats.request if stats is not None else None,
+        "sql": statement,
+        "params": params_shape(parameters, executemany),
+        "plan": None,
+    }
+    keyword = statement.lstrip()[:6].lower()
+    if conn.dialect.name == "sqlite" and (keyword in _OPERATIONS or keyword.startswith("with")):
+        try:
+            entry["plan"] = explain_query_plan(
+                conn, statement, parameters[0] if executemany else parameters
+            )
+        except Exception as exc:
+            entry["plan_error"] = str(exc)
+    logger.warning("慢查询: %s", json.dumps(entry, ensure_ascii=False), extra={"slow_query": entry})
+
+
+def instrument_engine(engine: AsyncEngine, name: str, slow_query_ms: float = SLOW_QUERY_MS) -> None:
+    """
+    注册游标事件，记录SQL语句的指标、请求内的语句统计和慢查询日志
+    
+    - 按语句类型记录执行耗时，记录查询返回的行数
+    - 累计到当前请求的QueryStats（见metrics.current_query_stats）
+    - 执行时间不低于slow_query_ms的语句写入慢查询日志
+    
+    Args:
+        engine: 异步引擎
+        name: 指标中engine标签的值
+        slow_query_ms: 慢查询阈值（毫秒），负数表示不记录
+    """
+    durations = {
+        operation: DB_STATEMENT_DURATION.labels(name, operation)
+        for operation in (*_OPERATIONS, "other")
+    }
+    rows = DB_STATEMENT_ROWS.labels(name)
+    slow_threshold = slow_query_ms / 1000 if slow_query_ms >= 0 else float("inf")
+    sync_engine = getattr(engine, "sync_engine", engine)
+    
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info["statement_started"] = perf_counter()
+    
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        duration = perf_counter() - conn.info.pop("statement_started")
+        operation = statement[:6].lower()
+        durations[operation if operation in _OPERATIONS else "other"].observe(duration)
+        # aiosqlite适配器在execute时已取回全部结果；服务端游标（stream）的行数未知
+        buffered = getattr(cursor, "_rows", None)
+        if cursor.description is not None and buffered is not None:
+            rows.observe(len(buffered))
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.record(statement, duration)
+        if duration >= slow_threshold:
+            log_slow_query(conn, name, statement, parameters, executemany, duration)
+
+
+async def get_sqlite_pragmas(engine: AsyncEngine) -> dict:
+    """
+    读取连接上实际生效的PRAGMA值
+    
+    Args:
+        engine: 异步引擎
+    
+    Returns:
+        {pragma名称: 生效值}
+    """
+    async with engine.connect() as conn:
+        return {
+            name: await conn.scalar(text(f"PRAGMA {name}"))
+            for name in SQLITE_PROFILES[SQLITE_PROFILE]
+        }
+
+
+def create_engines(
+    url: str,
+    read_pool_size: int = DB_READ_POOL_SIZE,
+    profile: str = SQLITE_PROFILE
+) -> tuple[AsyncEngine, AsyncEngine]:
+    """
+    创建写引擎和读引擎
+    
+    文件型SQLite数据库使用一个只有单个连接的写引擎串行执行写事务，
+    另建一个只读连接池供查询并发使用（WAL模式下读不阻塞写）。
+    内存数据库每个连接都是独立的库，因此读写共用同一个StaticPool引擎。
+    
+    只支持SQLite：集合版本、计数和行版本由SQLite触发器维护，搜索使用FTS5，
+    结构版本记录在PRAGMA user_version中。其他数据库上这些都不存在，
+    ETag、列表缓存和计数会静默出错，因此在启动时拒绝。
+    
+    Args:
+        url: 数据库URL
+        read_pool_size: 只读连接池大小
+        profile: SQLite配置档名称
+    
+    Returns:
+        (write_engine, read_engine)
+    
+    Raises:
+        ValueError: 不是SQLite数据库URL
+    """
+    db_url = make_url(url)
+    if db_url.get_backend_name() != "sqlite":
+        raise ValueError(f"只支持SQLite数据库，DATABASE_URL为: {db_url.render_as_string()}")
+    
+    connect_args = {"check_same_thread": False}
+    if db_url.database in (None, "", ":memory:"):
+        write_engine = create_async_engine(
+            url,
+            echo=False,  # 设置为True可以看到SQL语句
+            poolclass=TimedStaticPool,
+            pool_logging_name="write",
+            connect_args=connect_args
+        )
+        configure_sqlite_engine(write_engine, profile)
+        enable_sqlite_transactions(write_engine)
+        instrument_engine(write_engine, "write")
+        return write_engine, write_engine
+    
+    write_engine = create_async_engine(
+        url,
+        echo=False,
+        poolclass=TimedQueuePool,
+        pool_logging_name="write",
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=DB_POOL_TIMEOUT,
+        connect_args=connect_args
+    )
+    configure_sqlite_engine(write_engine, profile)
+    enable_sqlite_transactions(write_engine, "BEGIN IMMEDIATE")
+    instrument_engine(write_engine, "write")
+    
+    read_engine = create_async_engine(
+        url,
+        echo=False,
+        poolclass=TimedQueuePool,
+        pool_logging_name="read",
+        pool_size=read_pool_size,
+        max_overflow=0,
+        pool_timeout=DB_POOL_TIMEOUT,
+        connect_args=connect_args
+    )
+    configure_sqlite_engine(read_engine, profile)
+    instrument_engine(read_engine, "read")
+    
+    @event.listens_for(read_engine.sync_engine, "connect")
+    def set_query_only(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only=1")
+        cursor.close()
+    
+    return write_engine, read_engine
+
+
+# 创建异步引擎，engine为写引擎
+engine, read_engine = create_engines(DATABASE_URL)
 
 # 创建会话工厂
 AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
+ReadSessionLocal = async_sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
 
 # 创建基础模型类
 Base = declarative_base()
@@ -29,7 +354,7 @@ Base = declarative_base()
 
 async def get_db() -> AsyncSession:
     """
-    获取数据库会话的依赖函数
+    获取数据库会话的依赖函数（写连接，用于修改数据的接口）
     """
     async with AsyncSessionLocal() as session:
         try:
@@ -38,9 +363,110 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
-async def init_db():
+async def get_read_db() -> AsyncSession:
+    """
+    获取只读数据库会话的依赖函数（只读连接池，用于查询接口）
+    """
+    async with ReadSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+def get_read_session_factory() -> async_sessionmaker:
+    """
+    获取只读会话工厂的依赖函数
+    
+    流式响应在接口函数返回后才生成内容，需要在生成器内自行打开和关闭会话
+    """
+    return ReadSessionLocal
+
+
+def on_commit(session: AsyncSession, callback) -> None:
+    """
+    注册在当前事务提交后执行的回调，事务回滚时丢弃
+    
+    Args:
+        session: 数据库会话
+        callback: 无参数的同步函数
+    """
+    session.info.setdefault("on_commit", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def run_commit_hooks(session):
+    # SAVEPOINT的释放和回滚也会触发事件，只处理最外层事务
+    if session.in_nested_transaction():
+        return
+    for callback in session.info.pop("on_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_commit_hooks(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop("on_commit", None)
+
+
+def get_schema_version(connection) -> int:
+    """读取SQLite数据库的PRAGMA user_version（同步连接，供run_sync调用）"""
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+async def init_db(
+    write_engine: Optional[AsyncEngine] = None,
+    reader_engine: Optional[AsyncEngine] = None
+) -> bool:
     """
     初始化数据库，创建所有表
+    
+    数据库的user_version等于models.SCHEMA_VERSION时结构已是最新，跳过create_all
+    （逐表反射检查、重建触发器），只读一次PRAGMA，也不获取写锁。版本不同时在写事务内
+    再检查一次，同时启动的多个进程中只有一个执行DDL。
+    
+    Args:
+        write_engine: 执行DDL的引擎，默认为engine
+        reader_engine: 检查版本的引擎，默认为read_engine
+    
+    Returns:
+        是否执行了DDL
+    """
+    # models导入本模块的Base，只能在函数内导入；导入后模型才注册到元数据中
+    from .models import SCHEMA_VERSION
+    
+    write_engine = write_engine or engine
+    reader_engine = reader_engine or read_engine
+    async with reader_engine.connect() as conn:
+        if await conn.run_sync(get_schema_version) == SCHEMA_VERSION:
+            return False
+    async with write_engine.begin() as conn:
+        if await conn.run_sync(get_schema_version) == SCHEMA_VERSION:
+            return False
+        await conn.run_sync(Base.metadata.create_all)
+    return True
+
+
+async def warm_pool(engine: AsyncEngine, size: Optional[int] = None) -> None:
+    """
+    预先建立连接池中的连接，新连接要打开数据库文件并执行PRAGMA
+    
+    只建立连接，不开始事务，写引擎也不会获取写锁
+    
+    Args:
+        engine: 异步引擎
+        size: 建立的连接数，默认为连接池大小（没有大小的连接池为1）
     """
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all) 
\ No newline at end of file
+    if size is None:
+        size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+    results = await asyncio.gather(
+        *(engine.connect().start() for _ in range(size)), return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, BaseException)]
+    # 全部归还后连接留在池中
+    for result in results:
+        if not isinstance(result, BaseException):
+            await result.close()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,197 @@
+"""
+变更事件总线
+
+crud中的写操作在事务提交后发布事件，SSE和WebSocket的每个订阅者各持有一个有界队列。
+事件在发布时只编码一次，所有订阅者共享同一份字节；订阅者消费过慢导致队列写满时，
+丢弃它积压的事件并改为一条resync事件，由客户端重新拉取列表，发布方不会被阻塞。
+
+事件id由进程启动时随机生成的boot_id和进程内递增的seq组成（"{boot_id}-{seq}"）。
+多进程部署时重连可能落到另一个工作进程，它不认识其他进程（或重启前）的id，
+一律按已过期处理，先发送resync。
+
+事件只在当前进程内广播；其他进程的写操作由watcher.ChangeWatcher发现，
+以一条resync事件通知订阅者。
+"""
+
+import asyncio
+import secrets
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from .config import EVENTS_MAX_SUBSCRIBERS, EVENTS_QUEUE_SIZE, EVENTS_REPLAY_SIZE
+from .serialization import dumps
+
+
+class TooManySubscribers(RuntimeError):
+    """订阅者数量已达上限"""
+
+
+@dataclass(frozen=True, slots=True)
+class Event:
+    """已编码的事件，data为包含id、seq和type的JSON对象"""
+    seq: int
+    type: str
+    data: bytes
+    boot_id: str
+
+    @property
+    def id(self) -> str:
+        return f"{self.boot_id}-{self.seq}"
+
+    def sse(self) -> bytes:
+        """编码为一条Server-Sent Events消息"""
+        return b"id: %s\nevent: %s\ndata: %s\n\n" % (self.id.encode(), self.type.encode(), self.data)
+
+
+def _encode_event(boot_id: str, seq: int, event: dict) -> Event:
+    data = dumps({"id": f"{boot_id}-{seq}", "seq": seq, **event})
+    return Event(seq, event["type"], data, boot_id)
+
+
+def _resync_event(boot_id: str, seq: int, reason: str) -> Event:
+    return _encode_event(boot_id, seq, {"type": "resync", "reason": reason})
+
+
+class Subscription:
+    """
+    一个订阅者的有界事件队列
+
+    可作为上下文管理器使用，退出时取消订阅
+    """
+
+    def __init__(self, bus: "EventBus", maxsize: int):
+        self._bus = bus
+        self._queue: asyncio.Queue[Event] = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def put(self, event: Event) -> None:
+        """放入事件；队列已满时丢弃积压的事件，只保留一条resync"""
+        try:
+            self._queue.put_nowait(event)
+            return
+        except asyncio.QueueFull:
+            pass
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._bus.overflows += 1
+        # seq取最后一条被丢弃的事件，客户端据此重连时不会重复收到resync之前的事件
+        self._queue.put_nowait(_resync_event(event.boot_id, event.seq, "overflow"))
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """
+        等待下一个事件
+
+        Returns:
+            事件；超过timeout秒没有事件时返回None（用于发送心跳）
+        """
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        try:
+            # asyncio.timeout不像wait_for那样为每次等待额外创建任务
+            async with asyncio.timeout(timeout):
+                return await self._queue.get()
+        except TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self._bus.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class EventBus:
+    """
+    进程内的变更事件总线
+
+    Args:
+        queue_size: 每个订阅者最多积压的事件数
+        max_subscribers: 最多同时订阅的连接数
+        replay_size: 保留最近多少个事件，供携带Last-Event-ID重连的订阅者补发
+    """
+
+    def __init__(
+        self,
+        queue_size: int = EVENTS_QUEUE_SIZE,
+        max_subscribers: int = EVENTS_MAX_SUBSCRIBERS,
+        replay_size: int = EVENTS_REPLAY_SIZE
+    ):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: set[Subscription] = set()
+        self._recent: deque[Event] = deque(maxlen=replay_size)
+        self._seq = 0
+        self.overflows = 0
+        # 区分不同进程（以及同一进程重启前后）的事件id
+        self.boot_id = secrets.token_hex(4)
+
+    @property
+    def full(self) -> bool:
+        return len(self._subscribers) >= self.max_subscribers
+
+    def publish(self, event: dict) -> Event:
+        """
+        编码并广播事件，不等待订阅者
+
+        Args:
+            event: 事件内容，必须包含type
+        """
+        self._seq += 1
+        encoded = _encode_event(self.boot_id, self._seq, event)
+        self._recent.append(encoded)
+        for subscription in self._subscribers:
+            subscription.put(encoded)
+        return encoded
+
+    def _last_seq(self, last_event_id: str) -> Optional[int]:
+        """从本进程发出的事件id中取出seq，其他进程、重启前或格式无效的id返回None"""
+        boot_id, _, seq = last_event_id.rpartition("-")
+        if boot_id != self.boot_id or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscription:
+        """
+        新建订阅
+
+        Args:
+            last_event_id: 客户端收到的最后一个事件的id；之后的事件仍在
+                保留范围内时先补发，否则（包括id不是本进程发出的）先发送一条resync
+
+        Raises:
+            TooManySubscribers: 订阅者数量已达上限
+        """
+        if self.full:
+            raise TooManySubscribers("订阅者数量已达上限")
+        subscription = Subscription(self, self.queue_size)
+        last_seq = self._last_seq(last_event_id) if last_event_id is not None else self._seq
+        if last_seq != self._seq:
+            oldest = self._recent[0].seq if self._recent else self._seq + 1
+            if last_seq is None or last_seq > self._seq or last_seq + 1 < oldest:
+                # 事件已不在保留范围内，或id来自其他进程
+                subscription.put(_resync_event(self.boot_id, self._seq, "expired"))
+            else:
+                for event in self._recent:
+                    if event.seq > last_seq:
+                        subscription.put(event)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "boot_id": self.boot_id,
+            "subscribers": len(self._subscribers),
+            "last_seq": self._seq,
+            "overflows": self.overflows,
+        }
+
+
+event_bus = EventBus()
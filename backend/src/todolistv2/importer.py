@@ -0,0 +1,241 @@
+"""
+NDJSON/CSV流式导入
+
+输入按字节块读取，逐行解码、解析并用TodoImport校验，校验通过的记录按批插入，
+每批一个事务；内存占用只与批大小和单条记录长度有关，与文件大小无关。
+"""
+
+import csv
+import json
+from dataclasses import dataclass, field
+from typing import AsyncIterable, AsyncIterator, Optional, Union
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import IMPORT_CHUNK_SIZE, IMPORT_MAX_ERRORS, IMPORT_MAX_RECORD_LENGTH
+from .crud import insert_todos
+from .events import event_bus
+from .schemas import TodoImport
+
+IMPORT_FORMATS = ("ndjson", "csv")
+
+# 解析结果：(起始行号, 记录dict或错误信息)
+ParsedRecord = tuple[int, Union[dict, str]]
+
+_TOO_LONG = object()
+
+
+@dataclass
+class ImportResult:
+    """导入统计，errors最多保留max_errors条"""
+    accepted: int = 0
+    rejected: int = 0
+    errors: list[dict] = field(default_factory=list)
+    errors_truncated: bool = False
+    max_errors: int = IMPORT_MAX_ERRORS
+
+    def reject(self, line: int, error: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": error})
+        else:
+            self.errors_truncated = True
+
+    def as_dict(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "errors_truncated": self.errors_truncated,
+        }
+
+
+async def iter_lines(
+    chunks: AsyncIterable[bytes],
+    max_length: int = IMPORT_MAX_RECORD_LENGTH
+) -> AsyncIterator[tuple[int, object]]:
+    """
+    把字节块切分为文本行
+
+    每行单独按UTF-8解码（开头的BOM会被去掉），无法解码的行以UnicodeDecodeError
+    返回；超过max_length字节的行不再缓存，以_TOO_LONG返回
+
+    Yields:
+        (行号, 行文本 / UnicodeDecodeError / _TOO_LONG)
+    """
+    buffer = b""
+    line_no = 0
+    too_long = False
+    first = True
+
+    def decode(raw: bytes):
+        nonlocal first
+        if first:
+            raw = raw.removeprefix(b"\xef\xbb\xbf")
+            first = False
+        try:
+            return raw.removesuffix(b"\r").decode("utf-8")
+        except UnicodeDecodeError as exc:
+            return exc
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for raw in lines:
+            line_no += 1
+            if too_long or len(raw) > max_length:
+                too_long = False
+                yield line_no, _TOO_LONG
+            else:
+                yield line_no, decode(raw)
+        if len(buffer) > max_length:
+            # 丢弃已缓存的部分，直到该行结束
+            too_long = True
+            buffer = b""
+    if too_long:
+        yield line_no + 1, _TOO_LONG
+    elif buffer:
+        yield line_no + 1, decode(buffer)
+
+
+def _line_error(line: object) -> Optional[str]:
+    if line is _TOO_LONG:
+        return f"记录超过 {IMPORT_MAX_RECORD_LENGTH} 字节"
+    if isinstance(line, UnicodeDecodeError):
+        return "不是有效的UTF-8文本"
+    return None
+
+
+async def parse_ndjson(lines: AsyncIterable[tuple[int, object]]) -> AsyncIterator[ParsedRecord]:
+    """逐行解析NDJSON，每行一个JSON对象，跳过空行"""
+    async for line_no, line in lines:
+        error = _line_error(line)
+        if error is not None:
+            yield line_no, error
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, "不是有效的JSON"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, "每行必须是JSON对象"
+            continue
+        yield line_no, record
+
+
+async def parse_csv(lines: AsyncIterable[tuple[int, object]]) -> AsyncIterator[ParsedRecord]:
+    """
+    逐条解析带表头的CSV
+
+    引号内的换行会使一条记录跨越多行：按引号个数的奇偶判断记录是否结束，
+    结束后再交给csv模块解析。空字符串视为未提供该字段。
+
+    Raises:
+        ValueError: 缺少表头或表头中没有title列
+    """
+    header = None
+    pending: list[str] = []
+    pending_length = 0
+    start = 0
+
+    async for line_no, line in lines:
+        error = _line_error(line)
+        if error is None and pending_length + len(line) > IMPORT_MAX_RECORD_LENGTH:
+            error = f"记录超过 {IMPORT_MAX_RECORD_LENGTH} 字节"
+        if error is not None:
+            if header is None:
+                raise ValueError(f"CSV表头无效: {error}")
+            yield (start if pending else line_no), error
+            pending, pending_length = [], 0
+            continue
+        if not pending:
+            start = line_no
+            if not line.strip():
+                continue
+        pending.append(line)
+        pending_length += len(line) + 1
+        text = "\n".join(pending)
+        if text.count('"') % 2:
+            continue
+        pending, pending_length = [], 0
+
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            if "title" not in header:
+                raise ValueError("CSV表头必须包含title列")
+            continue
+        if len(values) != len(header):
+            yield start, f"列数为 {len(values)}，与表头的 {len(header)} 列不一致"
+            continue
+        yield start, {name: value for name, value in zip(header, values) if value != ""}
+
+    if pending:
+        yield start, "引号未闭合"
+    if header is None:
+        raise ValueError("CSV缺少表头")
+
+
+def _format_validation_error(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'record'}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+async def import_todos(
+    db: AsyncSession,
+    chunks: AsyncIterable[bytes],
+    format: str = "ndjson",
+    chunk_size: int = IMPORT_CHUNK_SIZE
+) -> ImportResult:
+    """
+    流式导入待办事项
+
+    每条记录用TodoImport校验（title、description、completed，其余字段忽略），
+    导入的记录分配新的id和创建时间。每chunk_size条记录插入并提交一次，
+    中途出错时已提交的批次会保留。结束时（包括中途出错）只要有记录写入，
+    就发布一条resync事件，订阅者不会在导入过程中被反复要求重新拉取。
+
+    Args:
+        db: 数据库会话（写连接）
+        chunks: 输入内容的字节块
+        format: ndjson 或 csv
+        chunk_size: 每批插入的记录数
+
+    Returns:
+        导入统计
+
+    Raises:
+        ValueError: 格式不支持或CSV表头无效
+    """
+    if format not in IMPORT_FORMATS:
+        raise ValueError(f"不支持的导入格式: {format}")
+    parse = parse_csv if format == "csv" else parse_ndjson
+    result = ImportResult()
+    batch: list[TodoImport] = []
+
+    try:
+        async for line_no, record in parse(iter_lines(chunks)):
+            if isinstance(record, str):
+                result.reject(line_no, record)
+                continue
+            try:
+                batch.append(TodoImport.model_validate(record))
+            except ValidationError as exc:
+                result.reject(line_no, _format_validation_error(exc))
+                continue
+            if len(batch) >= chunk_size:
+                result.accepted += await insert_todos(db, batch)
+                batch = []
+        if batch:
+            result.accepted += await insert_todos(db, batch)
+    finally:
+        # 每批都已提交；没有取回新行，通知订阅者重新拉取
+        if result.accepted:
+            event_bus.publish({"type": "resync", "reason": "import"})
+    return result
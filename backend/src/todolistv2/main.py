@@ -2,13 +2,28 @@
 TodoListV2 Backend API 主应用
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
+from time import perf_counter
+import asyncio
 import logging
 
-from .database import init_db
+from .config import (
+    COMPRESS_MIN_SIZE, GZIP_LEVEL, SQLITE_PROFILE, STARTUP_WARMUP,
+    TOMBSTONE_COMPACT_INTERVAL_SECONDS, TOMBSTONE_RETENTION_DAYS, WRITE_QUEUE_ENABLED
+)
+from .crud import compact_tombstones
+from .database import (
+    AsyncSessionLocal, engine, get_sqlite_pragmas, init_db, read_engine, warm_pool
+)
 from .api import todos_router
+from .cache import todo_cache
+from .events import event_bus
+from .metrics import CONTENT_TYPE, REGISTRY, SKIP_METRICS, MetricsMiddleware
+from .watcher import change_watcher
+from .write_queue import write_queue
 
 # 配置日志
 logging.basicConfig(
@@ -18,18 +33,101 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def compact_tombstones_periodically():
+    """定期清理超过保留期的删除记录"""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                removed = await compact_tombstones(db, TOMBSTONE_RETENTION_DAYS * 86400)
+            if removed:
+                logger.info(f"已清理 {removed} 条过期的删除记录")
+        except Exception:
+            logger.exception("清理删除记录失败")
+        await asyncio.sleep(TOMBSTONE_COMPACT_INTERVAL_SECONDS)
+
+
+# 启动预热时在进程内执行的只读请求；不存在的id同样经过单条查询的SQL
+WARMUP_PATHS = ("/health", "/api/v1/todos/", "/api/v1/todos/0")
+
+
+async def _dispatch(app: FastAPI, path: str) -> int:
+    """
+    在进程内执行一个GET请求，返回响应状态码
+    
+    请求经过完整的中间件栈，但不计入请求指标
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "server": ("warmup", 80),
+        "client": None,
+        "root_path": "",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [],
+        SKIP_METRICS: True,
+    }
+    status = 0
+    
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+    
+    await app(scope, receive, send)
+    return status
+
+
+async def warm_up(app: FastAPI) -> dict:
+    """
+    启动预热，把一次性的开销从第一批请求中移到启动阶段
+    
+    - 建立读连接池和写引擎的全部连接（只连接，不获取写锁）
+    - 依次执行WARMUP_PATHS中的请求：FastAPI在第一个请求时才构建各路由的上下文，
+      SQLAlchemy在第一次执行时编译语句并放入编译缓存，列表的第一页同时进入读缓存
+    
+    Returns:
+        {路径: 状态码}
+    """
+    await asyncio.gather(*(warm_pool(pool_engine) for pool_engine in {engine, read_engine}))
+    return {path: await _dispatch(app, path) for path in WARMUP_PATHS}
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    # 启动时初始化数据库
-    logger.info("正在初始化数据库...")
-    await init_db()
-    logger.info("数据库初始化完成")
+    # 启动时初始化数据库；由生产启动器运行时已在主进程中初始化过一次
+    if not getattr(app.state, "schema_initialized", False):
+        logger.info("正在初始化数据库...")
+        if await init_db():
+            logger.info("数据库初始化完成")
+        else:
+            logger.info("数据库结构已是最新，跳过初始化")
+    if STARTUP_WARMUP:
+        started = perf_counter()
+        statuses = await warm_up(app)
+        logger.info(f"预热完成，耗时 {(perf_counter() - started) * 1000:.1f} ms: {statuses}")
+    pragmas = await get_sqlite_pragmas(read_engine)
+    logger.info(f"SQLite配置档 {SQLITE_PROFILE}: {pragmas}")
+    if WRITE_QUEUE_ENABLED:
+        await write_queue.start()
+    await change_watcher.start()
+    compaction = asyncio.create_task(compact_tombstones_periodically())
     
     yield
     
     # 关闭时的清理工作
     logger.info("应用正在关闭...")
+    compaction.cancel()
+    await change_watcher.stop()
+    await write_queue.stop()
 
 
 # 创建FastAPI应用
@@ -51,6 +149,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 压缩未缓存的响应；已带Content-Encoding的响应（缓存的列表页、导出）和SSE不处理
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE, compresslevel=GZIP_LEVEL)
+
+# 请求指标，放在最外层以包含其他中间件的耗时
+app.add_middleware(MetricsMiddleware)
+
 # 注册路由
 app.include_router(todos_router, prefix="/api/v1")
 
@@ -72,6 +176,23 @@ async def health_check():
     return {"status": "healthy", "service": "TodoListV2 API"}
 
 
+@app.get("/stats")
+async def runtime_stats():
+    """运行时统计"""
+    return {
+        "write_queue": write_queue.stats(),
+        "cache": todo_cache.stats(),
+        "events": event_bus.stats(),
+        "watcher": change_watcher.stats(),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus格式的指标"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
 from fastapi.responses import JSONResponse
 
 @app.exception_handler(404)
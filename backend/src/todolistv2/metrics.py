@@ -0,0 +1,340 @@
+"""
+Prometheus文本格式的进程内指标
+
+不依赖prometheus_client：指标只在事件循环线程上更新（SQLAlchemy的游标事件
+也在该线程触发），因此不加锁，每次记录只是一次字典查找和几次加法。
+直方图按桶保存非累计计数，输出时再累加。
+
+指标只统计当前进程，多进程部署时由Prometheus分别抓取后汇总。
+"""
+
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Iterable, Optional
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 请求耗时的桶（秒），比Prometheus默认的桶更细，适合毫秒级的接口
+REQUEST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最后一个是+Inf桶
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        # le为闭区间：等于上界的值落在该桶
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    """
+    指标基类
+
+    Args:
+        name: 指标名称
+        documentation: HELP说明
+        labelnames: 标签名称
+        registry: 注册到的Registry，None表示不注册
+    """
+    type = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        registry: Optional["Registry"] = None
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values):
+        """
+        获取一组标签值对应的子指标，同一组标签值每次返回同一个对象
+
+        热路径上可以预先取得子指标并保存，省去每次的查找
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def samples(self) -> Iterable[tuple[str, str, float]]:
+        """Yields: (指标名后缀, 标签, 值)"""
+        for values, child in self._children.items():
+            yield "", _format_labels(self.labelnames, values), child.value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    """只增不减的计数"""
+    type = "counter"
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    """可增可减的当前值"""
+    type = "gauge"
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    """
+    分桶直方图
+
+    Args:
+        buckets: 递增的桶上界，+Inf桶自动添加
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional["Registry"] = None, buckets: tuple = REQUEST_BUCKETS):
+        self.buckets = tuple(float(bound) for bound in buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self):
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(bounds, child.counts):
+                cumulative += count
+                yield "_bucket", _format_labels(self.labelnames, values, f'le="{bound}"'), cumulative
+            labels = _format_labels(self.labelnames, values)
+            yield "_sum", labels, child.sum
+            yield "_count", labels, cumulative
+
+
+class Registry:
+    """一组指标，按注册顺序输出"""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标已注册: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> bytes:
+        """输出Prometheus文本格式"""
+        return "".join(metric.render() for metric in self._metrics.values()).encode()
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP请求耗时（按路由模板和状态码）",
+    ("method", "route", "status"), REGISTRY
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "正在处理的HTTP请求数", registry=REGISTRY
+)
+DB_STATEMENT_DURATION = Histogram(
+    "db_statement_duration_seconds", "SQL语句执行耗时",
+    ("engine", "operation"), REGISTRY, STATEMENT_BUCKETS
+)
+DB_STATEMENT_ROWS = Histogram(
+    "db_statement_rows", "查询语句返回的行数", ("engine",), REGISTRY, ROW_BUCKETS
+)
+DB_CHECKOUT_WAIT = Histogram(
+    "db_connection_checkout_seconds", "从连接池取得连接的等待时间",
+    ("engine",), REGISTRY, STATEMENT_BUCKETS
+)
+
+
+@dataclass(slots=True)
+class QueryStats:
+    """一个请求执行的SQL语句数、总耗时和最慢的一条"""
+    request: str = ""
+    count: int = 0
+    total: float = 0.0
+    slowest: float = 0.0
+    slowest_statement: Optional[str] = None
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.total += duration
+        if duration > self.slowest:
+            self.slowest = duration
+            self.slowest_statement = statement
+
+    def server_timing(self, elapsed: float) -> bytes:
+        """
+        编码为Server-Timing响应头
+
+        Args:
+            elapsed: 从收到请求到开始发送响应的秒数
+        """
+        timing = b'db;dur=%.3f;desc="%d statements", ' % (self.total * 1000, self.count)
+        if self.slowest_statement is not None:
+            sql = " ".join(self.slowest_statement.split())[:80]
+            sql = sql.replace("\\", "\\\\").replace('"', '\\"').encode("ascii", "replace")
+            timing += b'db-slowest;dur=%.3f;desc="%s", ' % (self.slowest * 1000, sql)
+        return timing + b"app;dur=%.3f" % (elapsed * 1000)
+
+
+# 当前请求的SQL统计，由MetricsMiddleware设置，引擎的游标事件在其中累计；
+# 写队列在执行每个操作时切换为提交该操作的请求的统计
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+def _resolve_template(route, path: str) -> str:
+    """
+    还原包含前缀的路由模板
+
+    FastAPI按需分派include_router注册的路由时，scope["route"]是子路由器中
+    不含prefix的原始路由；在实际路径中找到路由正则能匹配的后缀，其前面的部分即前缀
+    """
+    template = getattr(route, "path_format", None) or getattr(route, "path", None)
+    regex = getattr(route, "path_regex", None)
+    if template is None:
+        return "unmatched"
+    if regex is not None:
+        for index, char in enumerate(path):
+            if char == "/" and regex.match(path[index:]):
+                return path[:index] + template
+    return template
+
+
+# 进程内发起的请求（启动预热）在scope中设置此键为True，不计入请求指标
+SKIP_METRICS = "todolistv2.skip_metrics"
+
+
+class MetricsMiddleware:
+    """
+    记录HTTP请求耗时和并发数的ASGI中间件
+
+    路由模板在路由匹配后才写入scope["route"]，因此在请求结束时读取，
+    每个路由只在第一次请求时还原一次前缀；没有匹配到路由的请求（404）统一记为
+    unmatched，避免任意路径产生大量标签。SSE等长连接的耗时是整个连接的时长。
+
+    同时为每个请求累计SQL语句统计，在响应头Server-Timing中返回：
+    db（语句数和总耗时）、db-slowest（最慢的语句）、app（开始发送响应前的总耗时）。
+    响应头发出后才执行的语句（流式响应的后续批次）不计入。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._in_flight = HTTP_REQUESTS_IN_FLIGHT.labels()
+        # 路由对象定义了__eq__，不可哈希，按id缓存；路由在应用的整个生命周期内存在
+        self._templates: dict[int, str] = {}
+
+    def _route_template(self, scope) -> str:
+        route = scope.get("route")
+        if route is None:
+            return "unmatched"
+        template = self._templates.get(id(route))
+        if template is None:
+            template = self._templates[id(route)] = _resolve_template(route, scope["path"])
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get(SKIP_METRICS):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500  # 未发出响应就抛出异常时
+        stats = QueryStats(f"{scope['method']} {scope['path']}")
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = stats.server_timing(perf_counter() - started)
+                # 响应对象可能复用同一个消息，复制后再追加响应头
+                message = {**message, "headers": [*message["headers"], (b"server-timing", timing)]}
+            await send(message)
+
+        in_flight = self._in_flight
+        in_flight.value += 1
+        token = current_query_stats.set(stats)
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = perf_counter() - started
+            current_query_stats.reset(token)
+            in_flight.value -= 1
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.labels(
+                method if method in _METHODS else "other", self._route_template(scope), status
+            ).observe(duration)
@@ -2,7 +2,7 @@
 SQLAlchemy数据模型
 """
 
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Index
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Index, event, table, column
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -17,11 +17,240 @@ class Todo(Base):
     completed = Column(Boolean, default=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # 行版本：插入或修改时由触发器设为当时的集合版本，用于增量同步
+    row_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     # 创建复合索引
     __table_args__ = (
         Index('idx_todos_completed_created', 'completed', 'created_at'),
+        # 不带筛选条件时按created_at游标翻页
+        Index('idx_todos_created', 'created_at'),
+        Index('idx_todos_row_version', 'row_version'),
     )
     
     def __repr__(self):
-        return f"<Todo(id={self.id}, title='{self.title}', completed={self.completed})>" 
\ No newline at end of file
+        return f"<Todo(id={self.id}, title='{self.title}', completed={self.completed})>" 
+
+
+class TodoStats(Base):
+    """待办事项计数与集合版本（单行表，由触发器在写入事务内维护）"""
+    __tablename__ = "todo_stats"
+    
+    id = Column(Integer, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    # 集合版本：todos每插入、更新或删除一行加1，用于ETag和列表缓存
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    # 已压缩的删除记录中最大的版本，早于它的增量同步需要全量重新同步
+    tombstone_floor = Column(Integer, nullable=False, default=0, server_default="0")
+    
+    @property
+    def active(self) -> int:
+        return self.total - self.completed
+    
+    def __repr__(self):
+        return f"<TodoStats(total={self.total}, completed={self.completed}, version={self.version})>"
+
+
+class TodoTombstone(Base):
+    """已删除待办事项的记录（由删除触发器写入），供增量同步下发删除"""
+    __tablename__ = "todo_tombstones"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, index=True)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    
+    def __repr__(self):
+        return f"<TodoTombstone(id={self.id}, version={self.version})>"
+
+
+# 数据库结构的版本，建表后写入SQLite的PRAGMA user_version；启动时版本一致则跳过
+# create_all（见database.init_db）。修改表、列、索引、触发器或全文索引的定义时必须加1，
+# 已有的数据库在下次启动时按新定义补充和重建（tests/test_database.py中的指纹测试会提醒）
+SCHEMA_VERSION = 1
+
+
+# 为已有数据库补充后来新增的列: (表名, 列名, 列定义)
+ADDED_COLUMNS = [
+    ("todo_stats", "version", "INTEGER NOT NULL DEFAULT 0"),
+    ("todo_stats", "tombstone_floor", "INTEGER NOT NULL DEFAULT 0"),
+    ("todos", "row_version", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+# 计数器触发器：任何写入todos的语句（包括批量删除）都在同一事务内更新计数
+# 和集合版本，列表接口读取计数器即可得到总数，无需每次COUNT(*)扫描索引。
+# 同时把变化的行的row_version设为新的集合版本（每行唯一且递增），删除的行
+# 写入todo_tombstones；只修改row_version的UPDATE不再触发，避免递归。
+# 触发器在结构版本变化时重建，定义变化后只需增加SCHEMA_VERSION。
+TODO_STATS_DDL = [
+    """
+    INSERT OR IGNORE INTO todo_stats (id, total, completed, version)
+    SELECT 1, count(*), coalesce(sum(completed), 0), 0 FROM todos
+    """,
+    "DROP TRIGGER IF EXISTS todos_stats_ai",
+    """
+    CREATE TRIGGER todos_stats_ai AFTER INSERT ON todos
+    BEGIN
+        UPDATE todo_stats
+        SET total = total + 1,
+            completed = completed + coalesce(NEW.completed, 0),
+            version = version + 1
+        WHERE id = 1;
+        UPDATE todos SET row_version = (SELECT version FROM todo_stats WHERE id = 1)
+        WHERE id = NEW.id;
+        -- 复用了已删除记录的id时，该id不再算作删除
+        DELETE FROM todo_tombstones WHERE id = NEW.id;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS todos_stats_ad",
+    """
+    CREATE TRIGGER todos_stats_ad AFTER DELETE ON todos
+    BEGIN
+        UPDATE todo_stats
+        SET total = total - 1,
+            completed = completed - coalesce(OLD.completed, 0),
+            version = version + 1
+        WHERE id = 1;
+        INSERT OR REPLACE INTO todo_tombstones (id, version)
+        VALUES (OLD.id, (SELECT version FROM todo_stats WHERE id = 1));
+    END
+    """,
+    "DROP TRIGGER IF EXISTS todos_stats_au",
+    """
+    CREATE TRIGGER todos_stats_au AFTER UPDATE ON todos
+    WHEN NEW.row_version IS OLD.row_version
+    BEGIN
+        UPDATE todo_stats
+        SET completed = completed + coalesce(NEW.completed, 0) - coalesce(OLD.completed, 0),
+            version = version + 1
+        WHERE id = 1;
+        UPDATE todos SET row_version = (SELECT version FROM todo_stats WHERE id = 1)
+        WHERE id = NEW.id;
+    END
+    """,
+]
+
+
+# 全文检索：外部内容FTS5表只保存title/description的倒排索引，原文仍在todos表。
+# 使用trigram分词器，中文等不以空格分词的文本也能按子串检索（检索词至少3个字符）。
+todos_fts = table("todos_fts", column("rowid"), column("title"), column("description"))
+
+TODO_FTS_CREATE = """
+CREATE VIRTUAL TABLE todos_fts USING fts5(
+    title, description,
+    content='todos', content_rowid='id', tokenize='trigram'
+)
+"""
+
+# 外部内容表需要在删除/修改时提供旧值，索引才能删掉对应的词条
+TODO_FTS_DDL = [
+    "DROP TRIGGER IF EXISTS todos_fts_ai",
+    """
+    CREATE TRIGGER todos_fts_ai AFTER INSERT ON todos
+    BEGIN
+        INSERT INTO todos_fts (rowid, title, description)
+        VALUES (NEW.id, NEW.title, NEW.description);
+    END
+    """,
+    "DROP TRIGGER IF EXISTS todos_fts_ad",
+    """
+    CREATE TRIGGER todos_fts_ad AFTER DELETE ON todos
+    BEGIN
+        INSERT INTO todos_fts (todos_fts, rowid, title, description)
+        VALUES ('delete', OLD.id, OLD.title, OLD.description);
+    END
+    """,
+    "DROP TRIGGER IF EXISTS todos_fts_au",
+    """
+    CREATE TRIGGER todos_fts_au AFTER UPDATE OF title, description ON todos
+    BEGIN
+        INSERT INTO todos_fts (todos_fts, rowid, title, description)
+        VALUES ('delete', OLD.id, OLD.title, OLD.description);
+        INSERT INTO todos_fts (rowid, title, description)
+        VALUES (NEW.id, NEW.title, NEW.description);
+    END
+    """,
+]
+
+
+def create_fts_index(connection) -> None:
+    """
+    创建全文索引及同步触发器；索引表是新建的则按现有数据重建索引
+    """
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'todos_fts'"
+    ).first()
+    if exists is None:
+        connection.exec_driver_sql(TODO_FTS_CREATE)
+        connection.exec_driver_sql("INSERT INTO todos_fts (todos_fts) VALUES ('rebuild')")
+    for statement in TODO_FTS_DDL:
+        connection.exec_driver_sql(statement)
+
+
+def add_missing_columns(connection) -> list[tuple[str, str]]:
+    """
+    为create_all不会修改的已有表补充新增的列
+    
+    Returns:
+        新增的 (表名, 列名) 列表
+    """
+    added = []
+    for table_name, column_name, column_ddl in ADDED_COLUMNS:
+        existing = {
+            row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table_name})")
+        }
+        if column_name not in existing:
+            connection.exec_driver_sql(
+                f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_ddl}"
+            )
+            added.append((table_name, column_name))
+    return added
+
+
+def create_missing_indexes(connection) -> None:
+    """为已有的表补建后来新增的索引（create_all只为新建的表创建索引）"""
+    for model_table in Base.metadata.sorted_tables:
+        for index in model_table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def backfill_row_versions(connection) -> None:
+    """
+    为新增row_version列之前的已有记录分配行版本
+    
+    用id作为行版本（互不相同），并把集合版本提高到不小于最大id，
+    之后的修改得到的行版本都大于这些值
+    """
+    connection.exec_driver_sql("UPDATE todos SET row_version = id")
+    connection.exec_driver_sql(
+        "UPDATE todo_stats SET version = max(version, (SELECT coalesce(max(id), 0) FROM todos))"
+    )
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_sqlite_objects(target, connection, **kw):
+    """
+    create_all之后补充新增的列并创建触发器等SQLite对象，最后记录结构版本
+    
+    所有语句都是幂等的，对已存在的数据库同样适用（会按现有数据初始化计数）
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    added = add_missing_columns(connection)
+    create_missing_indexes(connection)
+    for statement in TODO_STATS_DDL:
+        connection.exec_driver_sql(statement)
+    # 新的触发器不响应只修改row_version的UPDATE，回填不会改变计数
+    if ("todos", "row_version") in added:
+        backfill_row_versions(connection)
+    create_fts_index(connection)
+    connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+@event.listens_for(Base.metadata, "after_drop")
+def drop_sqlite_objects(target, connection, **kw):
+    """drop_all之后删除不在元数据中的全文索引表，并清除结构版本"""
+    if connection.dialect.name != "sqlite":
+        return
+    connection.exec_driver_sql("DROP TABLE IF EXISTS todos_fts")
+    connection.exec_driver_sql("PRAGMA user_version = 0")
@@ -2,8 +2,8 @@
 Pydantic数据模式定义
 """
 
-from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, Field, ConfigDict, model_validator
+from typing import Literal, Optional
 from datetime import datetime
 
 
@@ -18,6 +18,11 @@ class TodoCreate(TodoBase):
     pass
 
 
+class TodoImport(TodoCreate):
+    """导入待办事项模式，在TodoCreate基础上保留完成状态"""
+    completed: bool = False
+
+
 class TodoUpdate(BaseModel):
     """更新待办事项模式"""
     title: Optional[str] = Field(None, min_length=1, max_length=255)
@@ -35,12 +40,126 @@ class TodoResponse(TodoBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+# 响应中可返回的字段，顺序与TodoResponse一致
+TODO_FIELDS = ("title", "description", "id", "completed", "created_at", "updated_at")
+
+
+def parse_fields(fields: Optional[str]) -> Optional[tuple[str, ...]]:
+    """
+    解析稀疏字段参数，例如 "id,title,completed"
+    
+    Args:
+        fields: 逗号分隔的字段名，为空表示全部字段
+    
+    Returns:
+        按TODO_FIELDS顺序排列的字段元组（总是包含id），全部字段时返回None
+    
+    Raises:
+        ValueError: 包含未知字段
+    """
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(TODO_FIELDS)
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(sorted(unknown))}")
+    requested.add("id")
+    if len(requested) == len(TODO_FIELDS):
+        return None
+    return tuple(name for name in TODO_FIELDS if name in requested)
+
+
+class TodoPartialResponse(BaseModel):
+    """待办事项稀疏字段响应模式，只包含fields参数指定的字段"""
+    title: Optional[str] = None
+    description: Optional[str] = None
+    id: int
+    completed: Optional[bool] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
 class TodoListResponse(BaseModel):
     """待办事项列表响应模式"""
     items: list[TodoResponse]
-    total: int
+    total: Optional[int] = Field(None, description="总数，total=none时为空")
     limit: int
     offset: int
+    next_cursor: Optional[str] = Field(None, description="下一页游标，没有更多数据时为空")
+
+
+class TodoPartialListResponse(BaseModel):
+    """待办事项稀疏字段列表响应模式"""
+    items: list[TodoPartialResponse]
+    total: Optional[int] = None
+    limit: int
+    offset: int
+    next_cursor: Optional[str] = None
+
+
+class TodoSearchHit(TodoResponse):
+    """全文检索命中的待办事项"""
+    rank: Optional[float] = Field(None, description="bm25相关度，越小越相关；检索词都短于3个字符时为空")
+    title_highlight: str = Field(..., description="用<mark>标出命中词的标题（已HTML转义）")
+    description_snippet: Optional[str] = Field(None, description="描述中命中词附近的片段（已HTML转义，命中词用<mark>标出）")
+
+
+class TodoSearchResponse(BaseModel):
+    """全文检索响应模式"""
+    items: list[TodoSearchHit]
+    limit: int
+    next_cursor: Optional[str] = Field(None, description="下一页游标，没有更多数据时为空")
+
+
+class TodoChangesResponse(BaseModel):
+    """增量同步响应模式"""
+    upserted: list[TodoResponse] = Field(..., description="插入或修改过的记录")
+    deleted: list[int] = Field(..., description="删除的记录ID")
+    has_more: bool = Field(..., description="是否还有下一页，有则用next_cursor继续请求")
+    next_cursor: Optional[str] = Field(None, description="下一页游标")
+    next_since: Optional[int] = Field(None, description="最后一页返回，下次同步时作为since")
+    resync_required: bool = Field(False, description="无法增量同步，需要清空本地数据后从since=0重新同步")
+
+
+class TodoFilter(BaseModel):
+    """待办事项筛选条件"""
+    completed: Literal["true", "false", "all"] = Field("all", description="筛选条件: true/false/all")
+
+
+class TodoBulkUpdate(BaseModel):
+    """批量更新待办事项模式，ids与filter二选一"""
+    ids: Optional[list[int]] = Field(None, min_length=1, description="要更新的待办事项ID")
+    filter: Optional[TodoFilter] = Field(None, description="按条件选择要更新的待办事项")
+    update: TodoUpdate = Field(..., description="要应用的部分更新")
+    return_items: bool = Field(False, description="是否返回更新后的记录")
+    
+    @model_validator(mode="after")
+    def check_target(self) -> "TodoBulkUpdate":
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("ids 与 filter 必须且只能提供一个")
+        if not self.update.model_dump(exclude_unset=True):
+            raise ValueError("update 不能为空")
+        return self
+
+
+class TodoBulkUpdateResponse(BaseModel):
+    """批量更新待办事项响应模式"""
+    updated: int
+    items: Optional[list[TodoResponse]] = None
+
+
+class TodoImportError(BaseModel):
+    """导入时被拒绝的记录"""
+    line: int = Field(..., description="记录起始行号（从1开始）")
+    error: str
+
+
+class TodoImportResponse(BaseModel):
+    """导入结果"""
+    accepted: int
+    rejected: int
+    errors: list[TodoImportError] = Field(..., description="被拒绝的记录，最多IMPORT_MAX_ERRORS条")
+    errors_truncated: bool = False
 
 
 class ErrorResponse(BaseModel):
@@ -0,0 +1,266 @@
+"""
+合成数据快速写入（仅SQLite）
+
+用于准备基准测试和压测的数据。逐条经过接口或crud写入时，每行都要执行计数、
+行版本和全文索引三组触发器并维护6个二级索引；这里改为在一个事务内：
+
+1. 保存并删除todos上的触发器和二级索引
+2. 按批生成记录，用executemany插入（id、行版本、时间戳都预先算好）
+3. 按保存的定义重建索引和触发器，重建全文索引，按插入的数据更新计数和集合版本
+
+SQLite的DDL是事务性的，中途失败时回滚到写入之前，不会留下缺少触发器或索引的表。
+相同的seed和参数总是生成相同的数据（时间戳也不依赖当前时间）。
+"""
+
+import random
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from itertools import repeat
+from typing import Callable, Iterator
+
+# 记录的创建时间从这一天零点开始，按id递增
+BASE_DATE = date(2024, 1, 1)
+
+# 描述从这么多条按长度分布预先生成的文本中随机选取
+DESCRIPTION_POOL_SIZE = 65536
+
+_TITLE_WORDS = (
+    "整理", "会议纪要", "回复邮件", "review", "部署", "周报", "测试用例", "采购",
+    "refactor", "预算", "客户回访", "文档", "backup", "面试", "发布说明", "bugfix",
+)
+
+# 全文索引重建期间的合并参数，结束后恢复为原值（未设置时为FTS5默认值）
+_FTS_MERGE_DEFAULTS = {"automerge": 4, "crisismerge": 16}
+_FTS_REBUILD_MERGE = {"automerge": 0, "crisismerge": 64}
+
+
+def _build_text(length: int = 8192) -> str:
+    """描述从这段固定的文本中截取，中英文混合，全文检索可以命中"""
+    rng = random.Random(0)
+    words = _TITLE_WORDS + ("需要", "确认", "以及", "the", "and", "之前完成", "deadline", "细节")
+    parts = []
+    size = 0
+    while size < length:
+        word = rng.choice(words)
+        parts.append(word)
+        size += len(word) + 1
+    return " ".join(parts)[:length]
+
+
+_TEXT = _build_text()
+
+
+def parse_length_distribution(spec: str) -> Callable[[random.Random], int]:
+    """
+    解析描述长度分布
+
+    Args:
+        spec: fixed:N、uniform:MIN-MAX、normal:MEAN:STDDEV 或 exp:MEAN；
+            长度为0时描述为NULL，超过4096的截断
+
+    Raises:
+        ValueError: 格式无效
+    """
+    kind, _, params = spec.partition(":")
+    try:
+        if kind == "fixed":
+            value = int(params)
+            return lambda rng: value
+        if kind == "uniform":
+            low, high = (int(part) for part in params.split("-"))
+            if low > high:
+                raise ValueError
+            return lambda rng: rng.randint(low, high)
+        if kind == "normal":
+            mean, stddev = (float(part) for part in params.split(":"))
+            return lambda rng: max(0, round(rng.gauss(mean, stddev)))
+        if kind == "exp":
+            rate = 1 / float(params)
+            return lambda rng: round(rng.expovariate(rate))
+    except (ValueError, ZeroDivisionError):
+        pass
+    raise ValueError(
+        f"无效的长度分布: {spec}，可选 fixed:N、uniform:MIN-MAX、normal:MEAN:STDDEV、exp:MEAN"
+    )
+
+
+def _description_pool(description_length: Callable[[random.Random], int], rng: random.Random) -> list:
+    pool = []
+    for _ in range(DESCRIPTION_POOL_SIZE):
+        length = min(max(description_length(rng), 0), 4096)
+        start = rng.randrange(len(_TEXT) - length + 1)
+        pool.append(_TEXT[start:start + length] or None)
+    return pool
+
+
+@dataclass
+class SeedResult:
+    rows: int
+    first_id: int
+    load_seconds: float
+    index_seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.load_seconds if self.load_seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "first_id": self.first_id,
+            "load_seconds": round(self.load_seconds, 3),
+            "index_seconds": round(self.index_seconds, 3),
+            "rows_per_second": round(self.rows_per_second),
+        }
+
+
+def generate_batches(
+    count: int,
+    first_id: int,
+    first_version: int,
+    completed_ratio: float,
+    description_length: Callable[[random.Random], int],
+    rng: random.Random,
+    batch_size: int = 50000,
+    span_days: float = 365
+) -> Iterator[list[tuple]]:
+    """
+    按批生成 (id, title, description, completed, created_at, row_version) 元组
+
+    按列用推导式生成再zip，比逐行构造元组少用约三分之一的时间。
+    created_at从BASE_DATE开始以固定的整数秒间隔递增（记录多于span_days内的秒数时
+    间隔为1秒），格式与SQLite的CURRENT_TIMESTAMP相同；row_version从first_version开始递增
+    """
+    step = max(1, int(span_days * 86400) // max(count, 1))
+    # 时间字符串由日期和时刻两张表拼接，比逐行格式化快得多
+    days = [f"{BASE_DATE + timedelta(days=day)} " for day in range(count * step // 86400 + 1)]
+    clock = [f"{hour:02d}:{minute:02d}:{second:02d}"
+             for hour in range(24) for minute in range(60) for second in range(60)]
+    pool = _description_pool(description_length, rng)
+    prefixes = [f"{word} #" for word in _TITLE_WORDS]
+    prefix_count = len(prefixes)
+    random_ = rng.random
+    for start in range(0, count, batch_size):
+        end = min(start + batch_size, count)
+        ids = range(first_id + start, first_id + end)
+        yield list(zip(
+            ids,
+            [prefixes[todo_id % prefix_count] + str(todo_id) for todo_id in ids],
+            rng.choices(pool, k=end - start),
+            [random_() < completed_ratio for _ in ids],
+            [days[day] + clock[second]
+             for day, second in map(divmod, range(start * step, end * step, step), repeat(86400))],
+            range(first_version + start, first_version + end),
+        ))
+
+
+_INSERT = """
+INSERT INTO todos (id, title, description, completed, created_at, updated_at, row_version)
+VALUES (?1, ?2, ?3, ?4, ?5, ?5, ?6)
+"""
+
+
+def _rebuild_fts(conn: sqlite3.Connection) -> None:
+    """
+    重建全文索引
+
+    关闭自动合并、提高合并阈值后重建再一次性optimize，比默认参数下重建快约四分之一，
+    且得到完全合并的索引
+    """
+    saved = dict(conn.execute(
+        "SELECT k, v FROM todos_fts_config WHERE k IN ('automerge', 'crisismerge')"
+    ).fetchall())
+    for key, value in _FTS_REBUILD_MERGE.items():
+        conn.execute("INSERT INTO todos_fts (todos_fts, rank) VALUES (?, ?)", (key, value))
+    conn.execute("INSERT INTO todos_fts (todos_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO todos_fts (todos_fts) VALUES ('optimize')")
+    for key, default in _FTS_MERGE_DEFAULTS.items():
+        conn.execute(
+            "INSERT INTO todos_fts (todos_fts, rank) VALUES (?, ?)", (key, saved.get(key, default))
+        )
+
+
+def seed_todos(
+    path: str,
+    rows: int,
+    completed_ratio: float = 0.3,
+    description_length: str = "uniform:0-200",
+    seed: int = 42,
+    batch_size: int = 50000,
+    span_days: float = 365
+) -> SeedResult:
+    """
+    向已建好表结构的SQLite数据库追加合成的待办事项
+
+    Args:
+        path: 数据库文件路径
+        rows: 写入的行数
+        completed_ratio: 已完成的比例
+        description_length: 描述长度分布，见parse_length_distribution
+        seed: 随机种子
+        batch_size: 每次executemany的行数
+        span_days: 创建时间分布的天数
+
+    Returns:
+        写入统计；load_seconds为生成和插入的耗时，index_seconds为重建索引、
+        触发器和全文索引的耗时
+
+    Raises:
+        ValueError: 参数无效
+    """
+    if rows < 0 or batch_size <= 0 or not 0 <= completed_ratio <= 1:
+        raise ValueError("rows不能为负数，batch_size必须为正数，completed_ratio必须在0到1之间")
+    length = parse_length_distribution(description_length)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        # 只影响本连接；掉电时数据库可能损坏，适合可重建的测试数据
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA cache_size=-262144")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            saved = conn.execute(
+                "SELECT type, name, sql FROM sqlite_master "
+                "WHERE tbl_name = 'todos' AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+            ).fetchall()
+            for object_type, name, _ in saved:
+                conn.execute(f'DROP {object_type.upper()} "{name}"')
+
+            first_id = conn.execute("SELECT coalesce(max(id), 0) + 1 FROM todos").fetchone()[0]
+            # 新记录的行版本接在集合版本之后，增量同步的客户端能取到它们
+            first_version = conn.execute(
+                "SELECT version + 1 FROM todo_stats WHERE id = 1"
+            ).fetchone()[0]
+            started = time.perf_counter()
+            for batch in generate_batches(
+                rows, first_id, first_version, completed_ratio, length, rng, batch_size, span_days
+            ):
+                conn.executemany(_INSERT, batch)
+            load_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            # 先建索引后建触发器，建触发器之前插入的行不会触发它们
+            for object_type, _, sql in sorted(saved, key=lambda item: item[0] != "index"):
+                conn.execute(sql)
+            conn.execute(
+                "DELETE FROM todo_tombstones WHERE id BETWEEN ? AND ?", (first_id, first_id + rows - 1)
+            )
+            _rebuild_fts(conn)
+            conn.execute(
+                "UPDATE todo_stats SET total = (SELECT count(*) FROM todos), "
+                "completed = (SELECT coalesce(sum(completed), 0) FROM todos), "
+                "version = version + ? WHERE id = 1",
+                (rows,)
+            )
+            conn.execute("COMMIT")
+            index_seconds = time.perf_counter() - started
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return SeedResult(rows, first_id, load_seconds, index_seconds)
@@ -0,0 +1,114 @@
+"""
+列表响应的快速序列化
+
+数据库行已经满足响应模式的约束，直接转换为dict后一次性编码为JSON字节，
+跳过逐行构建pydantic模型以及FastAPI按response_model的二次校验和序列化。
+安装了orjson时使用orjson编码，否则回退到标准库json。
+流式导出按批把行编码为NDJSON或CSV。
+"""
+
+import csv
+import io
+import json
+from typing import Any, Optional, Sequence
+
+from fastapi import Response
+from sqlalchemy import Row
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 取决于是否安装speedups依赖
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """
+    编码为紧凑的UTF-8 JSON字节，输出与JSONResponse一致
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+_DATETIME_FIELDS = ("created_at", "updated_at")
+
+# CSV导出的列，与TodoResponse字段顺序一致
+CSV_COLUMNS = ("title", "description", "id", "completed", "created_at", "updated_at")
+
+
+def _iso_datetime(value: Optional[str]) -> Optional[str]:
+    """
+    把SQLite存储的 'YYYY-MM-DD HH:MM:SS[.ffffff]' 转换为ISO 8601格式，
+    与pydantic序列化datetime的结果相同
+    """
+    if value is None:
+        return None
+    value = value.replace(" ", "T", 1)
+    if value.endswith(".000000"):
+        value = value[:-7]
+    return value
+
+
+def todo_row_to_dict(row: Row, fields: Optional[Sequence[str]] = None) -> dict:
+    """
+    把查询出的行转换为与TodoResponse相同字段顺序的dict
+    
+    行中的created_at/updated_at应为数据库中的原始字符串
+    
+    Args:
+        row: 查询结果行
+        fields: 只输出这些字段（按TODO_FIELDS顺序），为空时输出全部字段
+    """
+    if fields is None:
+        return {
+            "title": row.title,
+            "description": row.description,
+            "id": row.id,
+            "completed": row.completed,
+            "created_at": _iso_datetime(row.created_at),
+            "updated_at": _iso_datetime(row.updated_at),
+        }
+    mapping = row._mapping
+    return {
+        name: _iso_datetime(mapping[name]) if name in _DATETIME_FIELDS else mapping[name]
+        for name in fields
+    }
+
+
+class JSONBytesResponse(Response):
+    """内容为dict或已编码字节的JSON响应"""
+    media_type = "application/json"
+    
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def encode_ndjson(rows: Sequence[Row]) -> bytes:
+    """把一批行编码为NDJSON（每行一个TodoResponse结构的JSON对象）"""
+    return b"".join(dumps(todo_row_to_dict(row)) + b"\n" for row in rows)
+
+
+def encode_csv(rows: Sequence[Row], header: bool = False) -> bytes:
+    """
+    把一批行编码为CSV，列顺序同TODO_FIELDS
+    
+    completed输出为true/false，description为空时输出空字符串
+    
+    Args:
+        rows: 查询结果行
+        header: 是否在开头输出表头
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        todo = todo_row_to_dict(row)
+        todo["completed"] = "true" if todo["completed"] else "false"
+        writer.writerow([todo[name] for name in CSV_COLUMNS])
+    return buffer.getvalue().encode("utf-8")
+
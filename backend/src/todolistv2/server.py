@@ -0,0 +1,241 @@
+"""
+生产环境启动器（仅Unix）
+
+    python -m todolistv2 serve [--workers N] [--host 0.0.0.0] [--port 8000]
+
+主进程依次：
+
+1. 导入应用（预加载），导入错误在绑定端口之前暴露，工作进程fork后共享已导入模块的内存
+2. 在文件锁内初始化一次数据库，释放建表用的连接；多个启动器同时启动时依次执行
+3. 绑定监听套接字，fork出N个工作进程，每个进程在共享的套接字上运行uvicorn
+   （uvloop事件循环 + httptools解析），lifespan中不再初始化数据库
+4. 等待工作进程；意外退出的进程会重新fork
+
+收到SIGTERM/SIGINT时转发给所有工作进程。uvicorn先停止接受新连接，等待进行中的请求
+完成（最长 SHUTDOWN_TIMEOUT_SECONDS 秒，SSE等长连接在超时后断开），再执行lifespan的
+关闭逻辑：写队列执行完已提交的写操作后退出。超过等待时间仍未退出的工作进程被强制结束。
+
+每个工作进程有独立的连接池、写队列、读缓存和指标；文件型SQLite数据库的写事务在
+进程之间通过数据库锁串行（busy_timeout见SQLite配置档）。
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import signal
+import socket
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+from .config import SERVER_WORKERS, SHUTDOWN_TIMEOUT_SECONDS
+from .database import engine, init_db, read_engine
+
+logger = logging.getLogger(__name__)
+
+# 工作进程启动后这么多秒内异常退出，视为无法启动，不再重新fork
+MIN_WORKER_UPTIME_SECONDS = 5.0
+
+
+@dataclass
+class ServerOptions:
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = SERVER_WORKERS
+    loop: str = "uvloop"
+    http: str = "httptools"
+    backlog: int = 2048
+    shutdown_timeout: float = SHUTDOWN_TIMEOUT_SECONDS
+    log_level: str = "info"
+    access_log: bool = False
+
+
+def schema_lock_path() -> str:
+    """文件数据库的锁文件放在数据库旁边，内存数据库放在临时目录"""
+    url = engine.url
+    if url.database not in (None, "", ":memory:"):
+        return f"{url.database}.init.lock"
+    return os.path.join(tempfile.gettempdir(), "todolistv2-init.lock")
+
+
+@contextmanager
+def file_lock(path: str):
+    """进程间的排他文件锁，进程退出时由系统释放"""
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def initialize_schema_once() -> None:
+    """在文件锁内初始化数据库，并关闭建表用的连接（连接不能跨fork使用）"""
+    async def initialize():
+        try:
+            await init_db()
+        finally:
+            await engine.dispose()
+            await read_engine.dispose()
+
+    with file_lock(schema_lock_path()):
+        asyncio.run(initialize())
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, options: ServerOptions) -> None:
+    import uvicorn
+
+    config = uvicorn.Config(
+        app,
+        loop=options.loop,
+        http=options.http,
+        lifespan="on",
+        timeout_graceful_shutdown=options.shutdown_timeout,
+        log_level=options.log_level,
+        access_log=options.access_log,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+# 主进程屏蔽这些信号，在循环中用sigwaitinfo同步处理，避免在fork或回收进程的中途被打断
+_SIGNALS = {signal.SIGTERM, signal.SIGINT, signal.SIGCHLD}
+
+
+class Supervisor:
+    """
+    fork并看护工作进程
+
+    Args:
+        app: 已导入的ASGI应用
+        sock: 已绑定的监听套接字
+        options: 启动参数
+    """
+
+    def __init__(self, app, sock: socket.socket, options: ServerOptions):
+        self.app = app
+        self.sock = sock
+        self.options = options
+        self.workers: dict[int, float] = {}  # pid -> 启动时间
+        self.stopping = False
+        self.failed = False
+
+    def spawn(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            # 工作进程：解除继承的信号屏蔽，由uvicorn接管SIGTERM/SIGINT
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, _SIGNALS)
+            code = 0
+            try:
+                _run_worker(self.app, self.sock, self.options)
+            except BaseException:
+                logger.exception("工作进程异常退出")
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        return pid
+
+    def _reap(self) -> None:
+        """回收已退出的工作进程，运行中意外退出的重新fork"""
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            if started is None:
+                continue
+            exit_signal = os.WTERMSIG(status) if os.WIFSIGNALED(status) else None
+            code = os.waitstatus_to_exitcode(status)
+            if self.stopping:
+                # uvicorn正常关闭后会以收到的信号结束进程
+                if code != 0 and exit_signal not in (signal.SIGTERM, signal.SIGINT):
+                    logger.warning(f"工作进程 {pid} 退出码 {code}")
+                continue
+            logger.error(f"工作进程 {pid} 意外退出，退出码 {code}")
+            if time.monotonic() - started < MIN_WORKER_UPTIME_SECONDS:
+                logger.error("工作进程启动后很快退出，停止服务")
+                self.failed = self.stopping = True
+                return
+            self.spawn()
+
+    def _terminate(self) -> None:
+        """转发SIGTERM，等待工作进程退出，超时后强制结束"""
+        for pid in self.workers:
+            os.kill(pid, signal.SIGTERM)
+        # 留出lifespan关闭（写队列排空）的时间
+        deadline = time.monotonic() + self.options.shutdown_timeout + 10
+        self._reap()
+        while self.workers and (remaining := deadline - time.monotonic()) > 0:
+            signal.sigtimedwait(_SIGNALS, remaining)
+            self._reap()
+        for pid in self.workers:
+            logger.warning(f"工作进程 {pid} 未在限定时间内退出，强制结束")
+            os.kill(pid, signal.SIGKILL)
+        for pid in list(self.workers):
+            os.waitpid(pid, 0)
+        self.workers.clear()
+
+    def run(self) -> int:
+        """运行到收到SIGTERM/SIGINT或工作进程无法启动，返回退出码"""
+        previous_mask = signal.pthread_sigmask(signal.SIG_BLOCK, _SIGNALS)
+        try:
+            for _ in range(self.options.workers):
+                self.spawn()
+            logger.info(f"已启动 {self.options.workers} 个工作进程: {sorted(self.workers)}")
+            while not self.stopping:
+                info = signal.sigwaitinfo(_SIGNALS)
+                if info.si_signo == signal.SIGCHLD:
+                    self._reap()
+                else:
+                    self.stopping = True
+            logger.info("正在关闭工作进程...")
+            self._terminate()
+        finally:
+            signal.pthread_sigmask(signal.SIG_SETMASK, previous_mask)
+            self.sock.close()
+        return 1 if self.failed else 0
+
+
+def serve(options: Optional[ServerOptions] = None) -> int:
+    """
+    启动多进程服务，阻塞到服务关闭
+
+    Returns:
+        退出码
+
+    Raises:
+        ValueError: 参数无效
+    """
+    options = options or ServerOptions()
+    if options.workers < 1:
+        raise ValueError("工作进程数至少为1")
+    url = engine.url
+    memory = url.database in (None, "", ":memory:")
+    if memory and options.workers > 1:
+        raise ValueError("内存数据库在每个进程中是独立的库，只能使用1个工作进程")
+
+    from .main import app
+
+    # 内存数据库随连接关闭而消失，仍由工作进程的lifespan建表
+    if not memory:
+        initialize_schema_once()
+        app.state.schema_initialized = True
+    sock = bind_socket(options.host, options.port, options.backlog)
+    logger.info(
+        f"监听 {options.host}:{options.port}，{options.workers} 个工作进程"
+        f"（{options.loop} + {options.http}）"
+    )
+    return Supervisor(app, sock, options).run()
@@ -0,0 +1,130 @@
+"""
+跨进程写入监视
+
+读缓存的单条记录和事件总线都只感知当前进程的写入。多进程部署（或运行期间用
+命令行工具写入同一个数据库）时，由ChangeWatcher定期读取集合版本
+（todo_stats.version，每写入一行递增1）：版本的增量多于本进程提交的行数，说明
+其他进程写入过，此时递增单条记录缓存的纪元，并向订阅者发布一条resync事件，
+由客户端重新拉取列表。列表页的缓存键本身包含集合版本，不需要处理。
+
+本进程的写操作在提交回调中调用record_local登记写入的行数。版本通过写连接读取：
+写事务提交后先执行提交回调、再归还连接，监视器不会在登记之前看到本进程写入后
+的版本。读取直接使用驱动连接，不经过SQLAlchemy开始事务（写连接的事务以
+BEGIN IMMEDIATE开始，会获取写锁）。
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .cache import TodoCache, todo_cache
+from .config import CHANGE_POLL_INTERVAL_SECONDS
+from .database import engine
+from .events import EventBus, event_bus
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeWatcher:
+    """
+    定期检查集合版本，发现其他进程的写入后使本进程的缓存失效并通知订阅者
+
+    Args:
+        write_engine: 写引擎（SQLite）
+        cache: 需要失效的读缓存
+        bus: 发布resync事件的事件总线
+        interval: 检查间隔（秒），不大于0时不启动
+    """
+
+    def __init__(
+        self,
+        write_engine: AsyncEngine,
+        cache: TodoCache = todo_cache,
+        bus: EventBus = event_bus,
+        interval: float = CHANGE_POLL_INTERVAL_SECONDS
+    ):
+        self.engine = write_engine
+        self.cache = cache
+        self.bus = bus
+        self.interval = interval
+        self.version: Optional[int] = None
+        self.local_changes = 0
+        self.polls = 0
+        self.external_changes = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def record_local(self, rows: int) -> None:
+        """登记本进程提交的写入行数（在提交回调中调用）"""
+        self.local_changes += rows
+
+    async def start(self) -> None:
+        """读取当前版本作为基准，启动后台检查任务"""
+        if self.running or self.interval <= 0:
+            return
+        await self.poll()
+        self._task = asyncio.create_task(self._run(), name="change-watcher")
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def poll(self) -> int:
+        """
+        检查一次集合版本
+
+        Returns:
+            上次检查以来其他进程写入的行数；第一次检查只记录基准，返回0
+        """
+        async with self.engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            async with raw.driver_connection.execute(
+                "SELECT version FROM todo_stats WHERE id = 1"
+            ) as cursor:
+                row = await cursor.fetchone()
+        version = row[0] if row else 0
+        self.polls += 1
+
+        previous, local = self.version, self.local_changes
+        self.version, self.local_changes = version, 0
+        if previous is None:
+            return 0
+        # 版本变小说明数据库被重建，影响范围未知
+        external = version - previous - local if version >= previous else max(version, 1)
+        if external <= 0:
+            return 0
+        self.external_changes += external
+        self.cache.invalidate(all_items=True)
+        self.bus.publish({"type": "resync", "reason": "external"})
+        return external
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "version": self.version,
+            "polls": self.polls,
+            "external_changes": self.external_changes,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("检查集合版本失败")
+
+
+# 应用使用的监视器，由main.lifespan启动和停止
+change_watcher = ChangeWatcher(engine)
@@ -0,0 +1,207 @@
+"""
+组提交写队列
+
+并发到达的写操作先进入队列，由后台任务在一个短时间窗口内（或达到最大条数时）
+取出一批，放在同一个事务里执行并只提交一次；每个操作运行在独立的SAVEPOINT中，
+失败只回滚它自己，调用方各自拿到自己的结果或异常。
+
+每个操作执行的语句计入提交它的请求的SQL统计，整批的COMMIT不计入任何请求。
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from .config import WRITE_QUEUE_MAX_BATCH, WRITE_QUEUE_WINDOW_MS
+from .database import AsyncSessionLocal
+from .metrics import QueryStats, current_query_stats
+
+logger = logging.getLogger(__name__)
+
+# 批大小直方图的桶上界
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+@dataclass
+class _WriteOp:
+    """队列中的一个写操作"""
+    fn: Callable[..., Awaitable[Any]]
+    args: tuple
+    kwargs: dict
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    # 提交该操作的请求的SQL统计，操作执行的语句计入其中
+    query_stats: Optional[QueryStats] = field(default_factory=current_query_stats.get)
+
+
+class WriteQueue:
+    """组提交写队列"""
+    
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        window_ms: float = WRITE_QUEUE_WINDOW_MS,
+        max_batch: int = WRITE_QUEUE_MAX_BATCH
+    ):
+        self.session_factory = session_factory
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._reset_stats()
+    
+    def _reset_stats(self) -> None:
+        self.batches = 0
+        self.ops = 0
+        self.errors = 0
+        self.max_batch_size = 0
+        self.batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    async def start(self) -> None:
+        """启动后台提交任务"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="write-queue")
+    
+    async def stop(self) -> None:
+        """停止接收新操作，执行完队列中已有的操作后退出"""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+    
+    async def submit(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        提交一个写操作并等待其所在批次提交
+        
+        Args:
+            fn: 写操作，调用方式为 fn(session, *args, **kwargs)，
+                通常是crud中的函数；其中的提交会推迟到整批提交时
+        
+        Returns:
+            fn的返回值
+        
+        Raises:
+            RuntimeError: 队列未运行
+            Exception: fn或批次提交抛出的异常
+        """
+        if not self.running:
+            raise RuntimeError("写队列未运行")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_WriteOp(fn, args, kwargs, future))
+        return await future
+    
+    def stats(self) -> dict:
+        """批大小和排队等待时间统计"""
+        return {
+            "running": self.running,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "ops": self.ops,
+            "errors": self.errors,
+            "max_batch_size": self.max_batch_size,
+            "avg_batch_size": self.ops / self.batches if self.batches else 0.0,
+            "batch_size_buckets": dict(zip(
+                [str(bound) for bound in BATCH_SIZE_BUCKETS] + ["+Inf"],
+                self.batch_size_counts
+            )),
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            op = await self._queue.get()
+            if op is None:
+                break
+            batch = [op]
+            deadline = loop.time() + self.window
+            # 在窗口内继续收集；提交期间到达的操作会在下一批中一起处理
+            while len(batch) < self.max_batch:
+                try:
+                    timeout = deadline - loop.time()
+                    if timeout > 0:
+                        op = await asyncio.wait_for(self._queue.get(), timeout)
+                    else:
+                        op = self._queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if op is None:
+                    stopping = True
+                    break
+                batch.append(op)
+            await self._apply(batch)
+    
+    async def _apply(self, batch: list[_WriteOp]) -> None:
+        started = time.perf_counter()
+        self._record_batch(batch, started)
+        
+        outcomes = []
+        try:
+            async with self.session_factory() as session:
+                # crud中的提交改为flush，由这里统一提交
+                session.info["defer_commit"] = True
+                commit_hooks = []
+                for op in batch:
+                    # 每个操作单独收集提交回调，回滚到SAVEPOINT的操作丢弃自己的回调
+                    session.info["on_commit"] = []
+                    token = current_query_stats.set(op.query_stats)
+                    try:
+                        async with session.begin_nested():
+                            result = await op.fn(session, *op.args, **op.kwargs)
+                        commit_hooks.extend(session.info["on_commit"])
+                        outcomes.append((op, result, None))
+                    except Exception as exc:
+                        outcomes.append((op, None, exc))
+                    finally:
+                        current_query_stats.reset(token)
+                    # 同一批中的操作互不共享ORM对象
+                    session.expunge_all()
+                session.info["on_commit"] = commit_hooks
+                await session.commit()
+        except Exception as exc:
+            logger.exception("写队列批次提交失败")
+            outcomes = [(op, None, exc) for op in batch]
+        
+        for op, result, exc in outcomes:
+            if op.future.done():
+                continue
+            if exc is not None:
+                self.errors += 1
+                op.future.set_exception(exc)
+            else:
+                op.future.set_result(result)
+    
+    def _record_batch(self, batch: list[_WriteOp], started: float) -> None:
+        size = len(batch)
+        self.batches += 1
+        self.ops += size
+        self.max_batch_size = max(self.max_batch_size, size)
+        for index, bound in enumerate(BATCH_SIZE_BUCKETS):
+            if size <= bound:
+                self.batch_size_counts[index] += 1
+                break
+        else:
+            self.batch_size_counts[-1] += 1
+        for op in batch:
+            wait = started - op.enqueued_at
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+
+
+# 应用使用的写队列，由main.lifespan启动和停止
+write_queue = WriteQueue(AsyncSessionLocal)
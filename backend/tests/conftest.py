@@ -5,11 +5,13 @@ pytest配置文件
 import pytest
 import pytest_asyncio
 import asyncio
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.pool import StaticPool
+from contextlib import asynccontextmanager
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from httpx import AsyncClient, ASGITransport
 
-from src.todolistv2.database import get_db
+from src.todolistv2.cache import todo_cache
+from src.todolistv2.database import create_engines, get_db, get_read_db, get_read_session_factory
 from src.todolistv2.models import Base
 from src.todolistv2.main import app
 
@@ -17,12 +19,8 @@ from src.todolistv2.main import app
 # 测试数据库URL
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
-# 创建测试引擎
-test_engine = create_async_engine(
-    TEST_DATABASE_URL,
-    poolclass=StaticPool,
-    connect_args={"check_same_thread": False}
-)
+# 创建测试引擎（内存数据库读写共用同一个StaticPool引擎）
+test_engine, _ = create_engines(TEST_DATABASE_URL)
 
 # 创建测试会话工厂
 TestingSessionLocal = async_sessionmaker(
@@ -43,6 +41,8 @@ async def setup_database():
     """设置测试数据库"""
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    # 每个测试重建数据库后ID会重复使用，缓存也要清空
+    todo_cache.clear()
     yield
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
@@ -55,13 +55,34 @@ async def db_session():
         yield session
 
 
+@pytest.fixture
+def sql_statements():
+    """记录测试期间执行的SQL语句（不含BEGIN）"""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement != "BEGIN":
+            statements.append(statement)
+    
+    event.listen(test_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(test_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
 @pytest_asyncio.fixture
 async def client(db_session):
     """提供测试客户端"""
     async def override_get_db():
         yield db_session
     
+    # 内存数据库所有会话共用一个连接，流式导出也使用同一个会话
+    @asynccontextmanager
+    async def shared_session():
+        yield db_session
+    
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_read_session_factory] = lambda: shared_session
     
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
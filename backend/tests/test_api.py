@@ -2,12 +2,22 @@
 API测试
 """
 
+import csv
+import io
+import json
+from typing import Optional
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.todolistv2.api import todos as todos_api
+from src.todolistv2.cache import todo_cache
+from src.todolistv2.config import BULK_MAX_BATCH
 from src.todolistv2.models import Todo
-from src.todolistv2.crud import create_todo
+from src.todolistv2 import crud
+from src.todolistv2.crud import compact_tombstones, create_todo
 from src.todolistv2.schemas import TodoCreate
 
 
@@ -66,6 +76,61 @@ async def test_create_todo_invalid(client: AsyncClient):
 
 
 
+async def test_create_todos_bulk(client: AsyncClient):
+    """测试批量创建待办事项"""
+    payload = [{"title": f"批量任务{i}", "description": f"描述{i}"} for i in range(20)]
+    response = await client.post("/api/v1/todos/bulk", json=payload)
+    assert response.status_code == 201
+    data = response.json()
+    assert [item["title"] for item in data] == [item["title"] for item in payload]
+    assert all(not item["completed"] and item["id"] for item in data)
+    
+    response = await client.get("/api/v1/todos/?total=exact")
+    assert response.json()["total"] == 20
+
+
+
+async def test_create_todos_bulk_single_insert(
+    client: AsyncClient, sql_statements: list, monkeypatch
+):
+    """测试批量创建每批只执行一条多行INSERT，超过参数上限时分批且保持输入顺序"""
+    payload = [{"title": f"批量任务{i}"} for i in range(20)]
+    response = await client.post("/api/v1/todos/bulk", json=payload)
+    assert response.status_code == 201
+    assert [item["title"] for item in response.json()] == [item["title"] for item in payload]
+    assert len(sql_statements) == 1
+    assert sql_statements[0].startswith("INSERT") and "RETURNING" in sql_statements[0]
+    
+    # 每行2个参数，上限10时每条语句5行
+    monkeypatch.setattr(crud, "MAX_BOUND_PARAMETERS", 10)
+    sql_statements.clear()
+    payload = [{"title": f"分批任务{i}", "description": str(i)} for i in range(12)]
+    response = await client.post("/api/v1/todos/bulk", json=payload)
+    data = response.json()
+    assert [(item["title"], item["description"]) for item in data] == \
+        [(item["title"], item["description"]) for item in payload]
+    assert [item["id"] for item in data] == list(range(21, 33))
+    assert len(sql_statements) == 3
+    assert all(statement.startswith("INSERT") for statement in sql_statements)
+
+
+async def test_create_todos_bulk_validation(client: AsyncClient):
+    """测试批量创建的逐条校验与批量上限"""
+    payload = [{"title": "正常"}, {"title": ""}, {"title": "正常"}]
+    response = await client.post("/api/v1/todos/bulk", json=payload)
+    assert response.status_code == 422
+    assert [error["loc"][1] for error in response.json()["detail"]] == [1]
+    
+    # 校验失败时不写入任何数据
+    response = await client.get("/api/v1/todos/")
+    assert response.json()["total"] == 0
+    
+    payload = [{"title": "任务"}] * (BULK_MAX_BATCH + 1)
+    response = await client.post("/api/v1/todos/bulk", json=payload)
+    assert response.status_code == 413
+
+
+
 async def test_read_todo(client: AsyncClient, db_session: AsyncSession):
     """测试获取单个待办事项"""
     # 创建测试数据
@@ -133,6 +198,90 @@ async def test_update_todo_not_found(client: AsyncClient):
 
 
 
+async def test_write_paths_single_statement(
+    client: AsyncClient, db_session: AsyncSession, sql_statements: list
+):
+    """测试单条创建、更新和删除各只执行一条SQL语句"""
+    response = await client.post("/api/v1/todos/", json={"title": "任务"})
+    assert response.status_code == 201
+    todo_id = response.json()["id"]
+    assert response.json()["created_at"] is not None
+    assert len(sql_statements) == 1
+    assert sql_statements[0].startswith("INSERT")
+    
+    sql_statements.clear()
+    response = await client.put(f"/api/v1/todos/{todo_id}", json={"completed": True})
+    assert response.status_code == 200
+    assert response.json()["completed"] is True
+    assert len(sql_statements) == 1
+    assert sql_statements[0].startswith("UPDATE")
+    
+    sql_statements.clear()
+    response = await client.put("/api/v1/todos/999", json={"completed": True})
+    assert response.status_code == 404
+    assert len(sql_statements) == 1
+    
+    sql_statements.clear()
+    response = await client.delete(f"/api/v1/todos/{todo_id}")
+    assert response.status_code == 204
+    assert len(sql_statements) == 1
+    assert sql_statements[0].startswith("DELETE")
+    
+    sql_statements.clear()
+    response = await client.delete(f"/api/v1/todos/{todo_id}")
+    assert response.status_code == 404
+    assert len(sql_statements) == 1
+
+
+
+async def test_update_todos_bulk(client: AsyncClient, db_session: AsyncSession):
+    """测试按ID集合与按条件批量更新"""
+    todos = []
+    for i in range(6):
+        todos.append(await create_todo(db_session, TodoCreate(title=f"任务{i+1}")))
+    
+    ids = [todos[0].id, todos[1].id]
+    response = await client.patch(
+        "/api/v1/todos/bulk",
+        json={"ids": ids, "update": {"completed": True}, "return_items": True}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["updated"] == 2
+    assert sorted(item["id"] for item in data["items"]) == sorted(ids)
+    assert all(item["completed"] for item in data["items"])
+    
+    # 按条件把剩余未完成的全部标记为完成
+    response = await client.patch(
+        "/api/v1/todos/bulk",
+        json={"filter": {"completed": "false"}, "update": {"completed": True}}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"updated": 4, "items": None}
+    
+    response = await client.get("/api/v1/todos/?completed=true")
+    data = response.json()
+    assert data["total"] == 6
+    assert len(data["items"]) == 6
+
+
+
+async def test_update_todos_bulk_invalid(client: AsyncClient):
+    """测试批量更新的参数校验"""
+    response = await client.patch("/api/v1/todos/bulk", json={"update": {"completed": True}})
+    assert response.status_code == 422
+    
+    response = await client.patch(
+        "/api/v1/todos/bulk",
+        json={"ids": [1], "filter": {"completed": "false"}, "update": {"completed": True}}
+    )
+    assert response.status_code == 422
+    
+    response = await client.patch("/api/v1/todos/bulk", json={"ids": [1], "update": {}})
+    assert response.status_code == 422
+
+
+
 async def test_delete_todo(client: AsyncClient, db_session: AsyncSession):
     """测试删除待办事项"""
     # 创建测试数据
@@ -220,6 +369,364 @@ async def test_read_todos_with_pagination(client: AsyncClient, db_session: Async
 
 
 
+async def test_read_todos_with_cursor(client: AsyncClient, db_session: AsyncSession):
+    """测试游标分页"""
+    # 同一秒内创建的记录created_at相同，需要依靠id区分先后
+    for i in range(12):
+        todo_create = TodoCreate(title=f"任务{i+1}")
+        await create_todo(db_session, todo_create)
+    
+    seen = []
+    response = await client.get("/api/v1/todos/?limit=5")
+    assert response.status_code == 200
+    data = response.json()
+    seen.extend(item["id"] for item in data["items"])
+    while data["next_cursor"]:
+        response = await client.get(f"/api/v1/todos/?limit=5&cursor={data['next_cursor']}")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 12
+        seen.extend(item["id"] for item in data["items"])
+    
+    # 按创建时间倒序且不重复、不遗漏
+    assert seen == sorted(seen, reverse=True)
+    assert len(seen) == 12
+    assert len(set(seen)) == 12
+    
+    # 无效游标
+    response = await client.get("/api/v1/todos/?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
+
+async def test_read_todos_total_modes(client: AsyncClient, db_session: AsyncSession):
+    """测试计数器与total参数"""
+    todos = []
+    for i in range(5):
+        todos.append(await create_todo(db_session, TodoCreate(title=f"任务{i+1}")))
+    await client.put(f"/api/v1/todos/{todos[0].id}", json={"completed": True})
+    await client.put(f"/api/v1/todos/{todos[1].id}", json={"completed": True})
+    await client.put(f"/api/v1/todos/{todos[1].id}", json={"completed": True})
+    await client.delete(f"/api/v1/todos/{todos[2].id}")
+    
+    # 计数器与COUNT(*)结果一致
+    for completed, expected in (("all", 4), ("true", 2), ("false", 2)):
+        for mode in ("estimate", "exact"):
+            response = await client.get(f"/api/v1/todos/?completed={completed}&total={mode}")
+            assert response.status_code == 200
+            assert response.json()["total"] == expected
+    
+    response = await client.get("/api/v1/todos/?total=none")
+    assert response.status_code == 200
+    assert response.json()["total"] is None
+    
+    # 批量删除同样更新计数器
+    await client.delete("/api/v1/todos/completed")
+    response = await client.get("/api/v1/todos/?completed=true")
+    assert response.json()["total"] == 0
+    response = await client.get("/api/v1/todos/")
+    assert response.json()["total"] == 2
+    
+    response = await client.get("/api/v1/todos/?total=bogus")
+    assert response.status_code == 422
+
+
+
+async def test_read_todos_conditional_get(
+    client: AsyncClient, db_session: AsyncSession, sql_statements: list
+):
+    """测试列表接口的ETag与304响应"""
+    await create_todo(db_session, TodoCreate(title="任务"))
+    
+    response = await client.get("/api/v1/todos/")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    
+    # ETag匹配时只读取集合版本，不执行分页查询
+    sql_statements.clear()
+    response = await client.get("/api/v1/todos/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert len(sql_statements) == 1
+    
+    # 任意写入后ETag变化
+    await client.post("/api/v1/todos/", json={"title": "新任务"})
+    response = await client.get("/api/v1/todos/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["total"] == 2
+
+
+
+async def test_read_todo_conditional_get(
+    client: AsyncClient, db_session: AsyncSession, sql_statements: list, monkeypatch
+):
+    """测试单条记录的ETag与304响应"""
+    todo = await create_todo(db_session, TodoCreate(title="任务"))
+    
+    response = await client.get(f"/api/v1/todos/{todo.id}")
+    etag = response.headers["etag"]
+    row_version = await db_session.scalar(select(Todo.row_version).where(Todo.id == todo.id))
+    assert etag == f'"{todo.id}-{row_version}"'
+    
+    # 304不序列化记录；命中缓存时也不查询数据库
+    def fail(value):
+        raise AssertionError("304响应不应序列化记录")
+    
+    monkeypatch.setattr(todos_api, "dumps", fail)
+    sql_statements.clear()
+    response = await client.get(f"/api/v1/todos/{todo.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert sql_statements == []
+    todo_cache.clear()
+    response = await client.get(f"/api/v1/todos/{todo.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    monkeypatch.undo()
+    
+    # 稀疏字段的响应使用不同的ETag
+    response = await client.get(f"/api/v1/todos/{todo.id}?fields=title")
+    assert response.headers["etag"] == f'"{todo.id}-{row_version}-title+id"'
+    
+    # 同一秒内的修改也会改变ETag
+    await client.put(f"/api/v1/todos/{todo.id}", json={"title": "新标题"})
+    response = await client.get(f"/api/v1/todos/{todo.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+
+async def test_read_todos_sparse_fields(
+    client: AsyncClient, db_session: AsyncSession, sql_statements: list
+):
+    """测试稀疏字段只查询并返回指定的列"""
+    todo = await create_todo(db_session, TodoCreate(title="任务", description="很长的描述" * 100))
+    
+    sql_statements.clear()
+    response = await client.get("/api/v1/todos/?fields=title,completed")
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert items == [{"title": "任务", "id": todo.id, "completed": False}]
+    page_query = [sql for sql in sql_statements if "FROM todos" in sql][-1]
+    assert "description" not in page_query
+    
+    response = await client.get(f"/api/v1/todos/{todo.id}?fields=id,description")
+    assert response.status_code == 200
+    assert response.json() == {"description": "很长的描述" * 100, "id": todo.id}
+    
+    # 完整记录进入缓存后，稀疏字段从缓存中取
+    await client.get(f"/api/v1/todos/{todo.id}")
+    sql_statements.clear()
+    response = await client.get(f"/api/v1/todos/{todo.id}?fields=title")
+    assert response.json() == {"title": "任务", "id": todo.id}
+    assert sql_statements == []
+    
+    response = await client.get("/api/v1/todos/?fields=title,secret")
+    assert response.status_code == 400
+
+
+
+async def test_search_todos(client: AsyncClient, db_session: AsyncSession):
+    """测试全文检索：相关度排序、高亮、筛选、分页以及索引随写入同步"""
+    todos = [
+        ("周报 weekly report", "整理本周的 report 草稿"),
+        ("report report 汇总", None),
+        ("吃饭睡觉打豆豆", "今天要去超市买牛奶"),
+        ("买菜", "超市"),
+    ]
+    for title, description in todos:
+        todo = await create_todo(db_session, TodoCreate(title=title, description=description))
+        if title == "周报 weekly report":
+            await client.put(f"/api/v1/todos/{todo.id}", json={"completed": True})
+    
+    response = await client.get("/api/v1/todos/search", params={"q": "report"})
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["title"] for item in data["items"]] == ["report report 汇总", "周报 weekly report"]
+    assert data["items"][0]["rank"] <= data["items"][1]["rank"]
+    assert data["items"][1]["title_highlight"] == "周报 weekly <mark>report</mark>"
+    assert "<mark>report</mark>" in data["items"][1]["description_snippet"]
+    assert data["items"][0]["description_snippet"] is None
+    
+    # 中文子串、completed筛选
+    response = await client.get("/api/v1/todos/search", params={"q": "超市买"})
+    assert [item["title"] for item in response.json()["items"]] == ["吃饭睡觉打豆豆"]
+    response = await client.get("/api/v1/todos/search", params={"q": "report", "completed": "true"})
+    assert [item["title"] for item in response.json()["items"]] == ["周报 weekly report"]
+    
+    # 短于3个字符的词退化为LIKE匹配
+    response = await client.get("/api/v1/todos/search", params={"q": "超市"})
+    items = response.json()["items"]
+    assert {item["title"] for item in items} == {"吃饭睡觉打豆豆", "买菜"}
+    assert all(item["rank"] is None for item in items)
+    assert "<mark>超市</mark>" in items[0]["description_snippet"]
+    
+    # 高亮结果是HTML片段，标题和描述中的标签被转义
+    await create_todo(db_session, TodoCreate(
+        title="<script>alert(1)</script> xss", description='<img src=x onerror="a()"> 超市'
+    ))
+    response = await client.get("/api/v1/todos/search", params={"q": "script"})
+    assert response.json()["items"][0]["title_highlight"] == (
+        "&lt;<mark>script</mark>&gt;alert(1)&lt;/<mark>script</mark>&gt; xss"
+    )
+    response = await client.get("/api/v1/todos/search", params={"q": "超市 x"})
+    snippet = response.json()["items"][0]["description_snippet"]
+    assert snippet.startswith("&lt;img src=<mark>x</mark> onerror=&quot;a()&quot;&gt; <mark>超市</mark>")
+    response = await client.get("/api/v1/todos/search", params={"q": "<img"})
+    assert response.json()["items"][0]["description_snippet"].startswith("<mark>&lt;img</mark> src=x")
+    await client.delete(f"/api/v1/todos/{response.json()['items'][0]['id']}")
+    
+    # 游标翻页
+    response = await client.get("/api/v1/todos/search", params={"q": "report", "limit": 1})
+    first = response.json()
+    assert first["next_cursor"] is not None
+    response = await client.get(
+        "/api/v1/todos/search", params={"q": "report", "limit": 1, "cursor": first["next_cursor"]}
+    )
+    second = response.json()
+    assert [item["title"] for item in second["items"]] == ["周报 weekly report"]
+    assert second["next_cursor"] is None
+    
+    # 更新和删除后索引同步
+    todo_id = first["items"][0]["id"]
+    await client.put(f"/api/v1/todos/{todo_id}", json={"title": "月度总结"})
+    response = await client.get("/api/v1/todos/search", params={"q": "report"})
+    assert [item["title"] for item in response.json()["items"]] == ["周报 weekly report"]
+    response = await client.get("/api/v1/todos/search", params={"q": "月度总结"})
+    assert [item["id"] for item in response.json()["items"]] == [todo_id]
+    await client.delete(f"/api/v1/todos/{todo_id}")
+    response = await client.get("/api/v1/todos/search", params={"q": "月度总结"})
+    assert response.json()["items"] == []
+
+
+
+async def test_search_todos_invalid(client: AsyncClient):
+    """测试全文检索的无效参数"""
+    response = await client.get("/api/v1/todos/search", params={"q": "   "})
+    assert response.status_code == 400
+    response = await client.get("/api/v1/todos/search", params={"q": "report", "cursor": "bad"})
+    assert response.status_code == 400
+    # FTS5查询语法按普通文本处理
+    response = await client.get("/api/v1/todos/search", params={"q": 'NEAR("a b) OR *'})
+    assert response.status_code == 200
+    assert response.json()["items"] == []
+
+
+
+async def test_export_todos(client: AsyncClient, db_session: AsyncSession):
+    """测试NDJSON/CSV流式导出"""
+    for i in range(5):
+        await create_todo(db_session, TodoCreate(title=f"任务{i+1}", description="a,\"b\"" if i == 0 else None))
+    await client.put("/api/v1/todos/2", json={"completed": True})
+    
+    response = await client.get("/api/v1/todos/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [todo["id"] for todo in lines] == [1, 2, 3, 4, 5]
+    listed = (await client.get("/api/v1/todos/", params={"limit": 100})).json()["items"]
+    assert sorted(lines, key=lambda todo: todo["id"]) == sorted(listed, key=lambda todo: todo["id"])
+    
+    response = await client.get("/api/v1/todos/export", params={"format": "csv", "completed": "true"})
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["title", "description", "id", "completed", "created_at", "updated_at"]
+    assert [row[:4] for row in rows[1:]] == [["任务2", "", "2", "true"]]
+    
+    response = await client.get("/api/v1/todos/export", params={"format": "csv", "completed": "false"})
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[1][:2] == ["任务1", 'a,"b"']
+    
+    # gzip按Accept-Encoding协商
+    response = await client.get("/api/v1/todos/export", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.text.splitlines()) == 5
+
+
+
+async def _sync(client: AsyncClient, since: int, limit: int = 100) -> tuple[list, list, Optional[int], int]:
+    """按游标读完所有增量变更页，返回 (upserted, deleted, next_since, 页数)"""
+    params = {"since": since, "limit": limit}
+    upserted, deleted, pages = [], [], 0
+    while True:
+        data = (await client.get("/api/v1/todos/changes", params=params)).json()
+        assert data["resync_required"] is False
+        upserted += data["upserted"]
+        deleted += data["deleted"]
+        pages += 1
+        if not data["has_more"]:
+            return upserted, deleted, data["next_since"], pages
+        params = {"cursor": data["next_cursor"], "limit": limit}
+
+
+
+async def test_todo_changes(client: AsyncClient, db_session: AsyncSession):
+    """测试增量同步：全量分页、修改、单条与批量删除、ID复用"""
+    for i in range(5):
+        await create_todo(db_session, TodoCreate(title=f"任务{i+1}"))
+    
+    upserted, deleted, since, pages = await _sync(client, 0, limit=2)
+    assert [todo["id"] for todo in upserted] == [1, 2, 3, 4, 5]
+    assert deleted == []
+    assert pages == 3
+    assert (await _sync(client, since))[:3] == ([], [], since)
+    
+    await client.put("/api/v1/todos/2", json={"completed": True})
+    await client.put("/api/v1/todos/3", json={"title": "改名"})
+    await client.delete("/api/v1/todos/4")
+    first_since = since
+    upserted, deleted, since, _ = await _sync(client, since)
+    assert [(todo["id"], todo["title"], todo["completed"]) for todo in upserted] == [
+        (2, "任务2", True), (3, "改名", False)
+    ]
+    assert deleted == [4]
+    
+    # 批量删除同样产生删除记录
+    await client.delete("/api/v1/todos/completed")
+    await client.delete("/api/v1/todos/5")
+    upserted, deleted, since, _ = await _sync(client, since)
+    assert upserted == []
+    assert deleted == [2, 5]
+    
+    # 删除最大ID后新建的记录会复用ID，此前的删除记录随之失效
+    todo = await create_todo(db_session, TodoCreate(title="复用"))
+    assert todo.id == 4
+    upserted, deleted, _, _ = await _sync(client, first_since)
+    assert [(todo["id"], todo["title"]) for todo in upserted] == [(3, "改名"), (4, "复用")]
+    assert sorted(deleted) == [2, 5]
+    
+    await client.delete("/api/v1/todos/all")
+    upserted, deleted, since, _ = await _sync(client, since)
+    assert upserted == []
+    assert sorted(deleted) == [1, 3, 4]
+
+
+
+async def test_todo_changes_resync_required(client: AsyncClient, db_session: AsyncSession):
+    """测试删除记录被清理后，更早的since需要全量重新同步"""
+    for i in range(3):
+        await create_todo(db_session, TodoCreate(title=f"任务{i+1}"))
+    _, _, since, _ = await _sync(client, 0)
+    await client.delete("/api/v1/todos/1")
+    _, _, latest, _ = await _sync(client, since)
+    
+    assert await compact_tombstones(db_session, retention_seconds=-60) == 1
+    data = (await client.get("/api/v1/todos/changes", params={"since": since})).json()
+    assert data["resync_required"] is True
+    assert data["next_since"] is None
+    # 已同步到清理点之后的客户端不受影响，since=0的全量同步也不受影响
+    assert (await _sync(client, latest))[:2] == ([], [])
+    upserted, _, _, _ = await _sync(client, 0, limit=1)
+    assert [todo["id"] for todo in upserted] == [2, 3]
+    
+    data = (await client.get("/api/v1/todos/changes", params={"since": latest + 100})).json()
+    assert data["resync_required"] is True
+    response = await client.get("/api/v1/todos/changes", params={"cursor": "bad"})
+    assert response.status_code == 400
+
+
+
 async def test_delete_completed_todos(client: AsyncClient, db_session: AsyncSession):
     """测试批量删除已完成的待办事项"""
     # 创建测试数据
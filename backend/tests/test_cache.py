@@ -0,0 +1,84 @@
+"""
+读缓存测试
+"""
+
+import time
+
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.todolistv2.cache import MISSING, LRUCache, TodoCache, todo_cache
+from src.todolistv2.crud import create_todo
+from src.todolistv2.schemas import TodoCreate
+
+
+def test_lru_cache_bounds_entries_and_bytes():
+    """测试按条目数和字节数淘汰最久未使用的条目"""
+    cache = LRUCache(max_entries=3, max_bytes=100, ttl=60)
+    cache.set("a", 1, 10)
+    cache.set("b", 2, 10)
+    cache.set("c", 3, 10)
+    assert cache.get("a") == 1  # a变为最近使用
+    cache.set("d", 4, 10)
+    assert cache.get("b") is MISSING
+    
+    # 超出字节上限时同样从最久未使用的条目开始淘汰
+    cache.set("e", 5, 80)
+    assert cache.get("c") is MISSING
+    assert cache.get("e") == 5
+    assert cache.stats()["bytes"] == 100
+    
+    # 超过上限的单个条目不缓存
+    cache.set("huge", 6, 101)
+    assert cache.get("huge") is MISSING
+
+
+
+def test_lru_cache_ttl():
+    """测试条目过期"""
+    cache = LRUCache(max_entries=10, max_bytes=100, ttl=0.01)
+    cache.set("a", 1, 1)
+    assert cache.get("a") == 1
+    time.sleep(0.02)
+    assert cache.get("a") is MISSING
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+
+def test_todo_cache_skips_stale_write_back():
+    """测试读取期间发生失效时不写回旧数据"""
+    cache = TodoCache(LRUCache(max_entries=10, max_bytes=1000, ttl=60))
+    snapshot = cache.snapshot()
+    cache.invalidate(ids=[1])
+    cache.put_item(snapshot, 1, "旧数据", 1)
+    assert cache.get_item(1) is MISSING
+
+
+
+async def test_reads_are_cached_and_invalidated(client: AsyncClient, db_session: AsyncSession):
+    """测试读接口命中缓存，写操作提交后失效"""
+    todo = await create_todo(db_session, TodoCreate(title="任务"))
+    
+    await client.get(f"/api/v1/todos/{todo.id}")
+    await client.get("/api/v1/todos/")
+    hits = todo_cache.stats()["hits"]
+    response = await client.get(f"/api/v1/todos/{todo.id}")
+    assert response.json()["title"] == "任务"
+    response = await client.get("/api/v1/todos/")
+    assert response.json()["total"] == 1
+    assert todo_cache.stats()["hits"] == hits + 2
+    
+    # 更新后单条记录和列表都返回新数据
+    await client.put(f"/api/v1/todos/{todo.id}", json={"title": "新标题"})
+    response = await client.get(f"/api/v1/todos/{todo.id}")
+    assert response.json()["title"] == "新标题"
+    response = await client.get("/api/v1/todos/")
+    assert response.json()["items"][0]["title"] == "新标题"
+    
+    # 按条件批量删除后单条记录缓存全部失效
+    await client.put(f"/api/v1/todos/{todo.id}", json={"completed": True})
+    await client.get(f"/api/v1/todos/{todo.id}")
+    await client.delete("/api/v1/todos/completed")
+    response = await client.get(f"/api/v1/todos/{todo.id}")
+    assert response.status_code == 404
@@ -0,0 +1,147 @@
+"""
+响应压缩测试
+"""
+
+import gzip
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.todolistv2.cache import todo_cache
+from src.todolistv2.compression import ENCODINGS, EncodedBody, compress, negotiate_encoding
+from src.todolistv2.crud import create_todos
+from src.todolistv2.schemas import TodoCreate
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, "identity"),
+    ("", "identity"),
+    ("gzip", "gzip"),
+    ("GZIP, deflate", "gzip"),
+    ("x-gzip", "gzip"),
+    ("deflate", "identity"),
+    ("gzip;q=0", "identity"),
+    ("gzip; q=0.000", "identity"),
+    ("*", ENCODINGS[0]),
+    ("*;q=0.5, gzip;q=0", "br" if "br" in ENCODINGS else "identity"),
+])
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+
+def test_negotiate_encoding_prefers_weight_then_server_order():
+    """测试权重高的优先，权重相同时按服务端顺序"""
+    available = ("br", "gzip")
+    assert negotiate_encoding("gzip, br", available) == "br"
+    assert negotiate_encoding("br;q=0.5, gzip", available) == "gzip"
+    assert negotiate_encoding("br, gzip", ("gzip",)) == "gzip"
+
+
+
+def test_encoded_body_variants():
+    """测试压缩版本在第一次使用时生成并保存，短内容不压缩"""
+    body = b'{"items":[' + b",".join(b'{"id":%d}' % i for i in range(200)) + b"]}"
+    page = EncodedBody(body, min_size=100)
+    assert page.encode("identity") == ("identity", body)
+    assert page.size == len(body)
+
+    coding, compressed = page.encode("gzip")
+    assert coding == "gzip" and gzip.decompress(compressed) == body
+    assert page.encode("gzip")[1] is compressed
+    assert page.size == len(body) + len(compressed)
+    # mtime固定，相同内容的压缩结果相同
+    assert compress(body, "gzip") == compressed
+
+    small = EncodedBody(b'{"items":[]}', min_size=100)
+    assert small.encode("gzip") == ("identity", b'{"items":[]}')
+    assert list(small.variants) == ["identity"]
+
+    with pytest.raises(ValueError):
+        compress(body, "deflate")
+
+
+
+async def test_list_pages_cached_encoded(client: AsyncClient, db_session: AsyncSession, sql_statements):
+    """测试列表页按协商结果压缩，命中缓存时只读取集合版本"""
+    await create_todos(db_session, [TodoCreate(title=f"任务{i}", description="说明" * 20) for i in range(30)])
+
+    response = await client.get("/api/v1/todos/", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()["items"]) == 30
+    body = response.content
+    entries = todo_cache.stats()["entries"]
+
+    sql_statements.clear()
+    hits = todo_cache.stats()["hits"]
+    response = await client.get("/api/v1/todos/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == body
+    assert todo_cache.stats()["hits"] == hits + 1
+    assert len(sql_statements) == 1 and "todo_stats" in sql_statements[0]
+
+    # 同一页的未压缩版本来自同一个缓存条目
+    response = await client.get("/api/v1/todos/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.content == body
+    assert todo_cache.stats()["entries"] == entries
+    assert len(sql_statements) == 2
+
+    # 写入后集合版本变化，不再命中旧页
+    await client.post("/api/v1/todos/", json={"title": "新任务"})
+    response = await client.get("/api/v1/todos/", headers={"Accept-Encoding": "gzip"})
+    assert response.json()["total"] == 31
+
+
+
+async def test_etag_per_content_coding(client: AsyncClient, db_session: AsyncSession):
+    """测试压缩版本使用不同的ETag，If-None-Match匹配任一版本都返回304"""
+    await create_todos(db_session, [TodoCreate(title=f"任务{i}", description="说明" * 20) for i in range(30)])
+
+    plain = await client.get("/api/v1/todos/", headers={"Accept-Encoding": "identity"})
+    compressed = await client.get("/api/v1/todos/", headers={"Accept-Encoding": "gzip"})
+    etag = plain.headers["etag"]
+    assert compressed.headers["etag"] == etag[:-1] + '-gzip"'
+
+    for tag in (compressed.headers["etag"], "W/" + compressed.headers["etag"]):
+        response = await client.get(
+            "/api/v1/todos/", headers={"Accept-Encoding": "gzip", "If-None-Match": tag}
+        )
+        assert response.status_code == 304
+        assert response.headers["etag"] == compressed.headers["etag"]
+        assert "Accept-Encoding" in response.headers["vary"]
+
+    # 单条记录由接口压缩，同样带压缩版本的ETag
+    created = await client.post("/api/v1/todos/", json={"title": "长描述", "description": "内容" * 400})
+    path = f"/api/v1/todos/{created.json()['id']}"
+    plain = await client.get(path, headers={"Accept-Encoding": "identity"})
+    compressed = await client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in plain.headers
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    response = await client.get(
+        path, headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"]}
+    )
+    assert response.status_code == 304
+
+
+
+async def test_uncached_responses_gzip_above_threshold(client: AsyncClient):
+    """测试响应超过阈值时压缩，小响应不压缩"""
+    created = await client.post("/api/v1/todos/", json={"title": "长描述", "description": "内容" * 400})
+    response = await client.get(
+        f"/api/v1/todos/{created.json()['id']}", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["description"] == "内容" * 400
+
+    response = await client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+    # 导出自行压缩，中间件不重复压缩
+    response = await client.get("/api/v1/todos/export", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text.startswith('{"title":"长描述"')
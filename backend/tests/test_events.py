@@ -0,0 +1,162 @@
+"""
+变更事件推送测试
+"""
+
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.todolistv2.crud import create_todo
+from src.todolistv2.events import EventBus, TooManySubscribers, event_bus
+from src.todolistv2.main import app
+from src.todolistv2.schemas import TodoCreate
+
+
+def _decode(event) -> dict:
+    return json.loads(event.data)
+
+
+async def test_event_bus_overflow_and_replay():
+    """测试队列写满时丢弃积压改发resync，以及按Last-Event-ID补发"""
+    bus = EventBus(queue_size=3, max_subscribers=2, replay_size=4)
+    slow = bus.subscribe()
+    for i in range(5):
+        bus.publish({"type": "deleted", "ids": [i]})
+
+    event = await slow.get(timeout=0)
+    assert _decode(event) == {
+        "id": f"{bus.boot_id}-4", "seq": 4, "type": "resync", "reason": "overflow"
+    }
+    assert _decode(await slow.get(timeout=0))["ids"] == [4]
+    assert await slow.get(timeout=0) is None
+    assert slow.dropped == 3
+    assert bus.stats()["overflows"] == 1
+
+    # seq 3 之后的事件仍在保留范围内，直接补发
+    with bus.subscribe(last_event_id=f"{bus.boot_id}-3") as resumed:
+        assert [(await resumed.get(timeout=0)).seq for _ in range(2)] == [4, 5]
+    # seq 1 之后的事件已有部分被淘汰，改发resync
+    with bus.subscribe(last_event_id=f"{bus.boot_id}-0") as expired:
+        assert (await expired.get(timeout=0)).type == "resync"
+
+    bus.subscribe()
+    with pytest.raises(TooManySubscribers):
+        bus.subscribe()
+
+
+
+async def test_event_id_from_other_process_expired():
+    """测试重连到另一个进程时，对方的事件id即使seq在范围内也按已过期处理"""
+    first, second = EventBus(), EventBus()
+    assert first.boot_id != second.boot_id
+    for i in range(3):
+        first.publish({"type": "deleted", "ids": [i]})
+        second.publish({"type": "deleted", "ids": [i]})
+
+    last = first.publish({"type": "deleted", "ids": [3]})
+    with second.subscribe(last_event_id="%s-1" % first.boot_id) as subscription:
+        event = await subscription.get(timeout=0)
+        assert event.type == "resync" and _decode(event)["reason"] == "expired"
+        assert await subscription.get(timeout=0) is None
+
+    # 格式无效的id（例如升级前的纯数字id）同样先发送resync
+    with first.subscribe(last_event_id="2") as subscription:
+        assert (await subscription.get(timeout=0)).type == "resync"
+    # 本进程的最新id不需要补发
+    with first.subscribe(last_event_id=last.id) as subscription:
+        assert await subscription.get(timeout=0) is None
+
+
+
+async def test_mutations_publish_events(client: AsyncClient, db_session: AsyncSession):
+    """测试每种写操作在提交后发布紧凑的变更事件"""
+    with event_bus.subscribe() as subscription:
+        todo = await create_todo(db_session, TodoCreate(title="任务1"))
+        await client.post("/api/v1/todos/bulk", json=[{"title": "任务2"}])
+        await client.put(f"/api/v1/todos/{todo.id}", json={"completed": True})
+        await client.patch(
+            "/api/v1/todos/bulk",
+            json={"filter": {"completed": "false"}, "update": {"description": "批量"}}
+        )
+        await client.delete(f"/api/v1/todos/{todo.id}")
+        await client.delete("/api/v1/todos/completed")  # 没有已完成的记录，不发布事件
+        await client.delete("/api/v1/todos/all")
+
+        events = []
+        while (event := await subscription.get(timeout=0)) is not None:
+            events.append(_decode(event))
+
+    assert [event["type"] for event in events] == [
+        "created", "created", "updated", "updated", "deleted", "deleted"
+    ]
+    assert events[0]["todos"][0]["title"] == "任务1"
+    assert events[1]["todos"][0]["title"] == "任务2"
+    assert set(events[2]["changes"]) == {"completed", "updated_at"}
+    assert events[2]["ids"] == [todo.id]
+    assert events[3]["filter"] == {"completed": "false"}
+    assert events[3]["changes"] == {"description": "批量"}
+    assert events[4]["ids"] == [todo.id]
+    assert events[5]["filter"] == {"completed": "all"}
+    assert [event["seq"] for event in events] == sorted(event["seq"] for event in events)
+
+
+
+async def _run_asgi(scope: dict, incoming: asyncio.Queue, sent: asyncio.Queue):
+    """直接调用ASGI应用，用于测试不会自行结束的流式响应"""
+    await app(scope, incoming.get, sent.put)
+
+
+async def test_sse_stream():
+    """测试SSE接口推送事件并在客户端断开后取消订阅"""
+    incoming, sent = asyncio.Queue(), asyncio.Queue()
+    await incoming.put({"type": "http.request", "body": b"", "more_body": False})
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/api/v1/todos/events",
+        "raw_path": b"/api/v1/todos/events", "root_path": "", "query_string": b"",
+        "headers": [], "client": ("test", 1), "server": ("test", 80),
+    }
+    subscribers = event_bus.stats()["subscribers"]
+    task = asyncio.create_task(_run_asgi(scope, incoming, sent))
+
+    start = await asyncio.wait_for(sent.get(), 1)
+    assert start["status"] == 200
+    assert (b"content-type", b"text/event-stream; charset=utf-8") in start["headers"]
+    assert (await asyncio.wait_for(sent.get(), 1))["body"] == b"retry: 3000\n\n"
+
+    published = event_bus.publish({"type": "deleted", "ids": [1]})
+    body = (await asyncio.wait_for(sent.get(), 1))["body"]
+    assert body == published.sse()
+    assert body.startswith(f"id: {published.id}\nevent: deleted\ndata: ".encode())
+    assert _decode(published)["id"] == published.id
+
+    await incoming.put({"type": "http.disconnect"})
+    await asyncio.wait_for(task, 1)
+    assert event_bus.stats()["subscribers"] == subscribers
+
+
+
+async def test_websocket_stream():
+    """测试WebSocket接口推送事件"""
+    incoming, sent = asyncio.Queue(), asyncio.Queue()
+    await incoming.put({"type": "websocket.connect"})
+    scope = {
+        "type": "websocket", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "scheme": "ws", "path": "/api/v1/todos/events/ws",
+        "raw_path": b"/api/v1/todos/events/ws", "root_path": "", "query_string": b"",
+        "headers": [], "client": ("test", 1), "server": ("test", 80), "subprotocols": [],
+    }
+    subscribers = event_bus.stats()["subscribers"]
+    task = asyncio.create_task(_run_asgi(scope, incoming, sent))
+    assert (await asyncio.wait_for(sent.get(), 1))["type"] == "websocket.accept"
+
+    event_bus.publish({"type": "deleted", "ids": [2]})
+    message = await asyncio.wait_for(sent.get(), 1)
+    assert json.loads(message["text"])["ids"] == [2]
+
+    await incoming.put({"type": "websocket.disconnect", "code": 1000})
+    await asyncio.wait_for(task, 1)
+    assert event_bus.stats()["subscribers"] == subscribers
@@ -0,0 +1,132 @@
+"""
+流式导入测试
+"""
+
+import json
+
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.todolistv2.crud import create_todo, get_todo_stats
+from src.todolistv2.events import event_bus
+from src.todolistv2.importer import _TOO_LONG, import_todos, iter_lines, parse_csv
+from src.todolistv2.schemas import TodoCreate
+
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+
+async def test_iter_lines_across_chunks():
+    """测试跨块的行、多字节字符、BOM、CRLF和超长行"""
+    data = "﻿第一行\r\n第二行\n\n".encode() + b"x" * 50 + b"\n\xff\nlast"
+    for size in (1, 3, 7, 1024):
+        lines = await _collect(iter_lines(_chunks(data, size), max_length=20))
+        assert [line_no for line_no, _ in lines] == [1, 2, 3, 4, 5, 6]
+        assert [line for _, line in lines[:3]] == ["第一行", "第二行", ""]
+        assert lines[3][1] is _TOO_LONG
+        assert isinstance(lines[4][1], UnicodeDecodeError)
+        assert lines[5][1] == "last"
+
+
+
+async def test_parse_csv_multiline_records():
+    """测试引号内换行的CSV记录和列数错误"""
+    data = 'title,description,completed\n"a","多\n行, ""引号""",true\nb,,\nc\n'.encode()
+    records = await _collect(parse_csv(iter_lines(_chunks(data, 4))))
+    assert records == [
+        (2, {"title": "a", "description": '多\n行, "引号"', "completed": "true"}),
+        (4, {"title": "b"}),
+        (5, "列数为 1，与表头的 3 列不一致"),
+    ]
+
+
+
+async def test_import_ndjson(client: AsyncClient):
+    """测试NDJSON导入：按批提交、逐行报告错误"""
+    lines = [
+        json.dumps({"title": "任务1"}),
+        json.dumps({"title": "任务2", "description": "描述", "completed": True, "id": 99}),
+        "",
+        "{bad json",
+        json.dumps({"title": ""}),
+        json.dumps(["not", "object"]),
+        json.dumps({"title": "任务3"}),
+    ]
+    response = await client.post(
+        "/api/v1/todos/import", content="\n".join(lines).encode()
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["accepted"] == 3
+    assert data["rejected"] == 3
+    assert [error["line"] for error in data["errors"]] == [4, 5, 6]
+    assert data["errors"][0]["error"] == "不是有效的JSON"
+    assert data["errors"][1]["error"].startswith("title:")
+
+    items = (await client.get("/api/v1/todos/", params={"limit": 100})).json()["items"]
+    assert sorted((item["title"], item["completed"]) for item in items) == [
+        ("任务1", False), ("任务2", True), ("任务3", False)
+    ]
+    assert 99 not in [item["id"] for item in items]
+
+
+
+async def test_import_publishes_one_resync(db_session: AsyncSession):
+    """测试分多批提交的导入结束后只发布一条resync事件"""
+    data = "".join(json.dumps({"title": f"任务{i}"}) + "\n" for i in range(7)).encode()
+    with event_bus.subscribe() as subscription:
+        result = await import_todos(db_session, _chunks(data, 16), chunk_size=2)
+        event = await subscription.get(timeout=0)
+        assert await subscription.get(timeout=0) is None
+    assert result.accepted == 7
+    assert (await get_todo_stats(db_session)).total == 7
+    assert event.type == "resync"
+    assert json.loads(event.data)["reason"] == "import"
+
+    # 没有写入任何记录时不通知
+    with event_bus.subscribe() as subscription:
+        result = await import_todos(db_session, _chunks(b"{bad json\n", 16))
+        assert result.rejected == 1
+        assert await subscription.get(timeout=0) is None
+
+
+
+async def test_import_csv_roundtrip_from_export(client: AsyncClient, db_session: AsyncSession):
+    """测试导出的CSV以multipart上传后可以重新导入"""
+    await create_todo(db_session, TodoCreate(title="a,b", description='带"引号"\n和换行'))
+    await create_todo(db_session, TodoCreate(title="任务2"))
+    await client.put("/api/v1/todos/2", json={"completed": True})
+    exported = (await client.get("/api/v1/todos/export", params={"format": "csv"})).content
+    await client.delete("/api/v1/todos/all")
+
+    response = await client.post(
+        "/api/v1/todos/import",
+        params={"format": "csv"},
+        files={"file": ("todos.csv", exported, "text/csv")},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"accepted": 2, "rejected": 0, "errors": [], "errors_truncated": False}
+
+    items = (await client.get("/api/v1/todos/", params={"limit": 100})).json()["items"]
+    assert sorted((item["title"], item["description"], item["completed"]) for item in items) == [
+        ("a,b", '带"引号"\n和换行', False), ("任务2", None, True)
+    ]
+
+
+
+async def test_import_invalid_csv_header(client: AsyncClient):
+    """测试CSV表头缺少title时整个请求被拒绝"""
+    response = await client.post(
+        "/api/v1/todos/import", params={"format": "csv"}, content=b"name\nfoo\n"
+    )
+    assert response.status_code == 400
+    response = await client.post(
+        "/api/v1/todos/import", files={"other": (None, "value")}
+    )
+    assert response.status_code == 400
@@ -0,0 +1,153 @@
+"""
+Prometheus指标测试
+"""
+
+import json
+import logging
+import re
+
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.todolistv2.database import instrument_engine, params_shape
+from src.todolistv2.main import WARMUP_PATHS, _dispatch, app
+from src.todolistv2.metrics import Counter, Histogram, Registry
+
+
+def _sample(text: str, name: str, **labels) -> float:
+    """从文本格式中取出标签包含labels的样本值之和"""
+    total = 0.0
+    for match in re.finditer(rf"^{name}\{{(.*)\}} (\S+)$", text, re.M):
+        pairs = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(1)))
+        if all(pairs.get(key) == str(value) for key, value in labels.items()):
+            total += float(match.group(2))
+    return total
+
+
+def test_exposition_format():
+    """测试直方图的累计桶、_sum/_count和标签转义"""
+    registry = Registry()
+    histogram = Histogram("latency_seconds", "耗时", ("route",), registry, buckets=(0.1, 1))
+    counter = Counter("errors_total", "错误数", registry=registry)
+    child = histogram.labels('/a"b')
+    for value in (0.05, 0.1, 0.5, 2):
+        child.observe(value)
+    counter.inc()
+
+    assert registry.render().decode() == (
+        "# HELP latency_seconds 耗时\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{route="/a\\"b",le="0.1"} 2\n'
+        'latency_seconds_bucket{route="/a\\"b",le="1"} 3\n'
+        'latency_seconds_bucket{route="/a\\"b",le="+Inf"} 4\n'
+        'latency_seconds_sum{route="/a\\"b"} 2.65\n'
+        'latency_seconds_count{route="/a\\"b"} 4\n'
+        "# HELP errors_total 错误数\n"
+        "# TYPE errors_total counter\n"
+        "errors_total 1\n"
+    )
+    assert histogram.labels('/a"b') is child
+
+
+
+async def test_metrics_endpoint(client: AsyncClient):
+    """测试请求按路由模板记录，并包含SQL语句和连接池指标"""
+    before = (await client.get("/metrics")).text
+    created = await client.post("/api/v1/todos/", json={"title": "任务1"})
+    await client.get(f"/api/v1/todos/{created.json()['id']}")
+    await client.get("/api/v1/todos/999")
+    await client.get("/no/such/path")
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+
+    def delta(name, **labels):
+        return _sample(text, name, **labels) - _sample(before, name, **labels)
+
+    route = "/api/v1/todos/{todo_id}"
+    assert delta("http_request_duration_seconds_count", route=route, status=200) == 1
+    assert delta("http_request_duration_seconds_count", route=route, status=404) == 1
+    assert delta("http_request_duration_seconds_count", route="unmatched", status=404) == 1
+    assert delta(
+        "http_request_duration_seconds_count", method="POST", route="/api/v1/todos/", status=201
+    ) == 1
+    assert "/api/v1/todos/999" not in text
+    # 本次/metrics请求仍在处理中
+    assert "\nhttp_requests_in_flight 1\n" in text
+
+    assert delta("db_statement_duration_seconds_count", engine="write", operation="insert") >= 1
+    assert delta("db_statement_duration_seconds_count", engine="write", operation="select") >= 2
+    assert delta("db_statement_rows_count", engine="write") >= 2
+    assert 'db_connection_checkout_seconds_bucket{engine="write",le="+Inf"}' in text
+
+
+
+async def test_server_timing_header(client: AsyncClient):
+    """测试响应头中返回本次请求的SQL语句数、总耗时和最慢的语句"""
+    await client.post("/api/v1/todos/", json={"title": "任务1"})
+    response = await client.get("/api/v1/todos/", params={"total": "exact"})
+    timing = response.headers["server-timing"]
+    match = re.fullmatch(
+        r'db;dur=([\d.]+);desc="(\d+) statements", '
+        r'db-slowest;dur=([\d.]+);desc="(.+)", app;dur=([\d.]+)',
+        timing
+    )
+    assert match, timing
+    db, count, slowest, sql, app = match.groups()
+    assert int(count) >= 2  # 计数查询和分页查询
+    assert float(slowest) <= float(db) <= float(app)
+    assert sql.startswith("SELECT")
+
+    response = await client.get("/health")
+    assert response.headers["server-timing"].startswith('db;dur=0.000;desc="0 statements", app;dur=')
+
+
+
+async def test_warmup_requests_not_counted(client: AsyncClient):
+    """测试启动预热的请求经过路由和数据库，但不计入请求指标"""
+    await client.post("/api/v1/todos/", json={"title": "任务1"})
+    before = (await client.get("/metrics")).text
+    statuses = {path: await _dispatch(app, path) for path in WARMUP_PATHS}
+    after = (await client.get("/metrics")).text
+
+    assert statuses == {"/health": 200, "/api/v1/todos/": 200, "/api/v1/todos/0": 404}
+    for route in ("/health", "/api/v1/todos/", "/api/v1/todos/{todo_id}"):
+        assert _sample(after, "http_request_duration_seconds_count", route=route) == \
+            _sample(before, "http_request_duration_seconds_count", route=route)
+    assert _sample(after, "db_statement_duration_seconds_count", operation="select") > \
+        _sample(before, "db_statement_duration_seconds_count", operation="select")
+
+
+async def test_slow_query_log(caplog):
+    """测试慢查询日志包含SQL、参数形状和查询计划"""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    instrument_engine(engine, "slow-test", slow_query_ms=0)
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)"))
+            await conn.execute(
+                text("INSERT INTO t (name) VALUES (:name)"), [{"name": "a"}, {"name": "b"}]
+            )
+            caplog.clear()
+            with caplog.at_level(logging.WARNING, logger="src.todolistv2.database"):
+                result = await conn.execute(
+                    text("SELECT * FROM t WHERE id = :id OR name = :name"),
+                    {"id": 1, "name": "b"}
+                )
+            assert len(result.all()) == 2
+    finally:
+        await engine.dispose()
+
+    (record,) = caplog.records
+    entry = record.slow_query
+    assert json.loads(record.getMessage().split(": ", 1)[1]) == entry
+    assert entry["engine"] == "slow-test"
+    assert entry["sql"].startswith("SELECT * FROM t")
+    assert entry["params"] == {"count": 2, "types": ["int", "str"]}
+    assert any("SCAN t" in node or "SEARCH t" in node for node in entry["plan"])
+    assert params_shape([(1,), (2,)], executemany=True) == {
+        "rows": 2, "each": {"count": 1, "types": ["int"]}
+    }
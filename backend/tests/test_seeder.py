@@ -0,0 +1,92 @@
+"""
+合成数据写入测试
+"""
+
+import random
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.todolistv2.models import Base
+from src.todolistv2.seeder import parse_length_distribution, seed_todos
+
+
+async def _create_schema(path) -> None:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(text("INSERT INTO todos (title, completed) VALUES ('existing', 1)"))
+            await conn.execute(text("UPDATE todos SET title = 'existing report' WHERE id = 1"))
+    finally:
+        await engine.dispose()
+
+
+def _schema_objects(conn) -> set:
+    return set(conn.exec_driver_sql(
+        "SELECT type, name FROM sqlite_master WHERE tbl_name = 'todos'"
+    ).all())
+
+
+async def test_seed_is_deterministic_and_consistent(tmp_path):
+    """测试相同种子生成相同数据，计数、行版本、索引、触发器和全文索引与逐条写入一致"""
+    paths = [tmp_path / "a.db", tmp_path / "b.db"]
+    for path in paths:
+        await _create_schema(path)
+        result = seed_todos(str(path), 500, completed_ratio=0.4, seed=7, batch_size=64)
+        assert result.rows == 500 and result.first_id == 2
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{paths[0]}")
+    other = create_async_engine(f"sqlite+aiosqlite:///{paths[1]}")
+    try:
+        async with engine.connect() as conn, other.connect() as other_conn:
+            query = text("SELECT * FROM todos ORDER BY id")
+            rows = (await conn.execute(query)).all()
+            # 已有的那条记录创建时间不同，只比较生成的记录
+            assert rows[1:] == (await other_conn.execute(query)).all()[1:]
+            assert len(rows) == 501
+
+            completed = sum(row.completed for row in rows)
+            stats = (await conn.execute(text("SELECT total, completed, version FROM todo_stats"))).one()
+            # 已有记录经过一次插入和一次更新，新记录的行版本接在其后
+            assert stats == (501, completed, 502)
+            assert [row.row_version for row in rows[1:]] == list(range(3, 503))
+            assert rows[1].created_at == rows[1].updated_at == "2024-01-01 00:00:00"
+            assert 0.3 < completed / 500 < 0.5
+
+            def inspect(sync_conn):
+                objects = _schema_objects(sync_conn)
+                assert ("index", "idx_todos_created") in objects
+                assert {"todos_stats_ai", "todos_fts_au"} <= {name for _, name in objects}
+            await conn.run_sync(inspect)
+
+            matched = await conn.scalar(text(
+                "SELECT count(*) FROM todos_fts WHERE todos_fts MATCH '会议纪要'"
+            ))
+            assert matched == await conn.scalar(text(
+                "SELECT count(*) FROM todos WHERE title LIKE '%会议纪要%' OR description LIKE '%会议纪要%'"
+            )) > 0
+
+        # 恢复的触发器继续维护计数和行版本
+        async with engine.begin() as conn:
+            await conn.execute(text("INSERT INTO todos (title, completed) VALUES ('after', 0)"))
+        async with engine.connect() as conn:
+            assert await conn.scalar(text("SELECT row_version FROM todos WHERE title = 'after'")) == 503
+            assert await conn.scalar(text("SELECT total FROM todo_stats")) == 502
+    finally:
+        await engine.dispose()
+        await other.dispose()
+
+
+
+def test_length_distributions():
+    """测试描述长度分布的解析"""
+    rng = random.Random(1)
+    assert parse_length_distribution("fixed:12")(rng) == 12
+    assert all(5 <= parse_length_distribution("uniform:5-9")(rng) <= 9 for _ in range(100))
+    assert parse_length_distribution("normal:50:10")(rng) >= 0
+    assert parse_length_distribution("exp:30")(rng) >= 0
+    for spec in ("uniform:9-5", "exp:0", "poisson:3", "fixed:x"):
+        with pytest.raises(ValueError):
+            parse_length_distribution(spec)
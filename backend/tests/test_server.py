@@ -0,0 +1,63 @@
+"""
+多进程启动器测试
+"""
+
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="启动器依赖fork")
+def test_serve_workers_and_graceful_shutdown(tmp_path):
+    """测试主进程初始化数据库后启动多个工作进程，SIGTERM后正常退出"""
+    pytest.importorskip("uvloop")
+    database = tmp_path / "serve.db"
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "todolistv2", "serve", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", "2", "--log-level", "warning"],
+        cwd=SRC, env={**os.environ, "DATABASE_URL": f"sqlite+aiosqlite:///{database}"},
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 30
+        while True:
+            assert server.poll() is None and time.monotonic() < deadline
+            try:
+                if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.05)
+        workers = subprocess.run(
+            ["ps", "--ppid", str(server.pid), "-o", "pid="], capture_output=True, text=True
+        ).stdout.split()
+        assert len(workers) == 2
+
+        response = httpx.post(f"{url}/api/v1/todos/", json={"title": "served"})
+        assert response.status_code == 201
+    finally:
+        server.send_signal(signal.SIGTERM)
+        output, _ = server.communicate(timeout=60)
+
+    assert server.returncode == 0, output
+    # 工作进程的lifespan没有再次初始化数据库
+    assert "正在初始化数据库" not in output
+    with sqlite3.connect(database) as conn:
+        assert conn.execute("SELECT title FROM todos").fetchall() == [("served",)]
@@ -0,0 +1,67 @@
+"""
+跨进程写入监视测试
+"""
+
+import json
+
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.todolistv2 import crud
+from src.todolistv2.cache import MISSING, todo_cache
+from src.todolistv2.crud import create_todo, create_todos, delete_completed_todos, update_todos
+from src.todolistv2.events import event_bus
+from src.todolistv2.schemas import TodoCreate, TodoUpdate
+from src.todolistv2.watcher import ChangeWatcher
+from tests.conftest import test_engine
+
+
+async def test_local_writes_are_not_external(db_session: AsyncSession, monkeypatch):
+    """测试本进程的写入登记后不被当作其他进程的写入"""
+    watcher = ChangeWatcher(test_engine)
+    monkeypatch.setattr(crud, "change_watcher", watcher)
+    assert await watcher.poll() == 0
+
+    await create_todo(db_session, TodoCreate(title="任务"))
+    await create_todos(db_session, [TodoCreate(title=f"批量{i}") for i in range(3)])
+    await update_todos(db_session, TodoUpdate(completed=True))
+    await delete_completed_todos(db_session)
+    epoch = todo_cache.item_epoch
+
+    with event_bus.subscribe() as subscription:
+        assert await watcher.poll() == 0
+        assert await subscription.get(timeout=0) is None
+    assert todo_cache.item_epoch == epoch
+    assert watcher.local_changes == 0
+    assert watcher.stats()["version"] == 1 + 3 + 4 + 4
+
+
+
+async def test_external_writes_invalidate_and_resync(client: AsyncClient, db_session: AsyncSession, monkeypatch):
+    """测试其他进程的写入使单条记录缓存失效，并通知订阅者重新拉取"""
+    watcher = ChangeWatcher(test_engine)
+    monkeypatch.setattr(crud, "change_watcher", watcher)
+    created = await client.post("/api/v1/todos/", json={"title": "原标题"})
+    todo_id = created.json()["id"]
+    await client.get(f"/api/v1/todos/{todo_id}")
+    assert todo_cache.get_item(todo_id) is not MISSING
+    await watcher.poll()
+
+    # 绕过crud直接写入，相当于另一个工作进程
+    await db_session.execute(text("UPDATE todos SET title = '新标题' WHERE id = :id"), {"id": todo_id})
+    await db_session.execute(text("INSERT INTO todos (title) VALUES ('外部')"))
+    await db_session.commit()
+
+    with event_bus.subscribe() as subscription:
+        assert await watcher.poll() == 2
+        event = await subscription.get(timeout=0)
+        assert event.type == "resync"
+        assert json.loads(event.data)["reason"] == "external"
+    assert todo_cache.get_item(todo_id) is MISSING
+    response = await client.get(f"/api/v1/todos/{todo_id}")
+    assert response.json()["title"] == "新标题"
+    assert watcher.stats()["external_changes"] == 2
+
+    # 没有新的写入时不再通知
+    assert await watcher.poll() == 0
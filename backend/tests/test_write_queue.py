@@ -0,0 +1,104 @@
+"""
+组提交写队列测试
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.todolistv2.crud import create_todo, get_todo_stats, update_todo
+from src.todolistv2.schemas import TodoCreate, TodoUpdate
+from src.todolistv2.metrics import QueryStats, current_query_stats
+from src.todolistv2.write_queue import WriteQueue
+from tests.conftest import TestingSessionLocal
+
+
+async def test_concurrent_writes_are_batched(db_session: AsyncSession):
+    """测试并发写操作被合并到少量批次中提交"""
+    queue = WriteQueue(TestingSessionLocal, window_ms=20, max_batch=8)
+    await queue.start()
+    try:
+        todos = await asyncio.gather(*[
+            queue.submit(create_todo, TodoCreate(title=f"任务{i}")) for i in range(20)
+        ])
+    finally:
+        await queue.stop()
+    
+    # 每个调用方拿到自己的结果
+    assert [todo.title for todo in todos] == [f"任务{i}" for i in range(20)]
+    assert len({todo.id for todo in todos}) == 20
+    
+    stats = queue.stats()
+    assert stats["ops"] == 20
+    assert stats["batches"] < 20
+    assert stats["max_batch_size"] <= 8
+    assert (await get_todo_stats(db_session)).total == 20
+
+
+
+async def test_failed_op_only_affects_its_caller(db_session: AsyncSession):
+    """测试批次中失败的操作只回滚它自己"""
+    async def failing_op(session: AsyncSession):
+        await create_todo(session, TodoCreate(title="会被回滚"))
+        raise RuntimeError("boom")
+    
+    queue = WriteQueue(TestingSessionLocal, window_ms=20)
+    await queue.start()
+    try:
+        results = await asyncio.gather(
+            queue.submit(create_todo, TodoCreate(title="任务1")),
+            queue.submit(failing_op),
+            queue.submit(create_todo, TodoCreate(title="任务2")),
+            return_exceptions=True
+        )
+    finally:
+        await queue.stop()
+    
+    assert results[0].title == "任务1"
+    assert isinstance(results[1], RuntimeError)
+    assert results[2].title == "任务2"
+    assert queue.stats()["errors"] == 1
+    assert (await get_todo_stats(db_session)).total == 2
+
+
+
+async def test_stop_drains_pending_writes(db_session: AsyncSession):
+    """测试停止队列时执行完已提交的操作"""
+    todo = await create_todo(db_session, TodoCreate(title="任务"))
+    # 内存数据库只有一个连接，先结束refresh开启的读事务
+    await db_session.commit()
+    queue = WriteQueue(TestingSessionLocal, window_ms=50)
+    await queue.start()
+    pending = asyncio.ensure_future(
+        queue.submit(update_todo, todo.id, TodoUpdate(completed=True))
+    )
+    await asyncio.sleep(0)
+    await queue.stop()
+    
+    assert (await pending).completed is True
+    assert not queue.running
+    with pytest.raises(RuntimeError):
+        await queue.submit(update_todo, todo.id, TodoUpdate(completed=False))
+
+
+
+async def test_statements_counted_for_submitting_request():
+    """测试操作执行的语句计入提交它的请求的SQL统计"""
+    async def submit(title: str) -> QueryStats:
+        stats = QueryStats()
+        current_query_stats.set(stats)
+        await queue.submit(create_todo, TodoCreate(title=title))
+        return stats
+    
+    queue = WriteQueue(TestingSessionLocal, window_ms=20)
+    await queue.start()
+    try:
+        # 两个请求的操作在同一批中执行
+        first, second = await asyncio.gather(submit("任务1"), submit("任务2"))
+    finally:
+        await queue.stop()
+    
+    assert queue.stats()["batches"] == 1
+    # 第一个操作还包含开启整批事务的BEGIN；整批的COMMIT不计入
+    assert (first.count, second.count) == (4, 3)  # SAVEPOINT、INSERT、RELEASE